@@ -0,0 +1,136 @@
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ReadOnlyConnectionPool:
+    """
+    Bounded pool of read-only SQLite connections shared by the server's worker threads.
+
+    Connections are opened lazily (up to `size`) with a `mode=ro` URI and tuned for reads: memory-mapped I/O,
+    a larger page cache, in-memory temp tables/sorts and a per-connection prepared statement cache. Idle
+    connections are reused most-recently-returned first, so hot connections keep a warm page cache.
+
+    :param database: Path of the SQLite database
+    :param size: Maximum number of open connections
+    :param timeout: Seconds to wait for a free connection before raising PoolTimeout
+    :param mmap_size: PRAGMA mmap_size in bytes
+    :param cache_size_kb: Page cache size of each connection in KiB
+    :param statement_cache_size: Number of prepared statements cached by each connection
+    """
+
+    def __init__(self, database, size=8, timeout=30, mmap_size=268435456, cache_size_kb=65536, statement_cache_size=256):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache_size = statement_cache_size
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.database}?mode=ro", uri=True, check_same_thread=False,
+                               cached_statements=self.statement_cache_size)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)};")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    def checkout(self):
+        """
+        Get a connection from the pool, opening a new one while the pool is below its size.
+            :raises PoolTimeout: when no connection is returned within the pool timeout
+        """
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                can_open = self._created < self.size
+                if can_open:
+                    self._created += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = time.perf_counter() - started
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time += waited
+                    self._max_wait_time = max(self._max_wait_time, waited)
+
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def checkin(self, conn):
+        """
+        Return a connection to the pool.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def stats(self):
+        """
+        Get the pool metrics, used to size the pool under concurrency.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 6),
+                "wait_time_max": round(self._max_wait_time, 6),
+            }
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -7,15 +7,19 @@ import argparse
 import datetime
 from tqdm import tqdm
 from termcolor import colored
-import configparser
 
-config = configparser.ConfigParser()
-config.read("/home/mchenyu/web-app/back_end/TopicModelingKit/config.ini")
+try:
+    from TopicModelingKit.src.settings import get_settings
+except ImportError:
+    sys.path.append(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))))
+    from settings import get_settings
 
-JSON_DATASET_ABSPATH = config.get('database', 'jsonDatasetPath').replace("\"", "")
-DB_NAME = config.get('database', 'databaseName').replace("\"", "")
-DB_PATH = config.get('database', 'databasePath').replace("\"", "")
-DATASET_TB_SCHEMA = eval(config.get('database', 'datasetTableSchema'))
+SETTINGS = get_settings()
+JSON_DATASET_ABSPATH = SETTINGS.json_dataset_path
+DB_NAME = SETTINGS.database_name
+DB_PATH = SETTINGS.database_dir
+DATASET_TB_SCHEMA = SETTINGS.dataset_table_schema
 DEFAULT_DB_COL_ORDER = [list(v.keys())[0] for v in DATASET_TB_SCHEMA]
 NON_OPTIONAL_METADATA_COL = [list(v.keys())[0] for v in DATASET_TB_SCHEMA if v['optional'] == False and v["default"] == False]
 OPTIONAL_METADATA_COL = [list(v.keys())[0] for v in DATASET_TB_SCHEMA if v['optional'] == True]
@@ -60,6 +64,8 @@ def create_sqlite_db(db_conn):
 
     
     cur = db_conn.cursor()
+    # WAL lets the server's read-only connections read while the database is being updated
+    cur.execute("PRAGMA journal_mode=WAL;")
     cur.execute(create_table_sql)
 
     cur.execute("""
@@ -83,6 +89,269 @@ def load_database_table(db_conn, column="*", table_name="Dataset"):
     cur.execute(sql)
     return [i[0] for i in cur.fetchall()]
 
+# ===================================================================================================================================================
+# | INDEX FUNCTIONS | ===============================================================================================================================
+
+INDEX_PREFIX = "idx_Dataset_"
+
+def get_metadata_index_sql():
+    '''
+    Generate the secondary indexes required by the configured metadata fields ([document] metadata):
+        - allow_sort    : (field, id), covers the keyset pagination seek and ORDER BY field, id
+        - allow_filter  : (field COLLATE NOCASE, id) for text fields, so case-insensitive LIKE 'term%' and
+                          equality filters can use the index ((field, id) for other types)
+    :return: Dictionary mapping between index names and their CREATE INDEX statements
+    '''
+    index_sql = dict()
+    for field in SETTINGS.metadata:
+        if field.allow_sort:
+            name = f"{INDEX_PREFIX}{field.name}"
+            index_sql[name] = f"CREATE INDEX IF NOT EXISTS {name} ON Dataset ({field.name}, id);"
+        if field.allow_filter:
+            if field.type == "str":
+                name = f"{INDEX_PREFIX}{field.name}_nocase"
+                index_sql[name] = f"CREATE INDEX IF NOT EXISTS {name} ON Dataset ({field.name} COLLATE NOCASE, id);"
+            else:
+                name = f"{INDEX_PREFIX}{field.name}"
+                index_sql[name] = f"CREATE INDEX IF NOT EXISTS {name} ON Dataset ({field.name}, id);"
+    return index_sql
+
+def create_metadata_indexes(db_conn):
+    '''
+    Create the indexes of the sortable/filterable metadata fields and drop the generated indexes of fields
+    that are no longer sortable/filterable. Statistics are refreshed (ANALYZE) for the query planner.
+    :param db_conn: SQLite DB connection
+    '''
+    index_sql = get_metadata_index_sql()
+    cur = db_conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'Dataset' AND name LIKE ?;",
+                (f"{INDEX_PREFIX}%",))
+    for (name,) in cur.fetchall():
+        if name not in index_sql:
+            print(f" - Dropping index {name}")
+            cur.execute(f"DROP INDEX IF EXISTS {name};")
+    for name, sql in index_sql.items():
+        print(f" - Creating index {name}")
+        cur.execute(sql)
+    cur.execute("ANALYZE;")
+    db_conn.commit()
+    cur.close()
+
+FTS_TABLE = "Dataset_fts"
+
+def get_fts_columns():
+    '''
+    Text metadata fields that allow filtering, indexed in the FTS5 shadow table.
+    '''
+    return [field.name for field in SETTINGS.metadata if field.allow_filter and field.type == "str"]
+
+def create_fts_index(db_conn):
+    '''
+    Create (or re-create when the filterable columns changed) the FTS5 shadow table of the filterable text
+    columns, populate it from Dataset and install the triggers keeping it in sync with Dataset.
+    The trigram tokenizer (substring matching, SQLite >= 3.34) is used when available, unicode61 otherwise.
+    :param db_conn: SQLite DB connection
+    '''
+    columns = get_fts_columns()
+    cur = db_conn.cursor()
+    cur.execute(f"SELECT name FROM pragma_table_info('{FTS_TABLE}');")
+    existing_columns = [row[0] for row in cur.fetchall()]
+    if existing_columns != columns:
+        for trigger in ["ai", "ad", "au"]:
+            cur.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger};")
+        cur.execute(f"DROP TABLE IF EXISTS {FTS_TABLE};")
+    if not columns:
+        db_conn.commit()
+        cur.close()
+        return
+
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{col}" for col in columns)
+    old_values = ", ".join(f"old.{col}" for col in columns)
+    for tokenizer in ["trigram", "unicode61"]:
+        try:
+            cur.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+                USING fts5({column_list}, content='Dataset', content_rowid='id', tokenize='{tokenizer}');
+            """)
+            break
+        except sqlite3.OperationalError as ex:
+            print(f" - FTS5 tokenizer {tokenizer} unavailable ({ex})")
+    else:
+        print(" - FTS5 unavailable, metadata filters will use LIKE")
+        cur.close()
+        return
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON Dataset BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON Dataset BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON Dataset BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {column_list}) VALUES (new.id, {new_values});
+        END;
+    """)
+    print(f" - Populating full-text index {FTS_TABLE} ({column_list})")
+    cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild');")
+    db_conn.commit()
+    cur.close()
+
+CHANGE_LOG_TABLE = "Dataset_changes"
+
+def create_change_log(db_conn):
+    '''
+    Create the change log of the Dataset table and the triggers filling it: one row per inserted, updated or
+    deleted document, numbered in commit order (seq). The search indexes apply the changes after the last
+    seq they indexed (their watermark) instead of being rebuilt, see searcher/index_updater.py.
+    Changes made before the log exists are not logged, the indexes have to be rebuilt once.
+    :param db_conn: SQLite DB connection
+    '''
+    cur = db_conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE} (
+            seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+            id          INTEGER NOT NULL,
+            op          TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+            created_at  DATETIME NOT NULL DEFAULT current_timestamp
+        );
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {CHANGE_LOG_TABLE}_ai AFTER INSERT ON Dataset BEGIN
+            INSERT INTO {CHANGE_LOG_TABLE}(id, op) VALUES (new.id, 'insert');
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {CHANGE_LOG_TABLE}_ad AFTER DELETE ON Dataset BEGIN
+            INSERT INTO {CHANGE_LOG_TABLE}(id, op) VALUES (old.id, 'delete');
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {CHANGE_LOG_TABLE}_au AFTER UPDATE ON Dataset BEGIN
+            INSERT INTO {CHANGE_LOG_TABLE}(id, op) SELECT old.id, 'delete' WHERE old.id != new.id;
+            INSERT INTO {CHANGE_LOG_TABLE}(id, op) VALUES (new.id, 'update');
+        END;
+    """)
+    db_conn.commit()
+    cur.close()
+
+def get_change_log_watermark(db_conn):
+    '''
+    Get the seq of the latest change of the Dataset table.
+    :param db_conn: SQLite DB connection
+    :return: Latest seq, 0 when the log is empty or does not exist
+    '''
+    cur = db_conn.cursor()
+    try:
+        cur.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {CHANGE_LOG_TABLE};")
+        return cur.fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        cur.close()
+
+def read_change_log(db_conn, watermark, limit):
+    '''
+    Read the changes of the Dataset table after the given watermark, the latest change of a document wins.
+    :param db_conn: SQLite DB connection
+    :param watermark: seq of the last applied change
+    :param limit: Maximum number of changes to read
+    :return: (seq of the last change read, dictionary mapping between document ids and 'insert'/'update'/'delete')
+    '''
+    cur = db_conn.cursor()
+    cur.execute(f"SELECT seq, id, op FROM {CHANGE_LOG_TABLE} WHERE seq > ? ORDER BY seq LIMIT ?;", (watermark, limit))
+    changes = dict()
+    for seq, doc_id, op in cur.fetchall():
+        changes[doc_id] = op
+        watermark = seq
+    cur.close()
+    return watermark, changes
+
+def prune_change_log(db_conn, watermark):
+    '''
+    Delete the changes up to the given watermark, once every search index has applied them.
+    :param db_conn: SQLite DB connection
+    :param watermark: seq of the last change to delete
+    '''
+    cur = db_conn.cursor()
+    cur.execute(f"DELETE FROM {CHANGE_LOG_TABLE} WHERE seq <= ?;", (watermark,))
+    print(f" - Pruned {cur.rowcount} changes from {CHANGE_LOG_TABLE}")
+    db_conn.commit()
+    cur.close()
+
+def get_fts_tokenizer(db_conn):
+    '''
+    Get the tokenizer of the FTS5 shadow table.
+    :param db_conn: SQLite DB connection
+    :return: "trigram", "unicode61" or None when the table does not exist
+    '''
+    cur = db_conn.cursor()
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", (FTS_TABLE,))
+    row = cur.fetchone()
+    cur.close()
+    if not row:
+        return None
+    return "trigram" if "trigram" in row[0] else "unicode61"
+
+def find_unindexed_fields(db_conn):
+    '''
+    Find the sortable/filterable metadata fields that are not the leading column of any index on Dataset.
+    :param db_conn: SQLite DB connection
+    :return: List of field names
+    '''
+    cur = db_conn.cursor()
+    cur.execute("PRAGMA index_list(Dataset);")
+    leading_columns = set()
+    for index in cur.fetchall():
+        cur.execute(f"PRAGMA index_info({index[1]});")
+        columns = sorted(cur.fetchall())
+        if columns:
+            leading_columns.add(columns[0][2])
+    cur.close()
+    return [field.name for field in SETTINGS.metadata
+            if (field.allow_sort or field.allow_filter) and field.name not in leading_columns]
+
+def explain_query_plans(db_conn):
+    '''
+    Print the EXPLAIN QUERY PLAN of the queries issued by the server for every sortable/filterable field.
+    Full table scans and temporary B-trees (sorting outside an index) are highlighted.
+    :param db_conn: SQLite DB connection
+    '''
+    queries = []
+    for field in SETTINGS.metadata:
+        if field.allow_sort:
+            queries.append((f"Sort by {field.name} (first page)",
+                            f"SELECT * FROM Dataset ORDER BY {field.name} ASC, id ASC LIMIT 100", ()))
+            queries.append((f"Sort by {field.name} (next page)",
+                            f"SELECT * FROM Dataset WHERE ({field.name}, id) > (?, ?) ORDER BY {field.name} ASC, id ASC LIMIT 100",
+                            (0, 0)))
+        if field.allow_filter:
+            queries.append((f"Filter {field.name} (prefix)",
+                            f"SELECT * FROM Dataset WHERE {field.name} LIKE ? ORDER BY id LIMIT 100", ("abc%",)))
+            queries.append((f"Filter {field.name} (substring)",
+                            f"SELECT * FROM Dataset WHERE {field.name} LIKE ? ORDER BY id LIMIT 100", ("%abc%",)))
+            if field.name in get_fts_columns() and get_fts_tokenizer(db_conn):
+                queries.append((f"Filter {field.name} (full-text)",
+                                f"SELECT * FROM Dataset WHERE id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?) ORDER BY id LIMIT 100",
+                                (f'{field.name} : "abc"',)))
+
+    cur = db_conn.cursor()
+    for title, sql, params in queries:
+        print(f"\n[{title}] {sql}")
+        cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        for row in cur.fetchall():
+            detail = row[-1]
+            if detail.startswith("SCAN Dataset") and "USING" not in detail or "TEMP B-TREE" in detail:
+                detail = colored(detail, "yellow")
+            print(f"   {detail}")
+    cur.close()
+
 # ===================================================================================================================================================
 # | DATASET PARSER FUNCTIONS | ======================================================================================================================
 
@@ -192,10 +461,29 @@ if __name__ == "__main__":
     # parser.add_argument('-o', '--override', type=bool, dest="override", default=None, help='Override previous data record in the database on conflict')
     
     # args = parser.parse_args()
-    
+    parser = argparse.ArgumentParser(description='Topic Modeling Toolkit Dataset Handler')
+    parser.add_argument('-i', '--index', dest="index", default=False, action="store_true", help='Only (re)create the metadata and full-text indexes of the existing database')
+    parser.add_argument('-e', '--explain', dest="explain", default=False, action="store_true", help='Print the query plans of the server queries for the configured metadata fields')
+    parser.add_argument('-p', '--prune-changes', type=int, dest="prune_changes", default=None, help='Delete the logged changes up to the given seq (applied by every search index)')
+    args = parser.parse_args()
+
     conn = get_sqlite_conn()                    # GET DB CONNECTION
+    if args.index or args.explain or args.prune_changes is not None:
+        if args.index:
+            create_metadata_indexes(conn)       # SYNC METADATA INDEXES WITH THE CONFIG
+            create_fts_index(conn)              # SYNC FULL-TEXT INDEX WITH THE CONFIG
+            create_change_log(conn)             # LOG THE CHANGES FOR THE INCREMENTAL SEARCH INDEXES
+        if args.prune_changes is not None:
+            prune_change_log(conn, args.prune_changes)
+        if args.explain:
+            explain_query_plans(conn)           # QUERY PLAN REPORT
+        sys.exit()
+
     drop_all_sqlite_tables(conn)                # CLEAR NON-METADATA TABLES (CLEAN RUN) 
     create_sqlite_db(conn)                      # CREATE NEW DATA TABLE
     
     dataset = load_dataset()                    # LOAD DATASET FROM JSON
     load_to_db(conn, dataset, validate=True)    # INSERT DATA INTO DB + VALIDATION
+    create_change_log(conn)                     # LOG THE LATER CHANGES (THE INITIAL LOAD IS INDEXED IN FULL)
+    create_metadata_indexes(conn)               # INDEXES FOR SORTABLE/FILTERABLE METADATA
+    create_fts_index(conn)                      # FULL-TEXT INDEX FOR FILTERABLE TEXT METADATA
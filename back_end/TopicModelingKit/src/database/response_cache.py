@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Seconds between two updates of the access time of an entry (reads only write when the time is stale)
+ACCESS_TIME_RESOLUTION = 60
+# Evictions free space down to this fraction of the maximum size, so they do not run on every put
+EVICTION_TARGET = 0.9
+
+
+class ResponseCache:
+    """
+    Cache of serialized API responses shared by the server's worker processes, keyed on a string built from
+    the request (see the server's response_cache_key()).
+
+    Entries belong to a generation. sync() is called with a fingerprint of the data the responses are
+    derived from (model and search index) and its version (e.g. the watermark of the index), a new fingerprint
+    or a newer version starts a new generation and every older entry stops being served at once.
+    """
+
+    def get(self, key):
+        """
+        Get a cached (body, headers) response, None when missing or stale.
+        """
+        return None
+
+    def put(self, key, body: bytes, headers: dict):
+        return
+
+    def sync(self, fingerprint: str, version: int = 0):
+        """
+        Start a new generation when the fingerprint differs from the one of the current generation, or when
+        the version is newer. A process with an older version (e.g. its index is still being updated) leaves
+        the generation to the others, and does not use the cache until it catches up.
+        """
+        return
+
+    def invalidate(self):
+        """
+        Start a new generation, e.g. after rebuilding the search index or the database.
+        """
+        return
+
+    def stats(self):
+        return {'backend': 'none'}
+
+    def close(self):
+        return
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    Response cache in a local SQLite file (WAL mode), shared by every process opening the same path.
+
+    The total size of the cached bodies is bounded, the least recently used entries are evicted first.
+    The current generation and its fingerprint are stored in the file, so invalidation is a single
+    transaction that every process sees on its next lookup.
+
+    :param path: Path of the cache database (created if missing)
+    :param max_size: Maximum total size of the cached bodies, in bytes
+    :param max_entry_size: Larger responses are not cached, in bytes
+    :param timeout: Seconds to wait for a lock held by another process
+    :param mmap_size: PRAGMA mmap_size in bytes
+    """
+
+    def __init__(self, path, max_size=256 << 20, max_entry_size=1 << 20, timeout=5, mmap_size=268435456):
+        self.path = path
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.generation = None  # Generation of the responses this process computes, set by sync()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # One connection per thread, and never one inherited from the parent of a forked worker
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        conn.execute("CREATE TABLE IF NOT EXISTS Meta (id INTEGER PRIMARY KEY CHECK (id = 0),"
+                     " generation INTEGER NOT NULL, fingerprint TEXT, size INTEGER NOT NULL,"
+                     " version INTEGER NOT NULL DEFAULT 0)")
+        if 'version' not in {row[1] for row in conn.execute("PRAGMA table_info(Meta)")}:
+            try:
+                conn.execute("ALTER TABLE Meta ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # Added by another process meanwhile
+        conn.execute("INSERT OR IGNORE INTO Meta (id, generation, fingerprint, size) VALUES (0, 0, NULL, 0)")
+        conn.execute("CREATE TABLE IF NOT EXISTS Entries (key TEXT PRIMARY KEY, generation INTEGER NOT NULL,"
+                     " body BLOB NOT NULL, headers TEXT NOT NULL, size INTEGER NOT NULL, accessed INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS Entries_accessed ON Entries (accessed)")
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        if self.generation is None:
+            return None
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT body, headers, accessed FROM Entries JOIN Meta ON Entries.generation = Meta.generation"
+                " WHERE key = ? AND Entries.generation = ?", (key, self.generation)).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            now = int(time.time())
+            if now - row[2] >= ACCESS_TIME_RESOLUTION:
+                conn.execute("UPDATE Entries SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as ex:
+            print(f"Response cache lookup failed: {ex}")
+            return None
+        self._count('hits')
+        return bytes(row[0]), json.loads(row[1])
+
+    def put(self, key, body: bytes, headers: dict):
+        if self.generation is None or len(body) > self.max_entry_size:
+            return
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation, size = conn.execute("SELECT generation, size FROM Meta").fetchone()
+                if generation != self.generation:
+                    # Computed from data that was replaced meanwhile
+                    conn.execute("ROLLBACK")
+                    return
+                previous = conn.execute("SELECT size FROM Entries WHERE key = ?", (key,)).fetchone()
+                size += len(body) - (previous[0] if previous else 0)
+                conn.execute("INSERT OR REPLACE INTO Entries VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, generation, body, json.dumps(headers), len(body), int(time.time())))
+                if size > self.max_size:
+                    size = self._evict(conn, size)
+                conn.execute("UPDATE Meta SET size = ?", (size,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as ex:
+            print(f"Response cache update failed: {ex}")
+
+    def _evict(self, conn, size):
+        target = self.max_size * EVICTION_TARGET
+        evicted = []
+        for key, entry_size in conn.execute("SELECT key, size FROM Entries ORDER BY accessed"):
+            if size <= target:
+                break
+            evicted.append((key,))
+            size -= entry_size
+        conn.executemany("DELETE FROM Entries WHERE key = ?", evicted)
+        with self._lock:
+            self.evictions += len(evicted)
+        return size
+
+    def _new_generation(self, conn, fingerprint, version=0):
+        conn.execute("DELETE FROM Entries")
+        conn.execute("UPDATE Meta SET generation = generation + 1, fingerprint = ?, version = ?, size = 0",
+                     (fingerprint, version))
+        return conn.execute("SELECT generation FROM Meta").fetchone()[0]
+
+    def sync(self, fingerprint: str, version: int = 0):
+        try:
+            conn = self._connect()
+            generation, current, current_version = conn.execute(
+                "SELECT generation, fingerprint, version FROM Meta").fetchone()
+            if current != fingerprint or current_version < version:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Another process may have started the generation meanwhile
+                    generation, current, current_version = conn.execute(
+                        "SELECT generation, fingerprint, version FROM Meta").fetchone()
+                    if current != fingerprint or current_version < version:
+                        generation = self._new_generation(conn, fingerprint, version)
+                        current_version = version
+                        print(f"Response cache generation {generation} ({fingerprint} v{version})")
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            # Responses computed from older data are neither served from nor stored in the newer generation
+            self.generation = generation if current_version == version else None
+        except sqlite3.Error as ex:
+            print(f"Response cache sync failed, caching disabled: {ex}")
+            self.generation = None
+
+    def invalidate(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # No process serves the new generation until its next sync()
+            self._new_generation(conn, None)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        """
+        Get the cache counters (hits, misses and evictions of this process) and the shared size.
+        """
+        try:
+            generation, size = self._connect().execute("SELECT generation, size FROM Meta").fetchone()
+            entries = self._connect().execute("SELECT COUNT(*) FROM Entries").fetchone()[0]
+        except sqlite3.Error:
+            generation, size, entries = (float('nan'),) * 3
+        return {
+            'backend': 'sqlite',
+            'generation': generation,
+            'entries': entries,
+            'size': size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local = threading.local()
+
+
+RESPONSE_CACHE_BACKENDS = {
+    'none': lambda **options: ResponseCache(),
+    'sqlite': SQLiteResponseCache,
+}
+
+
+def create_response_cache(backend: str, **options):
+    """
+    Create the response cache of the given backend ('none' or 'sqlite'), with its backend specific options.
+    """
+    if backend not in RESPONSE_CACHE_BACKENDS:
+        raise ValueError(f"Unknown response cache backend: {backend}")
+    return RESPONSE_CACHE_BACKENDS[backend](**options)
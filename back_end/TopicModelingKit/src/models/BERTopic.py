@@ -2,23 +2,51 @@
 import os
 import sys
 import math
+import uuid
 import pickle
-import configparser
 import multiprocessing
+import numpy as np
 from nltk.corpus import stopwords
-from bertopic import BERTopic
 
+from ..settings import get_settings
 from .data_handler import TopicModelingToolkitDataHandler, load_documents_from_sqlite
+from .topic_index import TopicDocumentIndex, TopicNeighbourTable
+from .document_map import DocumentIdMap
+from .query_cache import QueryCache
+from .vector_index import DocumentVectorIndex
+from .artifacts import write_artifacts, load_artifacts, has_artifacts, manifest_digest, LoadedTopicModel
 
 class BertopicModel:
-    def __init__(self, docs: list, trained_model=None):
+    def __init__(self, docs: list, trained_model=None, query_cache_size=1024, query_cache_ttl=None):
         self.documents = docs
         self.trained_model = trained_model
         self.DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bertopic_model_bk")
+        self.DEFAULT_ARTIFACTS_DIRNAME = "bertopic_artifacts"
+        self.DEFAULT_VERIFY_ARTIFACTS = True  # Check the sha256 of the artifact files on load
+
+        # Legacy layout (pickled model + per-structure files), migrated to the artifact directory on load
         self.DEFAULT_MODEL_FILENAME = "bertopic_model.pickle"
-        self.DEFAULT_DOC_IDX_ID_MAP_FILENAME = "bertopic_document_map.pickle"
+        self.DEFAULT_DOC_IDX_ID_MAP_FILENAME = "bertopic_document_map.pickle"  # Legacy {idx: id} dict
+        self.DEFAULT_DOC_IDX_ID_MAP_DIRNAME = "bertopic_document_map"
+        self.DEFAULT_TOPIC_INDEX_FILENAME = "bertopic_topic_index.npz"
+        self.DEFAULT_TOPIC_NEIGHBOURS_FILENAME = "bertopic_topic_neighbours.npz"
+        self.DEFAULT_TOPIC_NEIGHBOUR_COUNT = 10
+        self.DEFAULT_DOCUMENT_VECTORS_FILENAME = "bertopic_document_vectors.npy"
+        self.DEFAULT_DOCUMENT_TOPICS_FILENAME = "bertopic_document_topics.npy"
+        self.DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # BERTopic's default english embedding model
+        self.DEFAULT_SIMILAR_DOCUMENT_PROBES = 5  # Topics searched by similar_documents(), 0 for all documents
 
         self.DOCUMENT_IDX_ID_MAP = None
+        self.model_id = None  # Identifies the trained model (digest of its artifact manifest)
+        self.document_topics = None  # Topic ID of every document index (numpy array)
+        self.topic_index = None
+        self.topic_neighbours = None
+        self.document_vectors = None
+
+        # Query string -> embedding, and (query string, top_n) -> find_topics() result
+        self.query_embedding_cache = QueryCache(query_cache_size, query_cache_ttl)
+        self.query_topics_cache = QueryCache(query_cache_size, query_cache_ttl)
+        self._topic_embedding_matrix = None
 
         # Create model directory
         if not os.path.exists(self.DEFAULT_MODEL_PATH):
@@ -36,33 +64,56 @@ class BertopicModel:
         :param load_trained_model: True to load a train model and False otherwise. Use False to force a model training.
         :param offload_trained_model: True to save the model and False otherwise.  
         """
+        artifacts_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_ARTIFACTS_DIRNAME)
+
         def offload_model():
             if not os.path.exists(self.DEFAULT_MODEL_PATH):
                 os.makedirs(self.DEFAULT_MODEL_PATH)
-            offload_model_absp = os.path.join(
-                self.DEFAULT_MODEL_PATH, self.DEFAULT_MODEL_FILENAME)
-            with open(offload_model_absp, "wb") as wf:
-                pickle.dump(self.trained_model, wf)
-
-            offload_doc_map_absp = os.path.join(
-                self.DEFAULT_MODEL_PATH, self.DEFAULT_DOC_IDX_ID_MAP_FILENAME)
-            with open(offload_doc_map_absp, "wb") as wf:
-                pickle.dump(self.DOCUMENT_IDX_ID_MAP, wf)
-
-            print(f" - Trained Model Off-loaded ({offload_model_absp})...")
-            print(f" - Trained Document Map Off-loaded ({offload_doc_map_absp})...")
+            self.save_artifacts(artifacts_absp)
+            print(f" - Trained Model Off-loaded ({artifacts_absp})...")
 
         def load_model():
+            try:
+                if has_artifacts(artifacts_absp):
+                    print(f"Loading model {artifacts_absp}")
+                    self.load_from_artifacts(artifacts_absp)
+                    return True
+                return load_legacy_model()
+            except Exception as ex:
+                print(f"Model loading failed: {ex}")
+                return False
+
+        def load_legacy_model():
             try:
                 print(
                     f"Loading model {os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_MODEL_FILENAME)}")
                 with open(os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_MODEL_FILENAME), 'rb') as rf:
                     self.trained_model = pickle.load(rf)
-                with open(os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_DOC_IDX_ID_MAP_FILENAME), 'rb') as rf:
-                    self.DOCUMENT_IDX_ID_MAP = pickle.load(rf)
+                doc_map_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_DOC_IDX_ID_MAP_DIRNAME)
+                if os.path.exists(doc_map_absp):
+                    self.DOCUMENT_IDX_ID_MAP = DocumentIdMap.load(doc_map_absp)
+                else:
+                    # Migrate the legacy pickled {idx: id} dict
+                    with open(os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_DOC_IDX_ID_MAP_FILENAME), 'rb') as rf:
+                        self.DOCUMENT_IDX_ID_MAP = DocumentIdMap.from_dict(pickle.load(rf))
+                # Memory-mapped, so processes forked from (or started next to) this one share the pages
+                document_topics_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_DOCUMENT_TOPICS_FILENAME)
+                if os.path.exists(document_topics_absp):
+                    self.document_topics = np.load(document_topics_absp, mmap_mode="r")
+                # Models saved before the topic index existed get it rebuilt below
+                topic_index_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_TOPIC_INDEX_FILENAME)
+                if os.path.exists(topic_index_absp):
+                    self.topic_index = TopicDocumentIndex.load(topic_index_absp)
+                topic_neighbours_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_TOPIC_NEIGHBOURS_FILENAME)
+                if os.path.exists(topic_neighbours_absp):
+                    self.topic_neighbours = TopicNeighbourTable.load(topic_neighbours_absp)
+                # Document vectors can only be built at training time (document embeddings are not pickled)
+                document_vectors_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_DOCUMENT_VECTORS_FILENAME)
+                if os.path.exists(document_vectors_absp):
+                    self.document_vectors = DocumentVectorIndex.load(document_vectors_absp)
                 return True
             except Exception as ex:
-                print(ex.__traceback__)
+                print(f"Model loading failed: {ex}")
                 return False
 
         # Load model
@@ -76,16 +127,140 @@ class BertopicModel:
         if not load_trained_model or not load_success:
             print("Training model...")
             NUM_OF_TOPICS = 100  # or "auto"
+
+            from bertopic import BERTopic
+            from sentence_transformers import SentenceTransformer
+
+            # Embed the documents up front so the embeddings can be kept for the document vector index
+            embedding_model = SentenceTransformer(self.DEFAULT_EMBEDDING_MODEL)
+            embeddings = embedding_model.encode(self.documents, show_progress_bar=True)
+
             topic_model = BERTopic(
-                language="english", n_gram_range=num_topics, nr_topics=NUM_OF_TOPICS, verbose=True)
-            topics, probs = topic_model.fit_transform(self.documents)
+                language="english", embedding_model=embedding_model, n_gram_range=num_topics,
+                nr_topics=NUM_OF_TOPICS, verbose=True)
+            topics, probs = topic_model.fit_transform(self.documents, embeddings)
             self.trained_model = topic_model
+            self.model_id = uuid.uuid4().hex  # Replaced by the manifest digest once saved
+            self.document_topics = None
+            self.topic_index = None
+            self.topic_neighbours = None
+            self.document_vectors = DocumentVectorIndex.build(embeddings)
+
+        self._topic_embedding_matrix = None
+        self.query_embedding_cache.clear()
+        self.query_topics_cache.clear()
+
+        if self.document_topics is None:
+            self.document_topics = np.asarray(self.trained_model.topics_, dtype=np.int32)
+        if self.topic_index is None:
+            self.build_topic_index()
+        if self.topic_neighbours is None:
+            self.build_topic_neighbours()
 
         # Save trained model (if model is loaded, don't offload it again)
         if not load_trained_model and offload_trained_model:
             offload_model()
+
+        # Models loaded from the legacy pickles are migrated to the artifact directory
+        if load_trained_model and not has_artifacts(artifacts_absp):
+            print("Migrating the model to the artifact format...")
+            offload_model()
             
 
+    def save_artifacts(self, directory):
+        """
+        Save the trained model as an artifact directory: numpy arrays for the topic assignments, probabilities,
+        topic embeddings and the serving indexes, a sparse matrix for the c-TF-IDF, the topic words as JSON
+        and the name of the embedding model (the model itself is not stored).
+        """
+        doc_map = self.DOCUMENT_IDX_ID_MAP
+        topic_representations = {
+            str(topic_id): [[word, float(score)] for word, score in words]
+            for topic_id, words in self.trained_model.topic_representations_.items()
+        }
+        representative_docs = {
+            str(topic_id): list(docs)
+            for topic_id, docs in (getattr(self.trained_model, "representative_docs_", None) or {}).items()
+        }
+        manifest = write_artifacts(
+            directory,
+            arrays={
+                "document_topics": self.document_topics,
+                "probabilities": getattr(self.trained_model, "probabilities_", None),
+                "topic_embeddings": self.trained_model.topic_embeddings_,
+                "document_ids": doc_map.ids,
+                "document_sorted_ids": None if doc_map.sorted_idx is None else doc_map.sorted_ids,
+                "document_sorted_idx": doc_map.sorted_idx,
+                "topic_index_topic_ids": self.topic_index.topic_ids,
+                "topic_index_offsets": self.topic_index.offsets,
+                "topic_index_postings": self.topic_index.postings,
+                "topic_index_scores": self.topic_index.scores,
+                "topic_neighbours_topic_ids": self.topic_neighbours.topic_ids,
+                "topic_neighbours": self.topic_neighbours.neighbours,
+                "topic_neighbours_scores": self.topic_neighbours.scores,
+                "document_vectors": None if self.document_vectors is None else self.document_vectors.vectors,
+            },
+            sparse={"c_tf_idf": getattr(self.trained_model, "c_tf_idf_", None)},
+            documents={"topics": {
+                "representations": topic_representations,
+                "representative_docs": representative_docs,
+            }},
+            metadata={
+                "model": "bertopic",
+                "embedding_model": self.DEFAULT_EMBEDDING_MODEL,
+                "documents": len(doc_map),
+                "topics": len(topic_representations),
+            }
+        )
+        self.model_id = manifest_digest(manifest)
+
+    def load_from_artifacts(self, directory):
+        """
+        Load a model saved by save_artifacts(). Arrays are memory-mapped, the embedding model is loaded on the
+        first query.
+        """
+        manifest, artifacts = load_artifacts(directory, mmap_mode="r", verify=self.DEFAULT_VERIFY_ARTIFACTS)
+        self.trained_model = LoadedTopicModel(manifest, artifacts)
+        self.model_id = manifest_digest(manifest)
+        self.document_topics = artifacts["document_topics"]
+        self.DOCUMENT_IDX_ID_MAP = DocumentIdMap(
+            artifacts["document_ids"], artifacts.get("document_sorted_ids"), artifacts.get("document_sorted_idx"))
+        self.topic_index = TopicDocumentIndex(
+            topic_ids=artifacts["topic_index_topic_ids"],
+            offsets=artifacts["topic_index_offsets"],
+            postings=artifacts["topic_index_postings"],
+            scores=artifacts["topic_index_scores"],
+        )
+        self.topic_neighbours = TopicNeighbourTable(
+            topic_ids=artifacts["topic_neighbours_topic_ids"],
+            neighbours=artifacts["topic_neighbours"],
+            scores=artifacts["topic_neighbours_scores"],
+        )
+        if "document_vectors" in artifacts:
+            self.document_vectors = DocumentVectorIndex(artifacts["document_vectors"])
+
+    def build_topic_index(self):
+        """
+        Build the topic -> document inverted index from the trained model's topic assignments.
+        Posting lists are ranked by the probability of each document for its topic.
+        """
+        print("Building topic document index...")
+        self.topic_index = TopicDocumentIndex.build(
+            self.get_document_topic_map(),
+            getattr(self.trained_model, "probabilities_", None)
+        )
+
+    def build_topic_neighbours(self):
+        """
+        Build the topic -> most similar topics table from the topic embeddings.
+        """
+        print("Building topic neighbour table...")
+        self.topic_neighbours = TopicNeighbourTable.build(
+            sorted(self.trained_model.topic_representations_.keys()),
+            self.get_topic_embedding_matrix(),
+            k=self.DEFAULT_TOPIC_NEIGHBOUR_COUNT
+        )
+
     # ===========================================
     # =========| BASE HELPER FUNCTIONS |=========
     # ===========================================
@@ -99,14 +274,14 @@ class BertopicModel:
     def get_document_topic_map(self):
         """
         Get a map between the document index and its corresponding topic ID 
-            :return: A list similar to :
+            :return: A numpy array similar to :
                 [1, 1, 0, 2]
                 where   doc index 0 = topic ID 1
                         doc index 1 = topic ID 1
                         doc index 2 = topic ID 0
                         doc index 3 = topic ID 2
         """
-        return self.trained_model.topics_
+        return self.document_topics
 
     # ==========================================
     # ===========| TOPIC FUNCTIONS |============
@@ -143,11 +318,20 @@ class BertopicModel:
         """
         Get all topic labels for the model.
         """
-        topic_ids = sorted(set(self.get_document_topic_map()))
+        topic_ids = np.unique(self.get_document_topic_map()).tolist()
         # print(topic_ids, [d for d in [self.get_topic_words(tid)
         #       for tid in topic_ids]])
         return [d for d in [self.get_topic_words(tid) for tid in topic_ids if tid != -1]]
 
+    def get_similar_topics(self, topic_id, k=5):
+        """
+        Get the topics most similar to the given topic (precomputed, no model inference)
+            :param topic_id: The topic ID to search
+            :param k: Number of similar topics to return
+            :return: (similar topic IDs, similarity scores), most similar first
+        """
+        return self.topic_neighbours.get(topic_id, k)
+
     def get_topic_words(self, topic_id):
         """
         Get the words corresponded to the given topic
@@ -165,15 +349,104 @@ class BertopicModel:
 
     def get_documents_with_topic_id(self, topic_id: int, count=None):
         """
-        Get document IDs with matching given topic ID
+        Get document IDs with matching given topic ID, ranked by their topic probability
             :param topic_id: The topic ID to filter
             :param count: Number of doc IDs to return
             :return: A list of document IDs with the given topic ID
         """
-        doc_topic_map = self.get_document_topic_map()
-        doc_ids = [_doc_id for _doc_id, _topic_id in enumerate(
-            doc_topic_map) if _topic_id == topic_id]
-        return doc_ids if count == None else doc_ids[count]
+        return self.topic_index.documents(topic_id, count).tolist()
+
+    def embed_query(self, query):
+        """
+        Get the (L2-normalized) embedding of a query string, served from the cache when the query was seen before.
+            :param query: The given query string
+            :return: A 1D numpy array
+        """
+        embedding = self.query_embedding_cache.get(query)
+        if embedding is None:
+            embedding = self.trained_model.embedding_model.embed_words([query], verbose=False)
+            embedding = np.asarray(embedding, dtype=np.float32).flatten()
+            embedding /= max(np.linalg.norm(embedding), 1e-12)
+            self.query_embedding_cache.put(query, embedding)
+        return embedding
+
+    def embed_queries(self, queries):
+        """
+        Get the (L2-normalized) embeddings of several query strings. Queries missing from the cache are
+        embedded together in a single batch.
+            :param queries: The given query strings
+            :return: A 2D numpy array, one row per query
+        """
+        embeddings = [self.query_embedding_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if missing:
+            batch = self.trained_model.embedding_model.embed_words(missing, verbose=False)
+            batch = np.asarray(batch, dtype=np.float32).reshape(len(missing), -1)
+            batch /= np.maximum(np.linalg.norm(batch, axis=1, keepdims=True), 1e-12)
+            embedded = dict(zip(missing, batch))
+            for query, embedding in embedded.items():
+                self.query_embedding_cache.put(query, embedding)
+            embeddings = [embedded[q] if e is None else e for q, e in zip(queries, embeddings)]
+        return np.vstack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+
+    def get_topic_embedding_matrix(self):
+        """
+        Get the L2-normalized topic embeddings, one row per topic ID in ascending order.
+        """
+        if self._topic_embedding_matrix is None:
+            matrix = np.asarray(self.trained_model.topic_embeddings_, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._topic_embedding_matrix = matrix / np.maximum(norms, 1e-12)
+        return self._topic_embedding_matrix
+
+    def find_topics(self, query, top_n=5):
+        """
+        Cached equivalent of BERTopic.find_topics(): topics most similar to the query string.
+        Repeated queries skip the embedding model entirely.
+
+        :param query: The given query string
+        :param top_n: Number of topics to return
+        :return: (similar topic IDs, similarity scores), most similar first
+        """
+        cached = self.query_topics_cache.get((query, top_n))
+        if cached is None:
+            sims = self.get_topic_embedding_matrix() @ self.embed_query(query)
+            topic_list = sorted(self.trained_model.topic_representations_.keys())
+            ids = np.argsort(sims)[-top_n:][::-1]
+            cached = ([topic_list[i] for i in ids], [float(sims[i]) for i in ids])
+            self.query_topics_cache.put((query, top_n), cached)
+        return list(cached[0]), list(cached[1])
+
+    def find_topics_batch(self, queries, top_n=5):
+        """
+        Batched find_topics(): the uncached queries are embedded in one pass and scored against the topics
+        with a single matrix multiply.
+
+        :param queries: The given query strings
+        :param top_n: Number of topics to return per query
+        :return: A list of (similar topic IDs, similarity scores), in the order of the queries
+        """
+        results = [self.query_topics_cache.get((query, top_n)) for query in queries]
+        missing = list(dict.fromkeys(q for q, r in zip(queries, results) if r is None))
+        if missing:
+            sims = self.embed_queries(missing) @ self.get_topic_embedding_matrix().T
+            topic_list = sorted(self.trained_model.topic_representations_.keys())
+            top = np.argsort(sims, axis=1)[:, -top_n:][:, ::-1]
+            computed = {}
+            for query, row, ids in zip(missing, sims, top):
+                computed[query] = ([topic_list[i] for i in ids], [float(row[i]) for i in ids])
+                self.query_topics_cache.put((query, top_n), computed[query])
+            results = [computed[q] if r is None else r for q, r in zip(queries, results)]
+        return [(list(topics), list(scores)) for topics, scores in results]
+
+    def get_query_cache_stats(self):
+        """
+        Get the hit/miss counters of the query caches.
+        """
+        return {
+            "embedding": self.query_embedding_cache.stats(),
+            "topics": self.query_topics_cache.stats(),
+        }
 
     def query_documents(self, query, topic_count=1, accuracy_threshold=0):
         """
@@ -183,7 +456,7 @@ class BertopicModel:
         :param topic_count: Number of topics to query
         :param accuracy_threshold: The minimum accuracy required for the document to be added to the list returned 
         """
-        similar_topics, similarity = self.trained_model.find_topics(
+        similar_topics, similarity = self.find_topics(
             query, top_n=topic_count)
 
         doc_ids = []
@@ -200,7 +473,7 @@ class BertopicModel:
         :param topic_count: Number of topics to query
         :param accuracy_threshold: The minimum accuracy required for the document to be added to the list returned 
         """
-        similar_topics, similarity = self.trained_model.find_topics(
+        similar_topics, similarity = self.find_topics(
             query, top_n=topic_count)
 
         # print(similarity)
@@ -212,6 +485,49 @@ class BertopicModel:
 
         return res
 
+    def query_documents_labels_batch(self, queries, topic_count=10, acc_threshold=0):
+        """
+        Batched query_documents_labels(): the labels of each query string, in the order of the queries.
+
+        :param queries: The given query strings
+        :param topic_count: Number of topics to query
+        :param acc_threshold: The minimum similarity required for a topic to be returned
+        """
+        return [
+            [{"id": i, "topic_list": list(self.get_topic_words(i))}
+             for i, score in zip(similar_topics, similarity) if score > acc_threshold]
+            for similar_topics, similarity in self.find_topics_batch(queries, top_n=topic_count)
+        ]
+
+    def similar_documents(self, doc_idx: int, k=20, n_probe=None):
+        """
+        Get the documents closest to the given document in the embedding space.
+
+        :param doc_idx: The document index to search
+        :param k: Number of similar documents to return
+        :param n_probe: Number of topics searched (the document's topic and its most similar topics).
+            Defaults to DEFAULT_SIMILAR_DOCUMENT_PROBES, 0 searches every document.
+        :return: (document indices, similarity scores), most similar first
+        """
+        topic_id = int(self.get_document_topic_map()[doc_idx])
+
+        # Models without document vectors fall back to the documents ranked highest in the same topic
+        if self.document_vectors is None:
+            ranked = zip(self.topic_index.documents(topic_id, k + 1).tolist(),
+                         self.topic_index.document_scores(topic_id, k + 1).tolist())
+            ranked = [(i, score) for i, score in ranked if i != doc_idx][:k]
+            return [i for i, _ in ranked], [score for _, score in ranked]
+
+        n_probe = self.DEFAULT_SIMILAR_DOCUMENT_PROBES if n_probe is None else n_probe
+        candidates = None
+        if n_probe:
+            probed_topics = [topic_id] + self.get_similar_topics(topic_id, n_probe - 1)[0]
+            candidates = np.concatenate([self.topic_index.documents(t) for t in probed_topics])
+
+        doc_indices, scores = self.document_vectors.search(
+            self.document_vectors.vector(doc_idx), k, candidates=candidates, exclude=doc_idx)
+        return doc_indices.tolist(), scores.tolist()
+
     def get_similar_documents(self, doc_id: int, num_docs=None):
         """
         Given a document, get similar documents.
@@ -227,17 +543,16 @@ class BertopicModel:
 if __name__ == "__main__":
     print("Loading documents...")
 
-    CONFIGPATH = os.path.join(os.path.dirname(
-        os.path.dirname(os.path.dirname(__file__))), "config.ini")
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
+    settings = get_settings()
 
     # =======================================
     # =====| Model Loading/Training |========
     # =======================================
 
-    load_model = config.getboolean('model-training', 'loadModel')
-    save_model = config.getboolean('model-training', 'saveModel')
+    load_model = settings.load_model
+    save_model = settings.save_model
+    query_cache_size = settings.query_cache_size
+    query_cache_ttl = settings.query_cache_ttl
     SAMPLE_COUNT = None
 
     print(f"""
@@ -254,7 +569,7 @@ if __name__ == "__main__":
         id_abs_list, idx_id_map = load_documents_from_sqlite()
 
         # Cleaning documents
-        bert_handler = TopicModelingToolkitDataHandler(sample_doc_count=None)
+        bert_handler = TopicModelingToolkitDataHandler(threads=settings.threads, sample_doc_count=None)
         lines = bert_handler.multithreaded_clean_docs(id_abs_list)
     else:
         lines = []
@@ -265,7 +580,8 @@ if __name__ == "__main__":
         SAMPLE_COUNT = len(lines)
 
     print(f"Training {SAMPLE_COUNT} documents...")
-    bm = BertopicModel(lines[:SAMPLE_COUNT] if SAMPLE_COUNT else lines)
+    bm = BertopicModel(lines[:SAMPLE_COUNT] if SAMPLE_COUNT else lines,
+                       query_cache_size=query_cache_size, query_cache_ttl=query_cache_ttl)
     bm.DOCUMENT_IDX_ID_MAP = idx_id_map
     bm.train_model(
         num_topics=(1, 1),
@@ -278,7 +594,7 @@ if __name__ == "__main__":
 
     similar_labels = []
     for label in labels:
-        similar_topics, similarity = bm.trained_model.find_topics(
+        similar_topics, similarity = bm.find_topics(
             label, top_n=2)
         for st_id in similar_topics:
             similar_labels += bm.get_topic_words(st_id)
@@ -3,14 +3,13 @@ import os
 import sys
 import math
 import pickle
-import configparser
+import numpy as np
 from nltk.corpus import stopwords
 
-from contextualized_topic_models.models.ctm import CombinedTM
-from contextualized_topic_models.utils.data_preparation import TopicModelDataPreparation
-from contextualized_topic_models.utils.data_preparation import bert_embeddings_from_file
-
 from data_handler import TopicModelingToolkitDataHandler, load_documents_from_sqlite
+from document_map import DocumentIdMap
+from artifacts import write_artifacts, load_artifacts, has_artifacts, LoadedTopicModel
+from settings import get_settings
 
 STOPWORDS = stopwords.words('english')
 
@@ -21,6 +20,10 @@ class CTMModel:
         self.documents_clean = docs_clean
         self.trained_model = trained_model
         self.DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CTM_model")
+        self.DEFAULT_ARTIFACTS_DIRNAME = "CTM_artifacts"
+        self.DEFAULT_CONTEXTUAL_MODEL = "all-mpnet-base-v2"
+
+        # Legacy pickles, migrated to the artifact directory on load
         self.DEFAULT_MODEL_FILENAME = "CTM_model.pickle"
         self.DEFAULT_DOC_IDX_ID_MAP_FILENAME = "CTM_document_map.pickle"
         self.DOCUMENT_IDX_ID_MAP = None
@@ -31,22 +34,40 @@ class CTMModel:
             os.makedirs(self.DEFAULT_MODEL_PATH)
     
     def train_model(self, load_trained_model=True, offload_trained_model=True):
+        artifacts_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_ARTIFACTS_DIRNAME)
+
         def offload_model():
             if not os.path.exists(self.DEFAULT_MODEL_PATH):
                 os.makedirs(self.DEFAULT_MODEL_PATH)
-            offload_model_absp = os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_MODEL_FILENAME)
-            with open(offload_model_absp, "wb") as wf:
-                pickle.dump(self.trained_model, wf)
-
-            offload_doc_map_absp = os.path.join(
-                self.DEFAULT_MODEL_PATH, self.DEFAULT_DOC_IDX_ID_MAP_FILENAME)
-            with open(offload_doc_map_absp, "wb") as wf:
-                pickle.dump(self.DOCUMENT_IDX_ID_MAP, wf)
-
-            print(f" - Trained Model Off-loaded ({offload_model_absp})...")
-            print(f" - Trained Document Map Off-loaded ({offload_doc_map_absp})...")
+            write_artifacts(
+                artifacts_absp,
+                arrays={
+                    "document_topics": np.asarray(self.DOCUMENT_IDX_TOPIC_MAP, dtype=np.int32),
+                    "document_ids": None if self.DOCUMENT_IDX_ID_MAP is None else self.DOCUMENT_IDX_ID_MAP.ids,
+                },
+                documents={"topics": {"representations": {
+                    str(topic_id): list(words) for topic_id, words in self.trained_model.get_topics().items()
+                }}},
+                metadata={"model": "ctm", "embedding_model": self.DEFAULT_CONTEXTUAL_MODEL}
+            )
+            print(f" - Trained Model Off-loaded ({artifacts_absp})...")
 
         def load_model():
+            try:
+                if has_artifacts(artifacts_absp):
+                    print(f"Loading model {artifacts_absp}")
+                    manifest, artifacts = load_artifacts(artifacts_absp)
+                    self.trained_model = LoadedTopicModel(manifest, artifacts)
+                    self.DOCUMENT_IDX_TOPIC_MAP = artifacts["document_topics"]
+                    if "document_ids" in artifacts:
+                        self.DOCUMENT_IDX_ID_MAP = DocumentIdMap(artifacts["document_ids"])
+                    return True
+                return load_legacy_model()
+            except Exception as ex:
+                print(f"Model loading failed: {ex}")
+                return False
+
+        def load_legacy_model():
             try:
                 print(
                     f"Loading model {os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_MODEL_FILENAME)}")
@@ -54,9 +75,11 @@ class CTMModel:
                     self.trained_model = pickle.load(rf)
                 with open(os.path.join(self.DEFAULT_MODEL_PATH, self.DEFAULT_DOC_IDX_ID_MAP_FILENAME), 'rb') as rf:
                     self.DOCUMENT_IDX_ID_MAP = pickle.load(rf)
+                if isinstance(self.DOCUMENT_IDX_ID_MAP, dict):
+                    self.DOCUMENT_IDX_ID_MAP = DocumentIdMap.from_dict(self.DOCUMENT_IDX_ID_MAP)
                 return True
             except Exception as ex:
-                print(ex.__traceback__)
+                print(f"Model loading failed: {ex}")
                 return False
         
         # Load model
@@ -69,9 +92,11 @@ class CTMModel:
         # If model load failed || model not loaded
         if not load_trained_model or not load_success:
             print("Training model...")
-            
+            from contextualized_topic_models.models.ctm import CombinedTM
+            from contextualized_topic_models.utils.data_preparation import TopicModelDataPreparation
+
             NUMBER_OF_TOPICS = 25
-            qt = TopicModelDataPreparation("all-mpnet-base-v2")
+            qt = TopicModelDataPreparation(self.DEFAULT_CONTEXTUAL_MODEL)
             training_dataset = qt.fit(text_for_contextual=self.documents_clean, text_for_bow=self.documents_clean)
             ctm = CombinedTM(bow_size=len(qt.vocab), contextual_size=768, n_components=NUMBER_OF_TOPICS, num_epochs=10) # 50 topics
             ctm.fit(training_dataset) # run the model
@@ -85,6 +110,11 @@ class CTMModel:
         # Save trained model (if model is loaded, don't offload it again)
         if not load_trained_model and offload_trained_model:
             offload_model()
+
+        # Models loaded from the legacy pickles are migrated to the artifact directory
+        if load_trained_model and not has_artifacts(artifacts_absp):
+            print("Migrating the model to the artifact format...")
+            offload_model()
             
     def get_topics(self):
         return [v for _, v in self.trained_model.get_topics().items()]
@@ -95,17 +125,14 @@ class CTMModel:
 if __name__ == "__main__":
     print("Loading documents...")
 
-    CONFIGPATH = os.path.join(os.path.dirname(
-        os.path.dirname(os.path.dirname(__file__))), "config.ini")
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
+    settings = get_settings()
 
     # =======================================
     # =====| Model Loading/Training |========
     # =======================================
 
-    load_model = config.getboolean('model-training', 'loadModel')
-    save_model = config.getboolean('model-training', 'saveModel')
+    load_model = settings.load_model
+    save_model = settings.save_model
     SAMPLE_COUNT = 100
 
     print(f"""
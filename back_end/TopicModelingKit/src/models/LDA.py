@@ -5,12 +5,12 @@ import os
 import sys
 import math
 import pickle
-import configparser
 from nltk.corpus import stopwords
 
 from nltk.stem import WordNetLemmatizer  
 from sklearn.feature_extraction.text import TfidfVectorizer
 from data_handler import TopicModelingToolkitDataHandler, load_documents_from_sqlite
+from settings import get_settings
 
 STOPWORDS = stopwords.words('english')
 
@@ -60,17 +60,14 @@ class LDAModel:
 if __name__ == "__main__":
     print("Loading documents...")
 
-    CONFIGPATH = os.path.join(os.path.dirname(
-        os.path.dirname(os.path.dirname(__file__))), "config.ini")
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
+    settings = get_settings()
 
     # =======================================
     # =====| Model Loading/Training |========
     # =======================================
 
-    load_model = config.getboolean('model-training', 'loadModel')
-    save_model = config.getboolean('model-training', 'saveModel')
+    load_model = settings.load_model
+    save_model = settings.save_model
     SAMPLE_COUNT = None
 
     print(f"""
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+CHECKSUM_BLOCK_SIZE = 1 << 20
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as rf:
+        for block in iter(lambda: rf.read(CHECKSUM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_artifacts(directory, arrays: dict, sparse: dict = None, documents: dict = None, metadata: dict = None):
+    """
+    Write a model artifact directory:
+
+        manifest.json           (format version, metadata and the size/sha256 of every file)
+        <name>.npy              (one per numpy array, memory-mappable)
+        <name>.npz              (one per scipy sparse matrix)
+        <name>.json             (one per JSON document, e.g. topic words)
+
+    The directory is written next to the previous one and swapped in once complete, so a crash while
+    saving never leaves a half-written model behind.
+
+    :param directory: The artifact directory
+    :param arrays: {name: numpy array}, None values are skipped
+    :param sparse: {name: scipy sparse matrix}, None values are skipped
+    :param documents: {name: JSON serializable object}
+    :param metadata: JSON serializable metadata stored in the manifest (e.g. the embedding model)
+    :return: The manifest
+    """
+    staging = directory + ".tmp"
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    files = {}
+    for name, array in arrays.items():
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(staging, f"{name}.npy"), array, allow_pickle=False)
+        files[name] = {"file": f"{name}.npy", "kind": "array", "dtype": str(array.dtype), "shape": list(array.shape)}
+    for name, matrix in (sparse or {}).items():
+        if matrix is None:
+            continue
+        import scipy.sparse
+        scipy.sparse.save_npz(os.path.join(staging, f"{name}.npz"), scipy.sparse.csr_matrix(matrix))
+        files[name] = {"file": f"{name}.npz", "kind": "sparse", "shape": list(matrix.shape)}
+    for name, document in (documents or {}).items():
+        with open(os.path.join(staging, f"{name}.json"), "w") as wf:
+            json.dump(document, wf)
+        files[name] = {"file": f"{name}.json", "kind": "json"}
+
+    for entry in files.values():
+        path = os.path.join(staging, entry["file"])
+        entry["size"] = os.path.getsize(path)
+        entry["sha256"] = _sha256(path)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "metadata": metadata or {},
+        "files": files,
+    }
+    with open(os.path.join(staging, MANIFEST_FILENAME), "w") as wf:
+        json.dump(manifest, wf, indent=2)
+
+    previous = directory + ".old"
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(staging, directory)
+    if os.path.exists(previous):
+        shutil.rmtree(previous)
+    return manifest
+
+
+def manifest_digest(manifest):
+    """
+    Identifier of the model saved with the given manifest, derived from the checksums of its files.
+    """
+    return hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+def has_artifacts(directory):
+    return os.path.exists(os.path.join(directory, MANIFEST_FILENAME))
+
+
+def read_manifest(directory):
+    """
+    Read and check the manifest of an artifact directory.
+        :raises ArtifactError: when the manifest is missing, unreadable or of an unsupported format version
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME)) as rf:
+            manifest = json.load(rf)
+    except (OSError, ValueError) as ex:
+        raise ArtifactError(f"Cannot read the manifest of {directory}: {ex}")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format version {manifest.get('format_version')} in {directory}")
+    return manifest
+
+
+def load_artifacts(directory, mmap_mode="r", verify=True):
+    """
+    Load an artifact directory written by write_artifacts(). Arrays are memory-mapped, sparse matrices are
+    loaded on first access.
+
+    :param directory: The artifact directory
+    :param mmap_mode: np.load mmap_mode of the arrays (None to read them in memory)
+    :param verify: Check the sha256 of every file against the manifest (the size is always checked)
+    :return: (manifest, {name: array, sparse loader or JSON object})
+    :raises ArtifactError: when a file is missing or does not match the manifest
+    """
+    manifest = read_manifest(directory)
+    artifacts = {}
+    for name, entry in manifest["files"].items():
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            raise ArtifactError(f"Artifact {path} is missing or truncated")
+        if verify and _sha256(path) != entry["sha256"]:
+            raise ArtifactError(f"Artifact {path} does not match its checksum")
+
+        if entry["kind"] == "array":
+            artifacts[name] = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        elif entry["kind"] == "sparse":
+            artifacts[name] = _SparseLoader(path)
+        else:
+            with open(path) as rf:
+                artifacts[name] = json.load(rf)
+    return manifest, artifacts
+
+
+class _SparseLoader:
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        import scipy.sparse
+        return scipy.sparse.load_npz(self.path)
+
+
+class SentenceTransformerEncoder:
+    """
+    Embedding model referenced by name in the manifest, loaded by load() or else on the first query. Exposes the
+    embed_words() method of BERTopic's embedding backends.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Loads the model once, concurrent first queries wait for it instead of loading their own copy."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.name)
+        return self._model
+
+    def embed_words(self, words, verbose=False):
+        return self.load().encode(words, show_progress_bar=verbose)
+
+
+class LoadedTopicModel:
+    """
+    Read-only stand-in for a trained topic model, rebuilt from an artifact directory instead of unpickling
+    the full model. Exposes the attributes and methods of BERTopic used to serve requests.
+    """
+
+    def __init__(self, manifest, artifacts):
+        self.manifest = manifest
+        self.topics_ = artifacts.get("document_topics")
+        self.probabilities_ = artifacts.get("probabilities")
+        self.topic_embeddings_ = artifacts.get("topic_embeddings")
+        self._c_tf_idf = artifacts.get("c_tf_idf")
+
+        topics = artifacts.get("topics", {})
+        self.topic_representations_ = {
+            int(topic_id): [tuple(word) if isinstance(word, list) else word for word in words]
+            for topic_id, words in topics.get("representations", {}).items()
+        }
+        self.representative_docs_ = {
+            int(topic_id): docs for topic_id, docs in topics.get("representative_docs", {}).items()
+        }
+
+        embedding_model = manifest["metadata"].get("embedding_model")
+        self.embedding_model = SentenceTransformerEncoder(embedding_model) if embedding_model else None
+
+    @property
+    def c_tf_idf_(self):
+        if callable(self._c_tf_idf):
+            self._c_tf_idf = self._c_tf_idf()
+        return self._c_tf_idf
+
+    def get_topics(self):
+        return self.topic_representations_
+
+    def get_representative_docs(self, topic=None):
+        if topic is None:
+            return self.representative_docs_
+        return self.representative_docs_.get(int(topic), [])
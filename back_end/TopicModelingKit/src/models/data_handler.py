@@ -5,7 +5,6 @@ import pickle
 import configparser
 import multiprocessing
 from nltk.corpus import stopwords
-from bertopic import BERTopic
 
 STOPWORDS = stopwords.words('english')
 
@@ -16,6 +15,11 @@ except:
         os.path.dirname(os.path.abspath(__file__))))
     from database.dataset_dbtool import get_sqlite_conn, load_database_table
 
+try:
+    from .document_map import DocumentIdMap
+except ImportError:
+    from document_map import DocumentIdMap
+
 class TopicModelingToolkitDataHandler:
     def __init__(self, threads=None, sample_doc_count=None):
         self.threads = multiprocessing.cpu_count() if threads == None else threads
@@ -84,8 +88,8 @@ def load_documents_from_sqlite():
         - doc_id_list   : List mapping between          [(doc_id1, abstract1), (doc_id2, abstract_2)...]
             - Used to ensure document index order during the multi-threaded data cleaning process
 
-        - idx_id_map    : Dictionary mapping between    {idx_0: doc_id1, idx_1: doc_id2 ...}
-            - Used to identify the ID of the document from the Database based on the document's index
+        - idx_id_map    : DocumentIdMap between         idx_0 <-> doc_id1, idx_1 <-> doc_id2 ...
+            - Used to identify the ID of the document from the Database based on the document's index (and back)
     """
     db_conn = get_sqlite_conn()
     ids = load_database_table(db_conn, column="id", table_name="Dataset")
@@ -95,8 +99,6 @@ def load_documents_from_sqlite():
     assert (len(ids) == len(abstracts))
     id_abs_list = [(ids[i], abstracts[i]) for i in range(len(ids))]
 
-    idx_id_map = dict()
-    for idx, id in enumerate(ids):
-        idx_id_map[idx] = id
+    idx_id_map = DocumentIdMap.from_ids(ids)
 
-    return id_abs_list, idx_id_map
\ No newline at end of file
+    return id_abs_list, idx_id_map
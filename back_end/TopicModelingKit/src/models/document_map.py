@@ -0,0 +1,107 @@
+import os
+import numpy as np
+
+
+class DocumentIdMap:
+    """
+    Bidirectional map between document indices (position in the model) and database IDs.
+
+        ids         : [17, 3, 42]       (idx -> id, contiguous int64 array)
+        sorted_ids  : [3, 17, 42]       (ids in ascending order, searched with binary search)
+        sorted_idx  : [1, 0, 2]         (document index of each sorted_ids entry)
+
+    When the IDs are already ascending (documents are loaded ORDER BY id), the sorted view is the
+    ids array itself and no permutation is stored.
+    """
+
+    IDS_FILENAME = "ids.npy"
+    SORTED_IDS_FILENAME = "sorted_ids.npy"
+    SORTED_IDX_FILENAME = "sorted_idx.npy"
+
+    def __init__(self, ids, sorted_ids=None, sorted_idx=None):
+        self.ids = ids
+        self.sorted_ids = ids if sorted_ids is None else sorted_ids
+        self.sorted_idx = sorted_idx
+
+    @classmethod
+    def from_ids(cls, ids):
+        """
+        Build the map from the list of database IDs ordered by document index.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) < 2 or np.all(ids[1:] > ids[:-1]):
+            return cls(ids)
+        sorted_idx = np.argsort(ids, kind="stable")
+        return cls(ids, ids[sorted_idx], sorted_idx)
+
+    @classmethod
+    def from_dict(cls, idx_id_map: dict):
+        """
+        Build the map from the legacy {idx: id} dictionary.
+        """
+        return cls.from_ids([idx_id_map[idx] for idx in range(len(idx_id_map))])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        return int(self.ids[idx])
+
+    def items(self):
+        for idx, doc_id in enumerate(self.ids.tolist()):
+            yield idx, doc_id
+
+    # ====================================
+    # ===========| LOOKUPS |==============
+    # ====================================
+
+    def get_ids(self, indices):
+        """
+        Get the database IDs of the given document indices (same order).
+        """
+        return self.ids[np.asarray(indices, dtype=np.int64)].tolist()
+
+    def get_id_array(self, indices):
+        """
+        Get the database IDs of the given document indices as a numpy array (same order).
+        """
+        return self.ids[np.asarray(indices, dtype=np.int64)]
+
+    def get_index(self, doc_id):
+        """
+        Get the document index of a database ID in O(log n).
+            :return: The document index, or None when the ID is not part of the model
+        """
+        pos = int(np.searchsorted(self.sorted_ids, doc_id))
+        if pos >= len(self.sorted_ids) or self.sorted_ids[pos] != doc_id:
+            return None
+        return pos if self.sorted_idx is None else int(self.sorted_idx[pos])
+
+    # ====================================
+    # ========| SERIALIZATION |===========
+    # ====================================
+
+    def save(self, directory):
+        """
+        Save the map as .npy files so it can be memory-mapped on load.
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        np.save(os.path.join(directory, self.IDS_FILENAME), np.asarray(self.ids))
+        for filename in [self.SORTED_IDS_FILENAME, self.SORTED_IDX_FILENAME]:
+            if os.path.exists(os.path.join(directory, filename)):
+                os.remove(os.path.join(directory, filename))
+        if self.sorted_idx is not None:
+            np.save(os.path.join(directory, self.SORTED_IDS_FILENAME), np.asarray(self.sorted_ids))
+            np.save(os.path.join(directory, self.SORTED_IDX_FILENAME), np.asarray(self.sorted_idx))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        ids = np.load(os.path.join(directory, cls.IDS_FILENAME), mmap_mode=mmap_mode)
+        if not os.path.exists(os.path.join(directory, cls.SORTED_IDX_FILENAME)):
+            return cls(ids)
+        return cls(
+            ids,
+            np.load(os.path.join(directory, cls.SORTED_IDS_FILENAME), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, cls.SORTED_IDX_FILENAME), mmap_mode=mmap_mode),
+        )
@@ -0,0 +1,198 @@
+import numpy as np
+
+
+class TopicDocumentIndex:
+    """
+    Inverted index between topic IDs and document indices, stored in a CSR layout:
+
+        topic_ids   : [-1, 0, 1, 2]             (sorted topic IDs)
+        offsets     : [0, 3, 5, 9, 12]          (posting list of topic_ids[i] = postings[offsets[i]:offsets[i+1]])
+        postings    : [7, 2, 4, 0, 5, ...]      (document indices, ranked by topic probability)
+        scores      : [0.9, 0.8, 0.4, ...]      (topic probability of each posting)
+
+    Each posting list is sorted by the document's topic probability (highest first), ties keep the
+    document index order, so a topic page is a single slice that is already ranked by relevance.
+    """
+
+    def __init__(self, topic_ids, offsets, postings, scores):
+        self.topic_ids = topic_ids
+        self.offsets = offsets
+        self.postings = postings
+        self.scores = scores
+
+    @classmethod
+    def build(cls, doc_topics, doc_probs=None):
+        """
+        Build the index from the document->topic assignment of a trained model.
+
+        :param doc_topics: Topic ID of every document (e.g. BERTopic.topics_)
+        :param doc_probs: Topic probabilities (e.g. BERTopic.probabilities_), either one value per document
+            or a (documents x topics) matrix. Documents are ranked by index when missing.
+        :return: TopicDocumentIndex
+        """
+        topics = np.asarray(doc_topics, dtype=np.int64)
+        probs = cls._assigned_probabilities(topics, doc_probs)
+
+        # Sort by topic first, then by descending probability (lexsort is stable, ties keep doc order)
+        order = np.lexsort((-probs, topics))
+        topic_ids, counts = np.unique(topics, return_counts=True)
+        offsets = np.zeros(len(topic_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        postings_dtype = np.int32 if len(topics) < np.iinfo(np.int32).max else np.int64
+        return cls(
+            topic_ids=topic_ids,
+            offsets=offsets,
+            postings=order.astype(postings_dtype),
+            scores=probs[order].astype(np.float32),
+        )
+
+    @staticmethod
+    def _assigned_probabilities(topics, doc_probs):
+        """
+        Get the probability of each document for the topic it is assigned to.
+        """
+        if doc_probs is None:
+            return np.zeros(len(topics), dtype=np.float32)
+
+        probs = np.asarray(doc_probs, dtype=np.float32)
+        if probs.ndim == 1:
+            return probs
+
+        # (documents x topics) matrix, where column i is topic i (the outlier topic -1 has no column)
+        cols = np.clip(topics, 0, probs.shape[1] - 1)
+        assigned = probs[np.arange(len(topics)), cols]
+        assigned[topics < 0] = 0
+        return assigned
+
+    # ====================================
+    # ===========| LOOKUPS |==============
+    # ====================================
+
+    def _topic_range(self, topic_id):
+        pos = int(np.searchsorted(self.topic_ids, topic_id))
+        if pos >= len(self.topic_ids) or self.topic_ids[pos] != topic_id:
+            return 0, 0
+        return int(self.offsets[pos]), int(self.offsets[pos + 1])
+
+    def documents(self, topic_id, count=None, offset=0):
+        """
+        Get the document indices of a topic, ranked by topic probability.
+
+        :param topic_id: The topic ID to look up
+        :param count: Maximum number of document indices to return (all when None)
+        :param offset: Number of ranked documents to skip
+        :return: A numpy array (view) of document indices
+        """
+        start, end = self._topic_range(topic_id)
+        start = min(start + offset, end)
+        if count is not None:
+            end = min(start + count, end)
+        return self.postings[start:end]
+
+    def document_scores(self, topic_id, count=None, offset=0):
+        """
+        Get the topic probabilities aligned with documents(topic_id, count, offset).
+        """
+        start, end = self._topic_range(topic_id)
+        start = min(start + offset, end)
+        if count is not None:
+            end = min(start + count, end)
+        return self.scores[start:end]
+
+    def topic_size(self, topic_id):
+        """
+        Get the number of documents assigned to the given topic.
+        """
+        start, end = self._topic_range(topic_id)
+        return end - start
+
+    # ====================================
+    # ========| SERIALIZATION |===========
+    # ====================================
+
+    def save(self, path):
+        np.savez(path, topic_ids=self.topic_ids, offsets=self.offsets,
+                 postings=self.postings, scores=self.scores)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                topic_ids=data["topic_ids"],
+                offsets=data["offsets"],
+                postings=data["postings"],
+                scores=data["scores"],
+            )
+
+
+class TopicNeighbourTable:
+    """
+    Dense top-k nearest neighbour table between topics, computed once from the topic embeddings:
+
+        topic_ids   : [-1, 0, 1, 2]         (sorted topic IDs, row i belongs to topic_ids[i])
+        neighbours  : [[1, 2], [2, 1], ...] (k most similar topic IDs per row, most similar first)
+        scores      : [[0.8, 0.5], ...]     (cosine similarity of each neighbour)
+
+    A topic is never its own neighbour and the outlier topic (-1) is never returned as a neighbour.
+    """
+
+    def __init__(self, topic_ids, neighbours, scores):
+        self.topic_ids = topic_ids
+        self.neighbours = neighbours
+        self.scores = scores
+
+    @classmethod
+    def build(cls, topic_ids, topic_embeddings, k=10):
+        """
+        Build the table from L2-normalized topic embeddings.
+
+        :param topic_ids: Sorted topic IDs, aligned with the embedding rows
+        :param topic_embeddings: (topics x dimensions) matrix of normalized embeddings
+        :param k: Number of neighbours kept per topic
+        :return: TopicNeighbourTable
+        """
+        topic_ids = np.asarray(topic_ids, dtype=np.int64)
+        embeddings = np.asarray(topic_embeddings, dtype=np.float32)
+        sims = embeddings @ embeddings.T
+        np.fill_diagonal(sims, -np.inf)
+        sims[:, topic_ids < 0] = -np.inf
+
+        k = max(0, min(k, int(np.sum(topic_ids >= 0)) - 1))
+        if k == 0:
+            return cls(topic_ids, np.zeros((len(topic_ids), 0), dtype=np.int64),
+                       np.zeros((len(topic_ids), 0), dtype=np.float32))
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return cls(
+            topic_ids=topic_ids,
+            neighbours=topic_ids[top],
+            scores=np.take_along_axis(top_sims, order, axis=1).astype(np.float32),
+        )
+
+    def get(self, topic_id, k=None):
+        """
+        Get the most similar topics of a topic.
+
+        :param topic_id: The topic ID to look up
+        :param k: Number of neighbours to return (all stored neighbours when None)
+        :return: (topic IDs, similarity scores), most similar first
+        """
+        pos = int(np.searchsorted(self.topic_ids, topic_id))
+        if pos >= len(self.topic_ids) or self.topic_ids[pos] != topic_id:
+            return [], []
+        return self.neighbours[pos, :k].tolist(), self.scores[pos, :k].tolist()
+
+    def save(self, path):
+        np.savez(path, topic_ids=self.topic_ids, neighbours=self.neighbours, scores=self.scores)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                topic_ids=data["topic_ids"],
+                neighbours=data["neighbours"],
+                scores=data["scores"],
+            )
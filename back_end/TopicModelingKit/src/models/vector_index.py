@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class DocumentVectorIndex:
+    """
+    Nearest neighbour index over L2-normalized document embeddings.
+
+    Vectors are stored as a (documents x dimensions) float16 matrix, or as int8 (components scaled by
+    INT8_SCALE) for a further 2x size reduction, and are meant to be memory-mapped from a .npy file.
+    Searching is a vectorized brute-force dot product over the whole matrix or over a candidate subset
+    (e.g. the posting lists of the closest topics, IVF-style), followed by a top-k selection.
+    """
+
+    INT8_SCALE = 127.0
+    CHUNK_SIZE = 65536
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, embeddings, dtype="float16"):
+        """
+        Build the index from the document embeddings of a trained model.
+
+        :param embeddings: (documents x dimensions) embedding matrix, rows aligned with document indices
+        :param dtype: "float16" or "int8"
+        :return: DocumentVectorIndex
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if dtype == "int8":
+            return cls(np.round(vectors * cls.INT8_SCALE).astype(np.int8))
+        if dtype == "float16":
+            return cls(vectors.astype(np.float16))
+        raise ValueError(f"Unsupported vector dtype: {dtype}")
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def vector(self, doc_idx):
+        """
+        Get the (float32) vector of a document.
+        """
+        return self._as_float(self.vectors[doc_idx])
+
+    def _as_float(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        if self.vectors.dtype == np.int8:
+            block /= self.INT8_SCALE
+        return block
+
+    def _scores(self, query, rows=None):
+        """
+        Dot product between the query and every (or the given) row, computed in chunks to bound memory.
+        """
+        count = len(self.vectors) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.CHUNK_SIZE):
+            end = min(start + self.CHUNK_SIZE, count)
+            block = self.vectors[start:end] if rows is None else self.vectors[rows[start:end]]
+            scores[start:end] = self._as_float(block) @ query
+        return scores
+
+    def search(self, query, k=10, candidates=None, exclude=None):
+        """
+        Get the k vectors most similar to the query.
+
+        :param query: Query vector (normalized)
+        :param k: Number of neighbours to return
+        :param candidates: Document indices to search (the whole index when None)
+        :param exclude: Document index to leave out of the results (e.g. the query document)
+        :return: (document indices, cosine similarities), most similar first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        rows = None if candidates is None else np.unique(np.asarray(candidates, dtype=np.int64))
+        scores = self._scores(query, rows)
+        doc_indices = np.arange(len(scores)) if rows is None else rows
+
+        if exclude is not None:
+            scores[doc_indices == exclude] = -np.inf
+        k = min(k, int(np.sum(np.isfinite(scores))))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return doc_indices[top], scores[top]
+
+    def save(self, path):
+        np.save(path, np.asarray(self.vectors))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        return cls(np.load(path, mmap_mode=mmap_mode))
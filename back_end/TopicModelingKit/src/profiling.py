@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import marshal
+import cProfile
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of a single thread: a background thread samples the stack of the profiled thread
+    every `interval` seconds. The result is in the collapsed stack format ("root;caller;callee count" lines)
+    read by flamegraph.pl, speedscope and most flame graph viewers.
+    """
+
+    extension = "collapsed"
+    mimetype = "text/plain"
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def output(self):
+        """
+        The profile as collapsed stacks (text).
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class DeterministicProfiler:
+    """
+    cProfile of the calling thread. The output is a pstats dump, viewable as a flame graph with
+    snakeviz/flameprof or converted to collapsed stacks with flameprof --format=log.
+    """
+
+    extension = "prof"
+    mimetype = "application/octet-stream"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def output(self):
+        """
+        The profile in the pstats file format (same as cProfile.Profile.dump_stats).
+        """
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+def make_profiler(mode="sampling", interval=0.005):
+    """
+    :param mode: "sampling" (collapsed stacks) or "cprofile" (pstats dump)
+    :param interval: Seconds between two samples of the sampling profiler
+    """
+    if mode == "cprofile":
+        return DeterministicProfiler()
+    return SamplingProfiler(interval=interval)
+
+
+def save_profile(profiler, directory, name):
+    """
+    Write a profile to `directory`, the file is named after the time and the given name.
+        :return: The path of the profile
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    safe_name = "".join(ch if ch.isalnum() else "_" for ch in name).strip("_")
+    filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{safe_name}.{profiler.extension}"
+    path = os.path.join(directory, filename)
+    output = profiler.output()
+    with open(path, "wb") as wf:
+        wf.write(output.encode() if isinstance(output, str) else output)
+    return path
@@ -0,0 +1,563 @@
+import re
+import time
+import bisect
+import sqlite3
+import hashlib
+import argparse
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from ..models.artifacts import write_artifacts, load_artifacts, has_artifacts, manifest_digest
+from ..database.dataset_dbtool import get_change_log_watermark
+
+# Same fields as the "text" field of the Lucene index (see csv2Json_new.py)
+INDEXED_FIELDS = ("abstract", "title")
+# Same parameters as the BM25Similarity of Search.java
+DEFAULT_K1 = 1.0
+DEFAULT_B = 0.65
+# Term frequencies are stored as uint16
+MAX_TERM_FREQUENCY = np.iinfo(np.uint16).max
+# Filter fields with more distinct values are not indexed (one bitset per value), they are filtered in SQL
+MAX_FILTER_VALUES = 256
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens, close to what Lucene's StandardAnalyzer (no stop words) produces.
+    """
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def hash_terms(terms):
+    """
+    64-bit hashes of the given terms. The index stores sorted term hashes instead of the vocabulary, so
+    looking up a term is a binary search over a memory-mapped array.
+    """
+    return np.array([
+        int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little", signed=True)
+        for term in terms
+    ], dtype=np.int64)
+
+
+def build_filter(values):
+    """
+    Per-value bitsets of a filterable metadata field.
+        :param values: Value of the field for each document index (None for NULL)
+        :return: (distinct values, uint8 array with one packed bitset of the documents per value), or None
+            when the field has more than MAX_FILTER_VALUES distinct values
+    """
+    distinct = sorted({str(value) for value in values if value is not None})
+    if len(distinct) > MAX_FILTER_VALUES:
+        return None
+    codes = {value: code for code, value in enumerate(distinct)}
+    doc_codes = np.array([-1 if value is None else codes[str(value)] for value in values], dtype=np.int32)
+    bitsets = np.zeros((len(distinct), (len(values) + 7) // 8), dtype=np.uint8)
+    for code in range(len(distinct)):
+        bitsets[code] = np.packbits(doc_codes == code)
+    return distinct, bitsets
+
+
+def build_sort_key(values):
+    """
+    Order-preserving float64 key of a sortable metadata field, NaN for NULL. Numbers are kept as is, text
+    values are replaced by their rank.
+        :param values: Value of the field for each document index (None for NULL)
+        :return: (key of each document index, sorted distinct values of a text field or None)
+    """
+    if all(value is None or isinstance(value, (int, float)) for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64), None
+    distinct = sorted({str(value) for value in values if value is not None})
+    ranks = {value: rank for rank, value in enumerate(distinct)}
+    return np.array([np.nan if value is None else ranks[str(value)] for value in values], dtype=np.float64), distinct
+
+
+def sort_key_of(value, distinct=None):
+    """
+    Key of a value of a sortable field that was not in the index when it was built: numbers as is, text
+    between the ranks of its neighbours among the distinct values of the field (see build_sort_key()). Text in a
+    numeric field sorts after the numbers, like in SQLite.
+    """
+    if value is None:
+        return np.nan
+    if distinct is None:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.inf
+    rank = bisect.bisect_left(distinct, str(value))
+    return float(rank) if rank < len(distinct) and distinct[rank] == str(value) else rank - 0.5
+
+
+class IndexChanges:
+    """
+    Changes applied to a BM25Index since it was built (see BM25Index.apply_changes()): the base documents
+    that were deleted or replaced (tombstones), and a small in-memory index of the inserted and updated
+    documents (the delta). Instances are never modified, the index swaps in a new one per batch.
+
+    :param base: The BM25Index the changes apply to
+    :param deleted: Boolean array, True for the base document indexes that were deleted or replaced
+    :param documents: {database ID: (text, metadata)} of the inserted and updated documents
+    """
+
+    def __init__(self, base, deleted, documents):
+        self.deleted = deleted
+        self.documents = documents
+        doc_ids = sorted(documents)
+        self.index = BM25Index.build(((doc_id, documents[doc_id][0]) for doc_id in doc_ids), k1=base.k1, b=base.b)
+        self.doc_ids = np.concatenate([base.doc_ids, self.index.doc_ids])
+        # Raw metadata of the delta documents, their filter masks are computed at search time
+        self.metadata = {field: [documents[doc_id][1].get(field) for doc_id in doc_ids]
+                         for field in list(base.filters) + list(base.sort_keys)}
+        self.sort_keys = {
+            field: np.concatenate([key, np.array([sort_key_of(value, base.sort_values.get(field))
+                                                  for value in self.metadata[field]], dtype=np.float64)])
+            for field, key in base.sort_keys.items()
+        }
+        # Collection statistics of the live documents, so scores match those of a rebuilt index
+        self.count = len(base.doc_ids) - int(deleted.sum()) + len(doc_ids)
+        self.total_length = base.total_length - int(base.doc_lengths[deleted].sum()) + int(self.index.doc_lengths.sum())
+
+
+class BM25Index:
+    """
+    In-process inverted index of the Dataset table, scored with BM25 (Lucene's BM25Similarity) or TF-IDF
+    (Lucene's ClassicSimilarity).
+
+    The postings are CSR arrays: the documents of term i are postings[offsets[i]:offsets[i + 1]], with their
+    term frequencies at the same positions. Document length norms are precomputed for both similarities.
+    Every array can be memory-mapped, see save() and load().
+
+    :param term_hashes: Sorted 64-bit hashes of the terms (see hash_terms())
+    :param offsets: Start of the postings of each term, plus the total number of postings
+    :param postings: Document indexes of each term, in ascending order
+    :param frequencies: Term frequency of each posting
+    :param doc_ids: Database ID of each document index
+    :param doc_lengths: Number of tokens of each document
+    :param k1: BM25 term frequency saturation
+    :param b: BM25 length normalization
+    :param filters: {field: (distinct values, per-value bitsets)} of the filterable metadata (see build_filter())
+    :param sort_keys: {field: key of each document index} of the sortable metadata (see build_sort_key())
+    :param sort_values: {field: sorted distinct values} of the sortable text metadata
+    :param watermark: seq of the last change of the database change log in the index (see apply_changes())
+    """
+
+    def __init__(self, term_hashes, offsets, postings, frequencies, doc_ids, doc_lengths, k1=DEFAULT_K1, b=DEFAULT_B,
+                 bm25_norms=None, tfidf_norms=None, filters=None, sort_keys=None, sort_values=None, watermark=0,
+                 index_id=None):
+        self.term_hashes = term_hashes
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.filters = filters or {}
+        self.sort_keys = sort_keys or {}
+        self.sort_values = sort_values or {}
+        self.watermark = watermark
+        self.index_id = index_id  # Digest of the saved index (see save())
+        self.changes = None  # IndexChanges applied since the index was built
+        self._total_length = None
+        self._id_order = None
+
+        if bm25_norms is None:
+            lengths = doc_lengths.astype(np.float32)
+            average_length = lengths.mean() if len(lengths) else 1.0
+            bm25_norms = (k1 * (1 - b + b * lengths / max(average_length, 1e-12))).astype(np.float32)
+            tfidf_norms = (1 / np.sqrt(np.maximum(lengths, 1))).astype(np.float32)
+        self.bm25_norms = bm25_norms
+        self.tfidf_norms = tfidf_norms
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @property
+    def total_length(self):
+        if self._total_length is None:
+            self._total_length = int(self.doc_lengths.sum(dtype=np.int64))
+        return self._total_length
+
+    @classmethod
+    def build(cls, documents, k1=DEFAULT_K1, b=DEFAULT_B):
+        """
+        Build the index of the given documents.
+            :param documents: Iterable of (database ID, text)
+        """
+        vocabulary = {}
+        term_column, doc_column, frequency_column = array("i"), array("i"), array("H")
+        doc_ids, doc_lengths = array("q"), array("i")
+        for doc_idx, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text)
+            for term, frequency in Counter(tokens).items():
+                term_column.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_column.append(doc_idx)
+                frequency_column.append(min(frequency, MAX_TERM_FREQUENCY))
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+
+        terms = np.frombuffer(term_column, dtype=np.int32)
+        docs = np.frombuffer(doc_column, dtype=np.int32)
+        frequencies = np.frombuffer(frequency_column, dtype=np.uint16)
+
+        # Terms are numbered in the order of their hashes, postings are sorted by (term, document)
+        hashes = hash_terms(vocabulary)
+        hash_order = np.argsort(hashes, kind="stable")
+        term_rank = np.empty(len(hashes), dtype=np.int32)
+        term_rank[hash_order] = np.arange(len(hashes), dtype=np.int32)
+        ranks = term_rank[terms]
+        order = np.lexsort((docs, ranks))
+
+        offsets = np.zeros(len(hashes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ranks, minlength=len(hashes)), out=offsets[1:])
+        return cls(
+            term_hashes=hashes[hash_order],
+            offsets=offsets,
+            postings=docs[order],
+            frequencies=frequencies[order],
+            doc_ids=np.frombuffer(doc_ids, dtype=np.int64).copy(),
+            doc_lengths=np.frombuffer(doc_lengths, dtype=np.int32).copy(),
+            k1=k1,
+            b=b,
+        )
+
+    @classmethod
+    def build_from_database(cls, database, filter_fields=(), sort_fields=(), k1=DEFAULT_K1, b=DEFAULT_B):
+        """
+        Build the index of the Dataset table of the given SQLite database (INDEXED_FIELDS of every row), with
+        the bitsets of the filter fields and the keys of the sort fields.
+        """
+        started = time.perf_counter()
+        conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+        try:
+            # Read before the documents: a change committed meanwhile is indexed twice rather than missed
+            watermark = get_change_log_watermark(conn)
+            fields = " || ' ' || ".join(f"COALESCE({field}, '')" for field in INDEXED_FIELDS)
+            index = cls.build(conn.execute(f"SELECT id, {fields} FROM Dataset ORDER BY id"), k1=k1, b=b)
+            metadata_fields = list(dict.fromkeys(list(filter_fields) + list(sort_fields)))
+            if metadata_fields:
+                columns = list(zip(*conn.execute(f"SELECT {', '.join(metadata_fields)} FROM Dataset ORDER BY id")))
+                columns = dict(zip(metadata_fields, columns or [()] * len(metadata_fields)))
+                for field in filter_fields:
+                    field_filter = build_filter(columns[field])
+                    if field_filter is None:
+                        print(f"[WARNING] Search index: {field} has more than {MAX_FILTER_VALUES} values, "
+                              f"it is filtered in SQL")
+                    else:
+                        index.filters[field] = field_filter
+                for field in sort_fields:
+                    index.sort_keys[field], distinct = build_sort_key(columns[field])
+                    if distinct is not None:
+                        index.sort_values[field] = distinct
+            index.watermark = watermark
+        finally:
+            conn.close()
+        print(f"Search index built: {len(index)} documents, {len(index.term_hashes)} terms, "
+              f"{len(index.postings)} postings in {time.perf_counter() - started:.1f}s")
+        return index
+
+    def save(self, directory):
+        """
+        Save the index as an artifact directory (one .npy file per array, see models/artifacts.py).
+        """
+        if self.changes is not None:
+            raise ValueError("The index has changes applied since it was built, rebuild it to save them")
+        manifest = write_artifacts(
+            directory,
+            arrays={
+                "term_hashes": self.term_hashes,
+                "offsets": self.offsets,
+                "postings": self.postings,
+                "frequencies": self.frequencies,
+                "doc_ids": self.doc_ids,
+                "doc_lengths": self.doc_lengths,
+                "bm25_norms": self.bm25_norms,
+                "tfidf_norms": self.tfidf_norms,
+                **{f"filter_{field}": bitsets for field, (_, bitsets) in self.filters.items()},
+                **{f"sort_{field}": key for field, key in self.sort_keys.items()},
+            },
+            documents={
+                "filter_values": {field: values for field, (values, _) in self.filters.items()},
+                "sort_values": self.sort_values,
+            },
+            metadata={
+                "engine": "bm25",
+                "k1": self.k1,
+                "b": self.b,
+                "documents": len(self.doc_ids),
+                "terms": len(self.term_hashes),
+                "watermark": self.watermark,
+            }
+        )
+        self.index_id = manifest_digest(manifest)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r", verify=False):
+        """
+        Load an index saved by save(), the arrays are memory-mapped.
+        """
+        manifest, arrays = load_artifacts(directory, mmap_mode=mmap_mode, verify=verify)
+        filters = {field: (values, arrays.pop(f"filter_{field}"))
+                   for field, values in arrays.pop("filter_values", {}).items()}
+        sort_values = arrays.pop("sort_values", {})
+        sort_keys = {name[len("sort_"):]: arrays.pop(name) for name in list(arrays) if name.startswith("sort_")}
+        metadata = manifest["metadata"]
+        return cls(k1=metadata["k1"], b=metadata["b"], filters=filters, sort_keys=sort_keys, sort_values=sort_values,
+                   watermark=metadata.get("watermark", 0), index_id=manifest_digest(manifest), **arrays)
+
+    @classmethod
+    def open(cls, directory, database, filter_fields=(), sort_fields=(), rebuild=False):
+        """
+        Load the index saved in the directory, or build it from the database (and save it) when it is
+        missing or a rebuild is requested.
+        """
+        if not rebuild and has_artifacts(directory):
+            print(f"Loading search index {directory}")
+            return cls.load(directory)
+        index = cls.build_from_database(database, filter_fields, sort_fields)
+        index.save(directory)
+        return cls.load(directory)
+
+    def apply_changes(self, documents, deleted, from_watermark, watermark):
+        """
+        Apply a batch of changes of the database: the previous versions of the changed documents become
+        tombstones, and the new versions are indexed in the delta (see IndexChanges). The cost is proportional
+        to the changes since the index was built, not to the size of the index.
+            :param documents: Inserted and updated documents, as {"id", "text", "metadata"} dictionaries
+            :param deleted: Database IDs of the deleted documents
+            :param from_watermark: Watermark the changes were read after, the batch is skipped when the index
+                is not at this watermark
+            :param watermark: seq of the last change of the batch
+            :return: The watermark of the index
+        """
+        if self.watermark != from_watermark:
+            return self.watermark
+        changes = self.changes
+        tombstones = changes.deleted.copy() if changes else np.zeros(len(self.doc_ids), dtype=bool)
+        changed_documents = dict(changes.documents) if changes else {}
+
+        changed_ids = np.array([int(doc["id"]) for doc in documents] + [int(doc_id) for doc_id in deleted],
+                               dtype=np.int64)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.doc_ids, kind="stable")
+        positions = np.minimum(np.searchsorted(self.doc_ids, changed_ids, sorter=self._id_order),
+                               max(len(self.doc_ids) - 1, 0))
+        if len(self.doc_ids):
+            positions = self._id_order[positions]
+            tombstones[positions[self.doc_ids[positions] == changed_ids]] = True
+        for doc_id in deleted:
+            changed_documents.pop(int(doc_id), None)
+        for doc in documents:
+            changed_documents[int(doc["id"])] = (doc["text"], doc.get("metadata") or {})
+
+        self.changes = IndexChanges(self, tombstones, changed_documents)
+        self.watermark = watermark
+        return watermark
+
+    def get_watermark(self):
+        return self.watermark
+
+    def _postings(self, term_hash):
+        position = np.searchsorted(self.term_hashes, term_hash)
+        if position == len(self.term_hashes) or self.term_hashes[position] != term_hash:
+            return self.postings[:0], self.frequencies[:0]
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.postings[start:end], self.frequencies[start:end]
+
+    def score(self, query, similarity="BM25"):
+        """
+        Score every document against the query (the terms of the query are OR-ed, like Lucene's QueryParser).
+        With changes applied, the delta documents follow the base ones and the collection statistics are those
+        of the live documents.
+            :param similarity: "BM25" or "TF-IDF"
+            :return: float32 array of the score of each document index (0 for documents without a query term)
+        """
+        return self._score(query, similarity, self.changes)
+
+    def _score(self, query, similarity, changes):
+        segments = [(0, self, None if changes is None else changes.deleted)]
+        if changes is not None:
+            segments.append((len(self.doc_ids), changes.index, None))
+        scores = np.zeros(len(self.doc_ids) + (len(changes.index) if changes else 0), dtype=np.float32)
+        query_terms = Counter(tokenize(query))
+        if not query_terms:
+            return scores
+
+        count = len(self.doc_ids) if changes is None else changes.count
+        average_length = None if changes is None else changes.total_length / max(changes.count, 1)
+        for query_frequency, term_hash in zip(query_terms.values(), hash_terms(query_terms)):
+            matches = []
+            for offset, segment, tombstones in segments:
+                docs, frequencies = segment._postings(term_hash)
+                if tombstones is not None and len(docs):
+                    live = ~tombstones[docs]
+                    docs, frequencies = docs[live], frequencies[live]
+                matches.append((offset, segment, docs, frequencies.astype(np.float32)))
+            df = sum(len(docs) for _, _, docs, _ in matches)
+            if not df:
+                continue
+            for offset, segment, docs, frequencies in matches:
+                if similarity == "BM25":
+                    idf = np.log(1 + (count - df + 0.5) / (df + 0.5))
+                    if average_length is None:
+                        norms = segment.bm25_norms[docs]
+                    else:
+                        lengths = segment.doc_lengths[docs].astype(np.float32)
+                        norms = self.k1 * (1 - self.b + self.b * lengths / max(average_length, 1e-12))
+                    scores[offset + docs] += query_frequency * idf * frequencies / (frequencies + norms)
+                else:
+                    # ClassicSimilarity: sqrt(tf) * idf * lengthNorm, idf applied once (TFIDFScorer's queryWeight)
+                    idf = 1 + np.log((count + 1) / (df + 1))
+                    scores[offset + docs] += query_frequency * idf * np.sqrt(frequencies) * segment.tfidf_norms[docs]
+        return scores
+
+    def can_filter(self, field):
+        return field in self.filters
+
+    def can_sort(self, field):
+        return field in self.sort_keys
+
+    def filter_mask(self, field, filter_input):
+        """
+        Documents whose field contains the input (case-insensitive, like the SQL filter LIKE '%input%'), as a
+        boolean array over the document indexes: the union of the bitsets of the matching values.
+        """
+        return self._filter_mask(field, filter_input, self.changes)
+
+    def _filter_mask(self, field, filter_input, changes):
+        values, bitsets = self.filters[field]
+        needle = filter_input.lower()
+        matching = [code for code, value in enumerate(values) if needle in value.lower()]
+        if matching:
+            bits = np.bitwise_or.reduce(bitsets[matching], axis=0)
+            mask = np.unpackbits(bits, count=len(self.doc_ids)).view(bool)
+        else:
+            mask = np.zeros(len(self.doc_ids), dtype=bool)
+        if changes is None:
+            return mask
+        delta_mask = [value is not None and needle in str(value).lower() for value in changes.metadata[field]]
+        return np.concatenate([mask, np.array(delta_mask, dtype=bool)])
+
+    def search(self, query, size, similarity="BM25", filter_field=None, filter_input=None, sort=None, order=None):
+        """
+        Get the `size` best matching documents, best first (ties in document index order, like Lucene).
+        A metadata filter is applied before the top documents are selected, so filtered searches still return
+        `size` documents when there are enough matches. With a sort field, the top documents are ordered by it
+        (NULLs first in ascending order and last in descending order, like SQLite, ties in relevance order).
+            :return: (database IDs, scores) numpy arrays
+        """
+        changes = self.changes  # The same changes for the whole search, apply_changes() may swap them meanwhile
+        scores, candidates = self._candidates(query, similarity, filter_field, filter_input, changes)
+        top = self._top(scores, candidates, size)
+
+        if sort:
+            key = (self.sort_keys if changes is None else changes.sort_keys)[sort][top]
+            if (order or "asc").lower() == "desc":
+                key = np.where(np.isnan(key), np.inf, -key)
+            else:
+                key = np.where(np.isnan(key), -np.inf, key)
+            top = top[np.argsort(key, kind="stable")]
+        return (self.doc_ids if changes is None else changes.doc_ids)[top], scores[top]
+
+    def search_after(self, query, size, similarity="BM25", filter_field=None, filter_input=None, after=None):
+        """
+        Get the page of the `size` best matching documents following the last document of the previous page,
+        like Lucene's IndexSearcher.searchAfter(). Only the documents ranked after it are selected, so every
+        page costs the same as the first one.
+            :param after: (score, document index) of the last document of the previous page, None for the first
+            :return: (database IDs, scores, document indexes, number of matching documents) numpy arrays
+        """
+        changes = self.changes
+        scores, candidates = self._candidates(query, similarity, filter_field, filter_input, changes)
+        total = len(candidates)
+        if after is not None:
+            after_score, after_doc = np.float32(after[0]), int(after[1])
+            candidate_scores = scores[candidates]
+            candidates = candidates[(candidate_scores < after_score)
+                                    | ((candidate_scores == after_score) & (candidates > after_doc))]
+        top = self._top(scores, candidates, size)
+        return (self.doc_ids if changes is None else changes.doc_ids)[top], scores[top], top, total
+
+    def _candidates(self, query, similarity, filter_field, filter_input, changes):
+        scores = self._score(query, similarity, changes)
+        candidates = np.flatnonzero(scores)
+        if filter_field and filter_input:
+            candidates = candidates[self._filter_mask(filter_field, filter_input, changes)[candidates]]
+        return scores, candidates
+
+    @staticmethod
+    def _top(scores, candidates, size):
+        if len(candidates) > size:
+            candidates = candidates[np.argpartition(-scores[candidates], size - 1)[:size]]
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class BM25Searcher:
+    """
+    Searcher over an in-process BM25Index, with the interface of the Lucene Searcher ([search] backend = python
+    in config.ini).
+    """
+
+    def __init__(self, index: BM25Index):
+        self.index = index
+
+    def setUpIndex(self):
+        # The server builds (or loads) the index at startup
+        return
+
+    def search(self, query: str, size: int, similarity: str = "BM25", filter_field: str = None,
+               filter_input: str = None, sort: str = None, order: str = None) -> list:
+        """
+        Search documents with a given query, filtered and ordered in the index (see BM25Index.search()).
+            :return: [(document id, score), ...]
+        """
+        doc_ids, scores = self.index.search(query, size, similarity, filter_field, filter_input, sort, order)
+        return list(zip(doc_ids.tolist(), scores.tolist()))
+
+    def search_after(self, query: str, size: int, similarity: str = "BM25", filter_field: str = None,
+                     filter_input: str = None, after: dict = None) -> tuple:
+        """
+        Get a page of documents ranked by relevance (see BM25Index.search_after()).
+            :param after: Continuation token of the previous page, None for the first page
+            :return: ([(document id, score), ...], continuation token of the next page or None, total hits)
+        """
+        position = None if after is None else (after["score"], after["doc"])
+        doc_ids, scores, docs, total = self.index.search_after(query, size + 1, similarity, filter_field,
+                                                               filter_input, position)
+        hits = list(zip(doc_ids[:size].tolist(), scores[:size].tolist()))
+        next_after = {"score": float(scores[size - 1]), "doc": int(docs[size - 1])} if len(docs) > size else None
+        return hits, next_after, total
+
+    def can_filter(self, field: str) -> bool:
+        return self.index.can_filter(field)
+
+    def can_sort(self, field: str) -> bool:
+        return self.index.can_sort(field)
+
+    def search_TFIDF(self, size: int, query: str) -> list:
+        """" search documents with a given query using TF-IDF """
+        doc_ids, _ = self.index.search(query, size, "TF-IDF")
+        return doc_ids.tolist()
+
+    def search_BM25(self, size: int, query: str) -> list:
+        """" search documents with a given query using BM_25 """
+        doc_ids, _ = self.index.search(query, size, "BM25")
+        return doc_ids.tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the in-process search index of a dataset database')
+    parser.add_argument('database', help='Path of the SQLite database')
+    parser.add_argument('output', help='Index directory to write')
+    parser.add_argument('-q', '--query', default=None, help='Search the index once built')
+    args = parser.parse_args()
+
+    index = BM25Index.build_from_database(args.database)
+    index.save(args.output)
+    if args.query:
+        for doc_id, score in zip(*index.search(args.query, 10)):
+            print(f"{doc_id}\t{score:.4f}")
@@ -0,0 +1,139 @@
+import time
+import sqlite3
+import threading
+import traceback
+
+from ..database.dataset_dbtool import read_change_log
+from .bm25 import INDEXED_FIELDS
+from .searcher import SearchUnavailable, SearchQueryError
+
+# Maximum number of ids bound in a single SELECT (SQLITE_MAX_VARIABLE_NUMBER is 999 before SQLite 3.32)
+SELECT_CHUNK_SIZE = 900
+# Maximum seconds between two updates after consecutive failures
+MAX_BACKOFF = 300
+
+
+class IndexUpdater:
+    """
+    Keeps a search index in sync with the Dataset table: every `interval` seconds, the changes logged after
+    the watermark of the index (see dataset_dbtool.create_change_log()) are read and applied in batches of
+    `batch_size` changes, so the cost of an update is proportional to the changes. After a failed update,
+    the interval doubles up to MAX_BACKOFF seconds until an update succeeds.
+
+    The index is a BM25Index or a Lucene Searcher, anything with get_watermark() and
+    apply_changes(documents, deleted, from_watermark, watermark). Batches are applied only when the index is
+    still at the watermark they were read after, so several processes can update the same (Lucene) index.
+
+    :param database: Path of the SQLite database
+    :param index: The search index to update
+    :param metadata_fields: Metadata fields of the indexed documents (filter and sort fields)
+    :param interval: Seconds between two updates
+    :param batch_size: Maximum number of changes applied at once
+    """
+
+    def __init__(self, database, index, metadata_fields=(), interval=5.0, batch_size=1000):
+        self.database = database
+        self.index = index
+        self.metadata_fields = list(metadata_fields)
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._updates = 0
+        self._changes = 0
+        self._failures = 0
+        self._last_duration = 0.0
+
+    def _documents(self, conn, changes):
+        """
+        Get the current version of the inserted and updated documents, as {"id", "text", "metadata"}
+        dictionaries (the format of the dataset JSON indexed by Search.java), and the deleted ids.
+        """
+        deleted = [doc_id for doc_id, op in changes.items() if op == 'delete']
+        changed = [doc_id for doc_id, op in changes.items() if op != 'delete']
+        columns = ", ".join(("id",) + INDEXED_FIELDS + tuple(self.metadata_fields))
+        documents = {}
+        for start in range(0, len(changed), SELECT_CHUNK_SIZE):
+            chunk = changed[start:start + SELECT_CHUNK_SIZE]
+            cur = conn.execute(f"SELECT {columns} FROM Dataset WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            for row in cur:
+                documents[row[0]] = {
+                    "id": row[0],
+                    "text": " ".join(row[i + 1] or "" for i in range(len(INDEXED_FIELDS))),
+                    "metadata": dict(zip(self.metadata_fields, row[len(INDEXED_FIELDS) + 1:])),
+                }
+        # Deleted by a change after this batch
+        deleted += [doc_id for doc_id in changed if doc_id not in documents]
+        return list(documents.values()), deleted
+
+    def update(self):
+        """
+        Apply every change logged after the watermark of the index.
+            :return: Number of changes applied
+        """
+        started = time.perf_counter()
+        applied = 0
+        conn = sqlite3.connect(f"file:{self.database}?mode=ro", uri=True)
+        try:
+            watermark = self.index.get_watermark()
+            while True:
+                last, changes = read_change_log(conn, watermark, self.batch_size)
+                if not changes:
+                    break
+                documents, deleted = self._documents(conn, changes)
+                index_watermark = self.index.apply_changes(documents, deleted, watermark, last)
+                if index_watermark == last:
+                    applied += len(changes)
+                watermark = index_watermark  # Ahead when another process applied the batch
+        finally:
+            conn.close()
+        with self._lock:
+            self._watermark = watermark
+            self._updates += 1
+            self._changes += applied
+            self._last_duration = time.perf_counter() - started
+        if applied:
+            print(f"Search index updated: {applied} changes up to {watermark} "
+                  f"in {self._last_duration:.2f}s")
+        return applied
+
+    def _run(self):
+        failures = 0  # Consecutive
+        while True:
+            try:
+                self.update()
+                failures = 0
+            except Exception as ex:
+                # The thread is never restarted, a failed batch is retried after a backoff
+                failures += 1
+                with self._lock:
+                    self._failures += 1
+                print(f"[ERROR] Search index update failed: {ex}")
+                if not isinstance(ex, (sqlite3.Error, SearchUnavailable, SearchQueryError)):
+                    traceback.print_exc()
+            wait = min(self.interval * 2 ** min(failures, 16), max(self.interval, MAX_BACKOFF))
+            if self._stop.wait(wait):
+                return
+
+    def start(self):
+        """
+        Start the update thread (a daemon, one per process).
+        """
+        self._thread = threading.Thread(target=self._run, name='search-index-updater', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "watermark": self._watermark,
+                "updates": self._updates,
+                "changes": self._changes,
+                "failures": self._failures,
+                "last_duration": self._last_duration,
+            }
@@ -1,32 +1,317 @@
-from py4j.java_gateway import JavaGateway
-# This line create the connection between python and JVM
-gateway = JavaGateway()
+import json
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+from py4j.java_gateway import JavaGateway, GatewayParameters
+from py4j.protocol import Py4JError, Py4JJavaError, Py4JNetworkError
+
+from ..settings import ProcessResource
+
+
+class SearchUnavailable(Exception):
+    """The search service (Search.java) cannot be reached, or did not answer in time."""
+    pass
+
+
+class SearchQueryError(Exception):
+    """The search service rejected the query (e.g. a Lucene query syntax error)."""
+    pass
+
+
+class GatewayPool:
+    """
+    Bounded pool of py4j gateways to the search service (Search.java), shared by the server's worker threads.
+
+    Each gateway carries one call at a time, so up to `size` searches run concurrently. Gateways are opened
+    lazily: creating the pool (or importing this module) does not need a running JVM. Calls time out after
+    `read_timeout` seconds. A gateway idle for more than `health_check_interval` seconds is pinged before
+    reuse, and a gateway that fails is discarded. A call that could not reach the JVM (e.g. it restarted) is
+    retried once on a new connection, a call that timed out or failed while it ran is not (it would run twice).
+
+    :param address: Address of the gateway server
+    :param port: Port of the gateway server
+    :param size: Maximum number of open gateways
+    :param read_timeout: Seconds to wait for the answer of a call
+    :param checkout_timeout: Seconds to wait for a free gateway before raising SearchUnavailable
+    :param health_check_interval: Idle seconds after which a gateway is pinged before reuse
+    """
+
+    def __init__(self, address="127.0.0.1", port=25333, size=8, read_timeout=10, checkout_timeout=30,
+                 health_check_interval=30):
+        self.address = address
+        self.port = port
+        self.size = size
+        self.read_timeout = read_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue()  # (gateway, last used)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._calls = 0
+        self._waits = 0
+        self._failures = 0
+        self._reconnects = 0
+
+    def _connect(self):
+        return JavaGateway(gateway_parameters=GatewayParameters(
+            address=self.address, port=self.port, read_timeout=self.read_timeout, auto_close=True))
+
+    def _discard(self, gateway):
+        try:
+            gateway.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def _healthy(self, gateway):
+        try:
+            gateway.jvm.java.lang.System.currentTimeMillis()
+            return True
+        except Py4JError:
+            return False
+
+    def checkout(self):
+        """
+        Get a gateway from the pool, opening a new one while the pool is below its size.
+            :raises SearchUnavailable: when no gateway is returned within the checkout timeout
+        """
+        try:
+            gateway, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._created < self.size
+                if can_open:
+                    self._created += 1
+            if can_open:
+                gateway, last_used = self._connect(), None
+            else:
+                with self._lock:
+                    self._waits += 1
+                try:
+                    gateway, last_used = self._idle.get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    raise SearchUnavailable(f"No search gateway available after {self.checkout_timeout}s")
+
+        if last_used is not None and time.monotonic() - last_used > self.health_check_interval \
+                and not self._healthy(gateway):
+            print("Search gateway failed its health check, reconnecting...")
+            gateway.close()
+            gateway = self._connect()
+            with self._lock:
+                self._reconnects += 1
+
+        with self._lock:
+            self._in_use += 1
+        return gateway
+
+    def checkin(self, gateway, broken=False):
+        """
+        Return a gateway to the pool, a broken gateway (failed connection) is closed instead.
+        """
+        with self._lock:
+            self._in_use -= 1
+        if broken:
+            self._discard(gateway)
+        else:
+            self._idle.put((gateway, time.monotonic()))
+
+    @contextmanager
+    def gateway(self):
+        gateway = self.checkout()
+        broken = False
+        try:
+            yield gateway
+        except Py4JJavaError:
+            raise  # The JVM answered, the connection is fine
+        except Py4JError:
+            broken = True
+            raise
+        finally:
+            self.checkin(gateway, broken)
+
+    def call(self, func):
+        """
+        Call func(gateway) on a pooled gateway. Calls that cannot connect are retried once on a new connection.
+            :raises SearchQueryError: when the search service raised an exception
+            :raises SearchUnavailable: when the search service cannot be reached or times out
+        """
+        with self._lock:
+            self._calls += 1
+        for attempt in range(2):
+            try:
+                with self.gateway() as gateway:
+                    return func(gateway)
+            except Py4JJavaError as ex:
+                raise SearchQueryError(str(ex.java_exception))
+            except Py4JNetworkError as ex:
+                with self._lock:
+                    self._failures += 1
+                    if attempt == 0:
+                        self._reconnects += 1
+                if attempt == 1:
+                    raise SearchUnavailable(f"Search service at {self.address}:{self.port} failed: {ex}")
+                print(f"Search gateway call failed, retrying on a new connection: {ex}")
+                # The idle gateways are most likely connected to the same (restarted) JVM
+                self.close()
+            except Py4JError as ex:
+                # The call reached the JVM and timed out or lost its answer (py4j already resends commands
+                # that failed to send): retrying would run it again
+                with self._lock:
+                    self._failures += 1
+                raise SearchUnavailable(f"Search service at {self.address}:{self.port} failed: {ex}")
+
+    def stats(self):
+        """
+        Get the pool metrics.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "calls": self._calls,
+                "waits": self._waits,
+                "failures": self._failures,
+                "reconnects": self._reconnects,
+            }
+
+    def close(self):
+        """
+        Close the idle gateways.
+        """
+        while True:
+            try:
+                gateway, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(gateway)
+
+
+gateway_pool = ProcessResource(
+    lambda settings: GatewayPool(
+        address=settings.search_gateway_address,
+        port=settings.search_gateway_port,
+        size=settings.search_gateway_pool_size,
+        read_timeout=settings.search_gateway_timeout,
+        checkout_timeout=settings.search_gateway_checkout_timeout,
+        health_check_interval=settings.search_gateway_health_check_interval
+    ),
+    close=GatewayPool.close
+)
+
+
+def get_gateway_pool():
+    """
+    Get the gateway pool of this process, created on first use from the [search] settings and again when they
+    change. A worker forked from a process that already used the pool gets its own pool (sockets are not shared
+    across processes).
+    """
+    return gateway_pool.get()
 
 
 class Searcher():
+    """
+    Client of the Lucene search service (Search.java), over the process' gateway pool. Instances are cheap
+    and thread-safe, the connections belong to the pool. The server creates one per request.
+    """
+
+    def __init__(self, pool: GatewayPool = None):
+        self.pool = pool
+        self._capabilities = None
+
+    def _call(self, func):
+        return (self.pool or get_gateway_pool()).call(func)
+
+    def search(self, query: str, size: int, similarity: str = "BM25", filter_field: str = None,
+               filter_input: str = None, sort: str = None, order: str = None) -> list:
+        """
+        Search documents with a given query. The metadata filter is applied by Search.java before the top hits
+        are collected, and the hits are ordered by the sort field (ties in relevance order) or by relevance.
+            :param similarity: "BM25" or "TF-IDF"
+            :return: [(document id, score), ...]
+        """
+        mode = "BM-25" if similarity == "BM25" else "TF-IDF"
+        results = self._call(lambda gateway: gateway.entry_point.searchScored(
+            mode, size, query, filter_field, filter_input or None, sort, order))
+        return [(int(doc_id), score) for doc_id, score in json.loads(results)]
+
+    def search_after(self, query: str, size: int, similarity: str = "BM25", filter_field: str = None,
+                     filter_input: str = None, after: dict = None) -> tuple:
+        """
+        Get a page of documents ranked by relevance, following the last hit of the previous page (Lucene's
+        searchAfter), so every page costs the same as the first one.
+            :param after: Continuation token of the previous page, None for the first page
+            :return: ([(document id, score), ...], continuation token of the next page or None, total hits)
+        """
+        mode = "BM-25" if similarity == "BM25" else "TF-IDF"
+        after_score, after_doc = (0.0, -1) if after is None else (float(after["score"]), int(after["doc"]))
+        # One more hit than the page tells whether there is a next page
+        results = json.loads(self._call(lambda gateway: gateway.entry_point.searchAfter(
+            mode, size + 1, query, filter_field, filter_input or None, after_score, after_doc)))
+        hits = results["hits"]
+        next_after = {"score": hits[size - 1][1], "doc": hits[size - 1][2]} if len(hits) > size else None
+        return [(int(doc_id), score) for doc_id, score, _ in hits[:size]], next_after, results["total"]
+
+    def field_capabilities(self) -> dict:
+        """
+        Get the metadata fields the Lucene index filters and sorts on like SQLite does (see
+        Search.getFieldCapabilities()), fetched once per Searcher. The other fields are filtered and sorted in SQL.
+            :return: {"filter": [field, ...], "sort": [field, ...]}, empty when the search service is unavailable
+        """
+        if self._capabilities is None:
+            try:
+                capabilities = json.loads(self._call(lambda gateway: gateway.entry_point.getFieldCapabilities()))
+            except (SearchUnavailable, SearchQueryError) as ex:
+                print(f"[ERROR] Cannot get the search index fields: {ex}")
+                return {"filter": [], "sort": []}
+            self._capabilities = {"filter": set(capabilities["filter"]), "sort": set(capabilities["sort"])}
+        return self._capabilities
+
+    def can_filter(self, field: str) -> bool:
+        return field in self.field_capabilities()["filter"]
+
+    def can_sort(self, field: str) -> bool:
+        return field in self.field_capabilities()["sort"]
+
+    def get_watermark(self) -> int:
+        """
+        Get the seq of the last database change in the Lucene index (0 for an index built from the JSON dataset).
+        """
+        return self._call(lambda gateway: gateway.entry_point.getWatermark())
+
+    def apply_changes(self, documents: list, deleted: list, from_watermark: int, watermark: int) -> int:
+        """
+        Apply a batch of database changes to the Lucene index (see IndexUpdater), in a single commit.
+            :param documents: Inserted and updated documents, as {"id", "text", "metadata"} dictionaries
+            :param deleted: Database IDs of the deleted documents
+            :return: The watermark of the index, not `watermark` when the index was not at `from_watermark`
+        """
+        changes = json.dumps({"documents": documents, "deleted": [str(doc_id) for doc_id in deleted]})
+        return self._call(lambda gateway: gateway.entry_point.applyChanges(changes, from_watermark, watermark))
+
     # Set up the lucene index of the dataset and store in a fixed data path
     def setUpIndex(self):
         print("Setting up the index of text...")
-        gateway.entry_point.init()
+        self._call(lambda gateway: gateway.entry_point.init())
         return
 
-    def search_TFIDF(self, size: int, query: str, page: int) -> list:
+    def search_TFIDF(self, size: int, query: str) -> list:
         """" search documents with a given query using TF-IDF """
-        jList = gateway.entry_point.search("TF-IDF", size, query)
-        # tuen the java arraylist to python list.
-        pyList = list(jList)
-        return pyList
+        # tuen the java arraylist to python list (while the gateway is checked out).
+        return self._call(lambda gateway: list(gateway.entry_point.search("TF-IDF", size, query)))
 
     def search_BM25(self, size: int, query: str) -> list:
         """" search documents with a given query using BM_25 """
         # envoke the java lucene search method to get the document id list
-        jList = gateway.entry_point.search("BM-25", size, query)
-        # tuen the java arraylist to python list.
-        pyList = list(jList)
-        return pyList
+        return self._call(lambda gateway: list(gateway.entry_point.search("BM-25", size, query)))
 
 # below is a sample test for the searcher method.
 # test = Searcher()
 # test.setUpIndex()
 # result = test.search_BM25(1000, "mathematical")
-# print(result)
\ No newline at end of file
+# print(result)
@@ -0,0 +1,314 @@
+import os
+import ast
+import json
+import time
+import hashlib
+import ipaddress
+import threading
+import configparser
+from types import MappingProxyType
+from dataclasses import dataclass
+from typing import Mapping, Tuple
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini")
+
+# Minimum number of seconds between two mtime checks of the config file
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class MetadataField:
+    name: str
+    type: str
+    display_as: str
+    allow_filter: bool
+    allow_sort: bool
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Parsed and validated content of config.ini. Instances are immutable, use get_settings() to get the
+    current settings (the file is re-parsed only when its mtime changes).
+    """
+    path: str
+    mtime: float
+    etag: str
+
+    # [dataset]
+    json_path: str
+    index_path: str
+    database_path: str
+
+    # [document]
+    metadata: Tuple[MetadataField, ...]
+
+    # [display]
+    top_region: str
+    bottom_region: str
+
+    # [database]
+    json_dataset_path: str
+    database_name: str
+    database_dir: str
+    dataset_table_schema: Tuple[Mapping, ...]
+
+    # [model-training]
+    threads: int
+    load_model: bool
+    save_model: bool
+    load_lucene_index: bool
+
+    # [cache]
+    query_cache_size: int
+    query_cache_ttl: int
+
+    # [server]
+    db_pool_size: int
+    db_pool_timeout: int
+    db_mmap_size: int
+    db_cache_size_kb: int
+    db_statement_cache_size: int
+    bind: str
+    workers: int
+    worker_threads: int
+
+    # [profiling]
+    profiling_enabled: bool
+    profiling_allowlist: Tuple[str, ...]
+    profiling_mode: str
+    profiling_interval: float
+    profiling_sample_rate: float
+    profiling_dir: str
+
+    # [search]
+    search_backend: str
+    search_index_path: str
+    search_rebuild_index: bool
+    search_gateway_address: str
+    search_gateway_port: int
+    search_gateway_pool_size: int
+    search_gateway_timeout: float
+    search_gateway_checkout_timeout: float
+    search_gateway_health_check_interval: float
+    search_incremental: bool
+    search_update_interval: float
+    search_update_batch_size: int
+
+    # [response-cache]
+    response_cache_backend: str
+    response_cache_path: str
+    response_cache_max_size_mb: int
+    response_cache_max_entry_kb: int
+    response_cache_check_interval: float
+
+    @property
+    def metadata_fields(self):
+        return [field.name for field in self.metadata]
+
+    @property
+    def sort_fields(self):
+        return [field.name for field in self.metadata if field.allow_sort]
+
+    @property
+    def filter_fields(self):
+        return [field.name for field in self.metadata if field.allow_filter]
+
+
+def _literal(config, section, option):
+    """
+    Parse a Python literal option (lists of dicts in config.ini use Python syntax, e.g. False).
+    """
+    try:
+        return ast.literal_eval(config.get(section, option))
+    except (ValueError, SyntaxError) as ex:
+        raise ValueError(f"[{section}] {option} is not a valid literal: {ex}")
+
+
+def _unquote(value):
+    return value.strip().strip("\"")
+
+
+def load_settings(path=DEFAULT_CONFIG_PATH):
+    """
+    Read, parse and validate the given config file.
+        :return: Settings
+        :raises ValueError: when the config file is missing options or has invalid values
+    """
+    with open(path, "rb") as rf:
+        content = rf.read()
+    mtime = os.path.getmtime(path)
+
+    config = configparser.ConfigParser()
+    try:
+        config.read_string(content.decode("utf-8"), source=path)
+
+        metadata = []
+        for field in _literal(config, "document", "metadata"):
+            if "name" not in field:
+                raise ValueError(f"[document] metadata field without a name: {field}")
+            metadata.append(MetadataField(
+                name=field["name"],
+                type=field.get("type", "str"),
+                display_as=field.get("display_as", field["name"]),
+                allow_filter=bool(field.get("allow_filter", False)),
+                allow_sort=bool(field.get("allow_sort", False)),
+            ))
+        metadata_names = [field.name for field in metadata]
+
+        top_region = config.get("display", "topRegion")
+        bottom_region = config.get("display", "bottomRegion")
+        for option, region in [("topRegion", top_region), ("bottomRegion", bottom_region)]:
+            unknown = [name for name in json.loads(region) if name not in metadata_names]
+            if unknown:
+                raise ValueError(f"[display] {option} references unknown metadata fields: {unknown}")
+
+        schema = tuple(MappingProxyType(dict(col)) for col in _literal(config, "database", "datasetTableSchema"))
+        for col in schema:
+            if "optional" not in col or "default" not in col:
+                raise ValueError(f"[database] datasetTableSchema column without optional/default flags: {dict(col)}")
+
+        profiling_allowlist = tuple(
+            address.strip() for address in config.get("profiling", "allowlist", fallback="127.0.0.1").split(",")
+            if address.strip())
+        for address in profiling_allowlist:
+            ipaddress.ip_network(address, strict=False)  # Raises ValueError
+        profiling_mode = config.get("profiling", "mode", fallback="sampling")
+        if profiling_mode not in ("sampling", "cprofile"):
+            raise ValueError(f"[profiling] mode must be sampling or cprofile, not {profiling_mode}")
+        profiling_sample_rate = config.getfloat("profiling", "sampleRate", fallback=0.0)
+        if not 0 <= profiling_sample_rate <= 1:
+            raise ValueError(f"[profiling] sampleRate must be between 0 and 1, not {profiling_sample_rate}")
+
+        response_cache_backend = config.get("response-cache", "backend", fallback="sqlite")
+        if response_cache_backend not in ("none", "sqlite"):
+            raise ValueError(f"[response-cache] backend must be none or sqlite, not {response_cache_backend}")
+
+        search_backend = config.get("search", "backend", fallback="lucene")
+        if search_backend not in ("lucene", "python"):
+            raise ValueError(f"[search] backend must be lucene or python, not {search_backend}")
+
+        search_update_batch_size = config.getint("search", "updateBatchSize", fallback=1000)
+        if search_update_batch_size <= 0:
+            raise ValueError(f"[search] updateBatchSize must be positive, not {search_update_batch_size}")
+
+        return Settings(
+            path=path,
+            mtime=mtime,
+            etag=hashlib.sha1(content).hexdigest(),
+            json_path=config.get("dataset", "pathOfJSON"),
+            index_path=config.get("dataset", "pathOfIndex"),
+            database_path=config.get("dataset", "pathOfDatabase"),
+            metadata=tuple(metadata),
+            top_region=top_region,
+            bottom_region=bottom_region,
+            json_dataset_path=_unquote(config.get("database", "jsonDatasetPath")),
+            database_name=_unquote(config.get("database", "databaseName")),
+            database_dir=_unquote(config.get("database", "databasePath")),
+            dataset_table_schema=schema,
+            threads=config.getint("model-training", "threads", fallback=os.cpu_count()),
+            load_model=config.getboolean("model-training", "loadModel"),
+            save_model=config.getboolean("model-training", "saveModel"),
+            load_lucene_index=config.getboolean("model-training", "loadLuceneIndex", fallback=False),
+            query_cache_size=config.getint("cache", "queryCacheSize", fallback=1024),
+            query_cache_ttl=config.getint("cache", "queryCacheTTL", fallback=0),
+            db_pool_size=config.getint("server", "dbPoolSize", fallback=8),
+            db_pool_timeout=config.getint("server", "dbPoolTimeout", fallback=30),
+            db_mmap_size=config.getint("server", "dbMmapSize", fallback=268435456),
+            db_cache_size_kb=config.getint("server", "dbCacheSizeKB", fallback=65536),
+            db_statement_cache_size=config.getint("server", "dbStatementCacheSize", fallback=256),
+            bind=config.get("server", "bind", fallback="0.0.0.0:5050"),
+            workers=config.getint("server", "workers", fallback=0) or os.cpu_count(),
+            worker_threads=config.getint("server", "workerThreads", fallback=4),
+            profiling_enabled=config.getboolean("profiling", "enabled", fallback=False),
+            profiling_allowlist=profiling_allowlist,
+            profiling_mode=profiling_mode,
+            profiling_interval=config.getfloat("profiling", "interval", fallback=0.005),
+            profiling_sample_rate=profiling_sample_rate,
+            profiling_dir=config.get("profiling", "outputDir", fallback="profiles"),
+            search_backend=search_backend,
+            search_index_path=config.get("search", "indexPath", fallback="TopicModelingKit/src/searcher/bm25_index"),
+            search_rebuild_index=config.getboolean("search", "rebuildIndex", fallback=False),
+            search_gateway_address=config.get("search", "gatewayAddress", fallback="127.0.0.1"),
+            search_gateway_port=config.getint("search", "gatewayPort", fallback=25333),
+            search_gateway_pool_size=config.getint("search", "gatewayPoolSize", fallback=8),
+            search_gateway_timeout=config.getfloat("search", "gatewayTimeout", fallback=10.0),
+            search_gateway_checkout_timeout=config.getfloat("search", "gatewayCheckoutTimeout", fallback=30.0),
+            search_gateway_health_check_interval=config.getfloat("search", "gatewayHealthCheckInterval", fallback=30.0),
+            search_incremental=config.getboolean("search", "incremental", fallback=False),
+            search_update_interval=config.getfloat("search", "updateInterval", fallback=5.0),
+            search_update_batch_size=search_update_batch_size,
+            response_cache_backend=response_cache_backend,
+            response_cache_path=config.get("response-cache", "path", fallback="cache/responses.sqlite3"),
+            response_cache_max_size_mb=config.getint("response-cache", "maxSizeMB", fallback=256),
+            response_cache_max_entry_kb=config.getint("response-cache", "maxEntryKB", fallback=1024),
+            response_cache_check_interval=config.getfloat("response-cache", "checkInterval", fallback=5.0),
+        )
+    except (configparser.Error, json.JSONDecodeError) as ex:
+        raise ValueError(f"Invalid config file {path}: {ex}")
+
+
+_settings = {}
+_last_checked = {}
+_lock = threading.Lock()
+
+
+def get_settings(path=DEFAULT_CONFIG_PATH):
+    """
+    Get the current settings. The config file is parsed once and re-parsed only when its mtime changes
+    (checked at most once every RELOAD_CHECK_INTERVAL seconds). An invalid file keeps the previous settings.
+    """
+    settings = _settings.get(path)
+    now = time.monotonic()
+    if settings is not None and now - _last_checked[path] < RELOAD_CHECK_INTERVAL:
+        return settings
+
+    with _lock:
+        settings = _settings.get(path)
+        _last_checked[path] = now
+        try:
+            if settings is not None and os.path.getmtime(path) == settings.mtime:
+                return settings
+            _settings[path] = load_settings(path)
+        except (OSError, ValueError) as ex:
+            if settings is None:
+                raise
+            print(f"Config reload failed, keeping the previous settings: {ex}")
+        return _settings[path]
+
+
+class ProcessResource:
+    """
+    A resource of the current process derived from the settings (e.g. a connection pool or a thread), created
+    by `create(settings)` on first use. It is created again when config.ini changes (new settings ETag), the
+    previous one being passed to `close`, and in a worker forked from a process that already used it (sockets
+    and threads are not shared across processes).
+    """
+
+    def __init__(self, create, close=None, path=DEFAULT_CONFIG_PATH):
+        self._create = create
+        self._close = close
+        self._path = path
+        self._entry = None  # ((settings ETag, pid), resource)
+        self._lock = threading.Lock()
+
+    def get(self):
+        key = (get_settings(self._path).etag, os.getpid())
+        entry = self._entry
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        with self._lock:
+            previous = self._entry
+            if previous is None or previous[0] != key:
+                self._entry = (key, self._create(get_settings(self._path)))
+                # The resource of the parent process is left to the parent
+                if previous is not None and previous[0][1] == key[1] and self._close is not None:
+                    self._close(previous[1])
+            return self._entry[1]
+
+    def current(self):
+        """
+        Get the resource of this process without creating it, None before its first use.
+        """
+        entry = self._entry
+        return entry[1] if entry is not None and entry[0][1] == os.getpid() else None
@@ -10,7 +10,9 @@ import org.apache.lucene.queryparser.classic.MultiFieldQueryParser;
 import org.apache.lucene.search.*;
 import org.apache.lucene.search.similarities.BM25Similarity;
 import org.apache.lucene.store.*;
+import org.apache.lucene.util.BytesRef;
 import org.ini4j.Ini;
+import org.json.JSONArray;
 import org.json.JSONObject;
 import py4j.GatewayServer;
 
@@ -19,6 +21,23 @@ public class Search {
     private static String pathOfIndex;
     private static final String CONFIG_FILE =
             System.getProperty("user.dir") + File.separator + "TopicModelingKit/config.ini";
+    // Metadata fields are indexed with this prefix, so they never clash with the "id" and "text" fields
+    private static final String METADATA_PREFIX = "metadata.";
+    // Sort keys of the metadata fields, as doc values: numbers and text in separate fields, so a field with
+    // values of both types is never sorted in the index
+    private static final String SORT_NUMBER_PREFIX = "sort.number.";
+    private static final String SORT_TEXT_PREFIX = "sort.text.";
+    // Longer text metadata (e.g. the abstract) is not indexed, the name of the field is recorded in this field
+    private static final String UNINDEXED_FIELD = "unindexed";
+    private static final int MAX_METADATA_LENGTH = 256;
+    // Fields with more distinct values are not filtered in the index (see getFieldCapabilities)
+    private static final int MAX_FILTER_VALUES = 256;
+    // Commit user data key of the seq of the last database change in the index (see applyChanges)
+    private static final String WATERMARK_KEY = "watermark";
+    // Commit user data key of the version of the document fields (see buildDoc), an index with another version
+    // is rebuilt, the fields of a document must have the same types as in the other documents
+    private static final String SCHEMA_KEY = "schema";
+    private static final String SCHEMA_VERSION = "2";
 
     /**
      * Initializes the lucene indexing process
@@ -34,6 +53,8 @@ public class Search {
             Directory directory = FSDirectory.open(Paths.get(pathOfIndex));
             StandardAnalyzer analyzer = new StandardAnalyzer();
             IndexWriterConfig config = new IndexWriterConfig(analyzer);
+            // A full reindex replaces the previous index (and its watermark)
+            config.setOpenMode(IndexWriterConfig.OpenMode.CREATE);
             IndexWriter w = new IndexWriter(directory, config);
 
             // Check if the json file exists
@@ -57,9 +78,10 @@ public class Search {
                 // Use the title and abstract for lucene indexing
                 String text = obj.getString("text");
                 docsCount++;
-                addDoc(w, id, text);
+                addDoc(w, id, text, obj.optJSONObject("metadata"));
             }
             w.forceMerge(1);
+            w.setLiveCommitData(Collections.singletonMap(SCHEMA_KEY, SCHEMA_VERSION).entrySet());
             w.close();
 
             System.out.println("Number of documents in the index: " + docsCount);
@@ -69,6 +91,76 @@ public class Search {
         }
     }
 
+    /**
+     * Applies a batch of database changes to the index in a single commit, and records the watermark of the
+     * batch in the commit. Segments are not force-merged, the merge policy merges them in the background.
+     *
+     * @param changesJson a JSON object with the inserted and updated "documents" (id, text and metadata, as in
+     *        the dataset JSON) and the "deleted" document ids
+     * @param fromWatermark the watermark the changes were read after
+     * @param watermark the seq of the last change of the batch
+     * @return the watermark of the index: the given one, or the current one when the index was not at
+     *         fromWatermark (the batch was applied by another process)
+     * @throws IOException if there is an error updating the index
+     */
+    public static synchronized long applyChanges(String changesJson, long fromWatermark, long watermark)
+            throws IOException {
+        try (Directory directory = FSDirectory.open(Paths.get(pathOfIndex))) {
+            long current = readWatermark(directory);
+            if (current != fromWatermark) {
+                return current;
+            }
+
+            JSONObject changes = new JSONObject(changesJson);
+            JSONArray deleted = changes.getJSONArray("deleted");
+            JSONArray documents = changes.getJSONArray("documents");
+            try (IndexWriter w = new IndexWriter(directory, new IndexWriterConfig(new StandardAnalyzer()))) {
+                for (int i = 0; i < deleted.length(); i++) {
+                    w.deleteDocuments(new Term("id", deleted.getString(i)));
+                }
+                for (int i = 0; i < documents.length(); i++) {
+                    JSONObject obj = documents.getJSONObject(i);
+                    String id = String.valueOf(obj.get("id"));
+                    w.updateDocument(new Term("id", id),
+                            buildDoc(id, obj.getString("text"), obj.optJSONObject("metadata")));
+                }
+                Map<String, String> commitData = new HashMap<>();
+                commitData.put(SCHEMA_KEY, SCHEMA_VERSION);
+                commitData.put(WATERMARK_KEY, Long.toString(watermark));
+                w.setLiveCommitData(commitData.entrySet());
+                w.commit();
+            }
+            System.out.println("Applied " + documents.length() + " updates and " + deleted.length()
+                    + " deletes, watermark " + watermark);
+            return watermark;
+        }
+    }
+
+    /**
+     * Gets the seq of the last database change in the index
+     *
+     * @return the watermark, 0 when the index was built from the JSON dataset or does not exist
+     * @throws IOException if there is an error reading the index
+     */
+    public static long getWatermark() throws IOException {
+        try (Directory directory = FSDirectory.open(Paths.get(pathOfIndex))) {
+            return readWatermark(directory);
+        }
+    }
+
+    private static long readWatermark(Directory directory) throws IOException {
+        if (!DirectoryReader.indexExists(directory)) {
+            return 0;
+        }
+        String value = SegmentInfos.readLatestCommit(directory).getUserData().get(WATERMARK_KEY);
+        return value != null ? Long.parseLong(value) : 0;
+    }
+
+    private static boolean hasCurrentSchema(Directory directory) throws IOException {
+        return DirectoryReader.indexExists(directory)
+                && SCHEMA_VERSION.equals(SegmentInfos.readLatestCommit(directory).getUserData().get(SCHEMA_KEY));
+    }
+
     /**
      * Searches for documents that match the given query string
      *
@@ -131,18 +223,265 @@ public class Search {
     }
 
     /**
-     * Adds a document to an IndexWriter with the given id and text
+     * Searches for documents that match the given query string, with an optional metadata filter applied
+     * before the top hits are collected, and an optional metadata field to order the top hits by (with a
+     * Lucene Sort over its doc values, ties in relevance order)
+     *
+     * @param searchMode the search mode, either "BM-25" or "TF-IDF"
+     * @param hitsPerPage the maximum number of hits
+     * @param query the query string
+     * @param filterField the metadata field to filter on, or null
+     * @param filterInput the text the filter field must contain (case-insensitive), or null
+     * @param sortField the metadata field to order the hits by, or null to keep the relevance order. Only the
+     *        fields reported sortable by getFieldCapabilities are ordered like in SQLite
+     * @param sortOrder "asc" or "desc"
+     * @return a JSON array of [document id, score] pairs, serialized as one string so py4j transfers the
+     *         whole result in a single call
+     * @throws IOException if an I/O exception occurs
+     * @throws org.apache.lucene.queryparser.classic.ParseException if a parsing exception occurs
+     *         while parsing the query string
+     */
+    public static String searchScored(String searchMode, int hitsPerPage, String query, String filterField,
+            String filterInput, String sortField, String sortOrder)
+            throws IOException, org.apache.lucene.queryparser.classic.ParseException {
+        if (hitsPerPage <= 0) {
+            throw new IllegalArgumentException("hitsPerPage must be greater than 0");
+        }
+        if (query == null || query.isEmpty()) {
+            throw new IllegalArgumentException("query cannot be null or empty");
+        }
+
+        try (StandardAnalyzer analyzer = new StandardAnalyzer();
+                Directory directory = FSDirectory.open(Paths.get(pathOfIndex));
+                IndexReader reader = DirectoryReader.open(directory)) {
+            IndexSearcher searcher = new IndexSearcher(reader);
+            if (Objects.equals(searchMode, "BM-25")) {
+                searcher.setSimilarity(new BM25Similarity(1.0f, 0.65f));
+            }
+
+            Query q = buildQuery(reader, analyzer, query, filterField, filterInput);
+            TopDocs top = searcher.search(q, hitsPerPage);
+            Map<Integer, Float> scores = new HashMap<>();
+            for (ScoreDoc hit : top.scoreDocs) {
+                scores.put(hit.doc, hit.score);
+            }
+            if (sortField != null) {
+                top = new SortRescorer(buildSort(reader, sortField, sortOrder)).rescore(searcher, top, hitsPerPage);
+            }
+
+            JSONArray json = new JSONArray();
+            for (ScoreDoc hit : top.scoreDocs) {
+                json.put(new JSONArray().put(searcher.doc(hit.doc).get("id")).put(scores.get(hit.doc)));
+            }
+            return json.toString();
+        } catch (IOException | org.apache.lucene.queryparser.classic.ParseException e) {
+            System.err.println("Error occurred during search: " + e.getMessage());
+            throw e;
+        }
+    }
+
+    /**
+     * Searches for a page of documents ranked by relevance, following the last hit of the previous page
+     * (IndexSearcher.searchAfter), so every page costs the same as the first one
+     *
+     * @param searchMode the search mode, either "BM-25" or "TF-IDF"
+     * @param hitsPerPage the maximum number of hits
+     * @param query the query string
+     * @param filterField the metadata field to filter on, or null
+     * @param filterInput the text the filter field must contain (case-insensitive), or null
+     * @param afterScore the score of the last hit of the previous page
+     * @param afterDoc the Lucene document number of the last hit of the previous page, or -1 for the first page
+     * @return a JSON object with the "hits" as [document id, score, Lucene document number] arrays and the
+     *         "total" number of hits
+     * @throws IOException if an I/O exception occurs
+     * @throws org.apache.lucene.queryparser.classic.ParseException if a parsing exception occurs
+     *         while parsing the query string
+     */
+    public static String searchAfter(String searchMode, int hitsPerPage, String query, String filterField,
+            String filterInput, double afterScore, int afterDoc)
+            throws IOException, org.apache.lucene.queryparser.classic.ParseException {
+        if (hitsPerPage <= 0) {
+            throw new IllegalArgumentException("hitsPerPage must be greater than 0");
+        }
+        if (query == null || query.isEmpty()) {
+            throw new IllegalArgumentException("query cannot be null or empty");
+        }
+
+        try (StandardAnalyzer analyzer = new StandardAnalyzer();
+                Directory directory = FSDirectory.open(Paths.get(pathOfIndex));
+                IndexReader reader = DirectoryReader.open(directory)) {
+            IndexSearcher searcher = new IndexSearcher(reader);
+            if (Objects.equals(searchMode, "BM-25")) {
+                searcher.setSimilarity(new BM25Similarity(1.0f, 0.65f));
+            }
+
+            Query q = buildQuery(reader, analyzer, query, filterField, filterInput);
+            ScoreDoc after = afterDoc >= 0 ? new ScoreDoc(afterDoc, (float) afterScore) : null;
+            // Count every hit, the total is reported with each page
+            TopScoreDocCollector collector = TopScoreDocCollector.create(hitsPerPage, after, Integer.MAX_VALUE);
+            searcher.search(q, collector);
+            TopDocs docs = collector.topDocs();
+
+            JSONArray hits = new JSONArray();
+            for (ScoreDoc hit : docs.scoreDocs) {
+                hits.put(new JSONArray().put(searcher.doc(hit.doc).get("id")).put(hit.score).put(hit.doc));
+            }
+            return new JSONObject().put("hits", hits).put("total", docs.totalHits.value).toString();
+        } catch (IOException | org.apache.lucene.queryparser.classic.ParseException e) {
+            System.err.println("Error occurred during search: " + e.getMessage());
+            throw e;
+        }
+    }
+
+    /**
+     * Gets the metadata fields the index can filter and sort on like SQLite does: a field is filterable when it
+     * has at most MAX_FILTER_VALUES distinct values, and sortable when its values all have the same type (number
+     * or text). Fields with a value too long to be indexed are neither.
+     *
+     * @return a JSON object with the "filter" and "sort" arrays of field names
+     * @throws IOException if there is an error reading the index
+     */
+    public static String getFieldCapabilities() throws IOException {
+        try (Directory directory = FSDirectory.open(Paths.get(pathOfIndex));
+                IndexReader reader = DirectoryReader.open(directory)) {
+            Set<String> unindexed = new HashSet<>();
+            Terms unindexedTerms = MultiTerms.getTerms(reader, UNINDEXED_FIELD);
+            if (unindexedTerms != null) {
+                TermsEnum terms = unindexedTerms.iterator();
+                for (BytesRef term = terms.next(); term != null; term = terms.next()) {
+                    unindexed.add(term.utf8ToString());
+                }
+            }
+
+            FieldInfos infos = FieldInfos.getMergedFieldInfos(reader);
+            JSONArray filter = new JSONArray();
+            JSONArray sort = new JSONArray();
+            for (FieldInfo info : infos) {
+                String field;
+                if (info.name.startsWith(METADATA_PREFIX)) {
+                    field = info.name.substring(METADATA_PREFIX.length());
+                    if (!unindexed.contains(field) && countTerms(reader, info.name) <= MAX_FILTER_VALUES) {
+                        filter.put(field);
+                    }
+                } else if (info.name.startsWith(SORT_NUMBER_PREFIX)) {
+                    field = info.name.substring(SORT_NUMBER_PREFIX.length());
+                    if (!unindexed.contains(field) && infos.fieldInfo(SORT_TEXT_PREFIX + field) == null) {
+                        sort.put(field);
+                    }
+                } else if (info.name.startsWith(SORT_TEXT_PREFIX)) {
+                    field = info.name.substring(SORT_TEXT_PREFIX.length());
+                    if (!unindexed.contains(field) && infos.fieldInfo(SORT_NUMBER_PREFIX + field) == null) {
+                        sort.put(field);
+                    }
+                }
+            }
+            return new JSONObject().put("filter", filter).put("sort", sort).toString();
+        }
+    }
+
+    /**
+     * Counts the distinct terms of a field, up to MAX_FILTER_VALUES + 1
+     */
+    private static int countTerms(IndexReader reader, String field) throws IOException {
+        Terms terms = MultiTerms.getTerms(reader, field);
+        if (terms == null) {
+            return 0;
+        }
+        TermsEnum termsEnum = terms.iterator();
+        int count = 0;
+        while (count <= MAX_FILTER_VALUES && termsEnum.next() != null) {
+            count++;
+        }
+        return count;
+    }
+
+    /**
+     * Parses the query string, with the metadata filter as a FILTER clause (no effect on the scores). The filter
+     * has the semantics of the SQL filter (LIKE '%input%'): the distinct lowercased values of the field that
+     * contain the input are looked up, and matched as terms.
+     */
+    private static Query buildQuery(IndexReader reader, StandardAnalyzer analyzer, String query, String filterField,
+            String filterInput) throws IOException, org.apache.lucene.queryparser.classic.ParseException {
+        Query q = new MultiFieldQueryParser(new String[] {"text"}, analyzer).parse(query);
+        if (filterField != null && filterInput != null && !filterInput.isEmpty()) {
+            String field = METADATA_PREFIX + filterField;
+            String needle = filterInput.toLowerCase(Locale.ROOT);
+            List<BytesRef> matching = new ArrayList<>();
+            Terms terms = MultiTerms.getTerms(reader, field);
+            if (terms != null) {
+                TermsEnum termsEnum = terms.iterator();
+                for (BytesRef term = termsEnum.next(); term != null; term = termsEnum.next()) {
+                    if (term.utf8ToString().contains(needle)) {
+                        matching.add(BytesRef.deepCopyOf(term));
+                    }
+                }
+            }
+            q = new BooleanQuery.Builder()
+                    .add(q, BooleanClause.Occur.MUST)
+                    .add(new TermInSetQuery(field, matching), BooleanClause.Occur.FILTER)
+                    .build();
+        }
+        return q;
+    }
+
+    /**
+     * Builds the sort of the hits by a metadata field, ties in relevance order. Missing values come first in
+     * ascending order and last in descending order, like in SQLite.
+     */
+    private static Sort buildSort(IndexReader reader, String sortField, String sortOrder) {
+        boolean reverse = "desc".equalsIgnoreCase(sortOrder);
+        SortField field;
+        if (FieldInfos.getMergedFieldInfos(reader).fieldInfo(SORT_TEXT_PREFIX + sortField) != null) {
+            field = new SortField(SORT_TEXT_PREFIX + sortField, SortField.Type.STRING, reverse);
+            field.setMissingValue(SortField.STRING_FIRST);
+        } else {
+            field = new SortField(SORT_NUMBER_PREFIX + sortField, SortField.Type.DOUBLE, reverse);
+            field.setMissingValue(Double.NEGATIVE_INFINITY);
+        }
+        return new Sort(field, SortField.FIELD_SCORE, SortField.FIELD_DOC);
+    }
+
+    /**
+     * Adds a document to an IndexWriter with the given id, text and metadata
      *
      * @param indexWriter the IndexWriter to add the document to
      * @param id the id of the document
      * @param text the text content of the document
+     * @param metadata the metadata of the document (filtered and sorted on by searchScored), or null
      * @throws IOException if there is an error adding the document to the IndexWriter
      */
-    private static void addDoc(IndexWriter w, String id, String text) throws IOException {
+    private static void addDoc(IndexWriter w, String id, String text, JSONObject metadata) throws IOException {
+        w.addDocument(buildDoc(id, text, metadata));
+    }
+
+    /**
+     * Builds the document of the given id, text and metadata
+     */
+    private static Document buildDoc(String id, String text, JSONObject metadata) {
         Document doc = new Document();
         doc.add(new TextField("id", id, Store.YES));
         doc.add(new TextField("text", text, Store.YES));
-        w.addDocument(doc);
+        if (metadata != null) {
+            for (String name : metadata.keySet()) {
+                Object value = metadata.get(name);
+                if (value == JSONObject.NULL) {
+                    continue;
+                }
+                String string = value.toString();
+                if (string.length() > MAX_METADATA_LENGTH) {
+                    doc.add(new StringField(UNINDEXED_FIELD, name, Store.NO));
+                    continue;
+                }
+                // Lowercased keyword for the filters (numbers too, LIKE matches their text), doc values to sort
+                doc.add(new StringField(METADATA_PREFIX + name, string.toLowerCase(Locale.ROOT), Store.NO));
+                if (value instanceof Number) {
+                    doc.add(new DoubleDocValuesField(SORT_NUMBER_PREFIX + name, ((Number) value).doubleValue()));
+                } else {
+                    doc.add(new SortedDocValuesField(SORT_TEXT_PREFIX + name, new BytesRef(string)));
+                }
+            }
+        }
+        return doc;
     }
 
     /**
@@ -159,20 +498,32 @@ public class Search {
         System.out.println("Reading the config file...");
         System.out.println("pathOfJSON: " + pathOfJSON + "\npathOfIndex: " + pathOfIndex);
 
-        // Initialize the lucene indexing process, munually set the port number to avoid conflict
-        GatewayServer gatewayServer = new GatewayServer(new Search(), 25333);
+        // Initialize the lucene indexing process, the port is set in the config file to avoid conflict
+        String gatewayPort = ini.get("search", "gatewayPort");
+        int port = gatewayPort != null ? Integer.parseInt(gatewayPort.trim()) : GatewayServer.DEFAULT_PORT;
+        GatewayServer gatewayServer = new GatewayServer(new Search(), port);
         gatewayServer.start();
         System.out.println("==============================================");
         System.out.println("Gateway Server Started");
         System.out.println("==============================================");
 
         boolean loadLuceneIndex = Boolean.parseBoolean(ini.get("model-training", "loadLuceneIndex"));
-        if (!loadLuceneIndex) {
+        // In incremental mode the server applies the database changes to the existing index (see applyChanges)
+        boolean incremental = Boolean.parseBoolean(ini.get("search", "incremental"));
+        boolean indexCurrent;
+        try (Directory directory = FSDirectory.open(Paths.get(pathOfIndex))) {
+            indexCurrent = hasCurrentSchema(directory);
+        }
+        if (!loadLuceneIndex && !(incremental && indexCurrent)) {
             System.out.println("Lucene Indexing Process");
             System.out.println("==============================================");
             init();
         } else {
             System.out.println("Load Lucene Index");
+            if (!indexCurrent) {
+                System.out.println("[WARNING] The index was built by another version, rebuild it to filter, "
+                        + "sort and update it in the index");
+            }
             System.out.println("==============================================");
         }
     }
@@ -0,0 +1,39 @@
+"""
+Requests to the Flask test client shared by the API benchmarks and the tests in back_end/tests.
+"""
+
+
+def get(client, url, **kwargs):
+    response = client.get(url, **kwargs)
+    response.close()
+    assert response.status_code == 200, f"{url}: {response.status_code}"
+    return response
+
+
+def post(client, url, body):
+    response = client.post(url, json=body)
+    response.close()
+    assert response.status_code == 200, f"{url}: {response.status_code}"
+    return response
+
+
+def ids(documents):
+    return [document["id"] for document in documents]
+
+
+def walk_pages(client, url):
+    """Every document of a paginated route, following X-Next-Cursor until the last page."""
+    documents, cursor = [], None
+    while True:
+        response = get(client, url + (f"&after={cursor}" if cursor else ""))
+        documents += response.get_json()
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return documents
+
+
+def sort_key(document, order):
+    # SQLite puts NULLs first in ascending order, last in descending order
+    year = document["metadata"]["year"]
+    return (year is not None, year or 0, document["id"]) if order == "asc" else \
+        (year is None, -(year or 0), -document["id"])
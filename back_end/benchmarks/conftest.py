@@ -0,0 +1,82 @@
+import os
+import sys
+import sqlite3
+import pytest
+
+BACK_END_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACK_END_DIR)
+
+# The server must not load/train the configured model, the benchmarks attach the stand-in
+os.environ["SKIP_MODEL_LOADING"] = "1"
+
+from benchmarks.corpus import write_corpus, CorpusGenerator, DEFAULT_SEED
+from benchmarks.fakes import attach_stand_ins, make_fake_model
+
+
+def pytest_addoption(parser):
+    parser.addoption("--corpus-size", type=int, default=20000, help="Number of synthetic documents")
+    parser.addoption("--corpus-seed", type=int, default=DEFAULT_SEED, help="Seed of the synthetic corpus")
+
+
+@pytest.fixture(scope="session")
+def corpus_size(request):
+    return request.config.getoption("--corpus-size")
+
+
+@pytest.fixture(scope="session")
+def corpus_seed(request):
+    return request.config.getoption("--corpus-seed")
+
+
+@pytest.fixture(scope="session")
+def corpus_generator(corpus_seed):
+    return CorpusGenerator(corpus_seed)
+
+
+@pytest.fixture(scope="session")
+def corpus_db(tmp_path_factory, corpus_size, corpus_seed):
+    return write_corpus(str(tmp_path_factory.mktemp("corpus") / "dataset.sqlite3"), corpus_size, corpus_seed)
+
+
+@pytest.fixture(scope="session")
+def fake_model(corpus_db):
+    conn = sqlite3.connect(corpus_db)
+    doc_ids = [row[0] for row in conn.execute("SELECT id FROM Dataset ORDER BY id")]
+    conn.close()
+    return make_fake_model(doc_ids)
+
+
+@pytest.fixture
+def clear_query_caches(fake_model):
+    """
+    setup= of the uncached label benchmarks, so every round embeds its queries.
+    """
+    def clear():
+        fake_model.query_embedding_cache.clear()
+        fake_model.query_topics_cache.clear()
+
+    return clear
+
+
+@pytest.fixture(scope="session")
+def server(corpus_db, fake_model):
+    """
+    The Flask app module serving the synthetic corpus, with the fake searcher and topic model.
+    """
+    import server
+
+    attach_stand_ins(server, corpus_db, fake_model)
+    yield server
+    server.db_pool.close()
+
+
+@pytest.fixture(scope="session")
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def corpus_info(benchmark, corpus_size, corpus_seed):
+    # Stored with the results, runs are only comparable for the same corpus
+    benchmark.extra_info["corpus_size"] = corpus_size
+    benchmark.extra_info["corpus_seed"] = corpus_seed
@@ -0,0 +1,161 @@
+"""
+Synthetic corpus generator for the benchmarks.
+
+Documents follow the `datasetTableSchema` of config.ini. Abstracts are drawn from topic-specific word
+distributions (Zipf-like), so full-text search, filters and the topic model stand-in see a realistic
+vocabulary and result sizes. The same (size, seed) always produces the same corpus.
+
+    python -m benchmarks.corpus --size 100000 --output /tmp/corpus.sqlite3
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TopicModelingKit.src.database import dataset_dbtool as dt
+
+DEFAULT_SEED = 1234
+VOCABULARY_SIZE = 20000
+CORPUS_TOPICS = 50
+TOPIC_WORDS = 400
+LANGUAGES = ["English", "French", "German", "Spanish", "Chinese"]
+LANGUAGE_WEIGHTS = [0.8, 0.06, 0.06, 0.05, 0.03]
+SYLLABLES = ["ka", "lo", "mi", "ra", "te", "su", "ne", "vo", "pi", "da",
+             "ge", "zu", "ha", "ri", "bo", "an", "el", "or", "is", "um"]
+
+
+def make_vocabulary(rng, size=VOCABULARY_SIZE):
+    """
+    Deterministic pronounceable words ("kalomi", "teras", ...).
+    """
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return np.array(words)
+
+
+class CorpusGenerator:
+    """
+    Generates documents for the columns of `datasetTableSchema`.
+
+    :param seed: Random seed, the corpus only depends on the seed and the number of documents
+    :param schema: Table schema (defaults to the one of config.ini)
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, schema=None):
+        self.seed = seed
+        self.schema = dt.DATASET_TB_SCHEMA if schema is None else schema
+        rng = np.random.default_rng(seed)
+        self.vocabulary = make_vocabulary(rng)
+        self.topic_words = [rng.choice(len(self.vocabulary), TOPIC_WORDS, replace=False)
+                            for _ in range(CORPUS_TOPICS)]
+        zipf = 1.0 / np.arange(1, TOPIC_WORDS + 1)
+        self.word_weights = zipf / zipf.sum()
+        self.first_names = make_vocabulary(rng, 300)
+        self.last_names = make_vocabulary(rng, 1000)
+
+    def columns(self):
+        """
+        Generated columns in table order: the primary key and every column without a database default.
+        """
+        return [list(col.keys())[0] for col in self.schema
+                if "PRIMARY KEY" in list(col.values())[0].upper() or not col["default"]]
+
+    def _text(self, rng, topic, low, high):
+        words = rng.choice(self.topic_words[topic], size=rng.integers(low, high), p=self.word_weights)
+        return " ".join(self.vocabulary[words])
+
+    def _value(self, rng, name, sql_type, doc_id, topic):
+        sql_type = sql_type.upper()
+        if "PRIMARY KEY" in sql_type:
+            return doc_id
+        if name == "abstract":
+            return self._text(rng, topic, 80, 200)
+        if name == "title":
+            return self._text(rng, topic, 4, 11).title()
+        if name == "author":
+            return f"{rng.choice(self.first_names).title()} {rng.choice(self.last_names).title()}"
+        if name == "year":
+            return int(rng.integers(1950, 2024))
+        if name == "language":
+            return str(rng.choice(LANGUAGES, p=LANGUAGE_WEIGHTS))
+        if name == "URI":
+            return f"https://example.org/documents/{doc_id}"
+        if name == "parent_id":
+            return int(rng.integers(1, doc_id)) if doc_id > 1 and rng.random() < 0.1 else None
+        if "INT" in sql_type:
+            return int(rng.integers(0, 1000))
+        if "REAL" in sql_type or "FLOAT" in sql_type:
+            return float(rng.random())
+        if "DATE" in sql_type:
+            return f"{rng.integers(1990, 2024)}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}"
+        return self._text(rng, topic, 1, 6)
+
+    def rows(self, size):
+        """
+        Yields `size` rows (tuples of columns() values), document IDs are 1..size.
+        """
+        rng = np.random.default_rng(self.seed + 1)
+        types = {list(col.keys())[0]: list(col.values())[0] for col in self.schema}
+        columns = self.columns()
+        for doc_id in range(1, size + 1):
+            topic = int(rng.integers(CORPUS_TOPICS))
+            yield tuple(self._value(rng, name, types[name], doc_id, topic) for name in columns)
+
+    def dataset(self, size):
+        """
+        The corpus in the format of dataset_dbtool.load_dataset(): {id: {column: value}}.
+        """
+        columns = self.columns()
+        metadata_columns = dt.NON_OPTIONAL_METADATA_COL + dt.OPTIONAL_METADATA_COL
+        dataset = {}
+        for row in self.rows(size):
+            values = dict(zip(columns, row))
+            dataset[str(values[columns[0]])] = {name: values.get(name) for name in metadata_columns}
+        return dataset
+
+    def id_abstract_list(self, size):
+        """
+        The corpus in the format of load_documents_from_sqlite(): [(id, abstract), ...].
+        """
+        columns = self.columns()
+        id_pos, abstract_pos = 0, columns.index("abstract")
+        return [(row[id_pos], row[abstract_pos]) for row in self.rows(size)]
+
+
+def write_corpus(path, size, seed=DEFAULT_SEED, indexes=True):
+    """
+    Write a synthetic Dataset table (and the metadata/full-text indexes) to a new SQLite database.
+        :return: The database path
+    """
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    generator = CorpusGenerator(seed)
+    columns = generator.columns()
+
+    conn = sqlite3.connect(path)
+    dt.create_sqlite_db(conn)
+    conn.executemany(
+        f"INSERT INTO Dataset ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        generator.rows(size))
+    conn.commit()
+    if indexes:
+        dt.create_metadata_indexes(conn)
+        dt.create_fts_index(conn)
+    conn.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Synthetic corpus generator')
+    parser.add_argument('-n', '--size', type=int, default=10000, help='Number of documents')
+    parser.add_argument('-s', '--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+    parser.add_argument('-o', '--output', required=True, help='Path of the SQLite database to create')
+    args = parser.parse_args()
+    print(f"Corpus written to {write_corpus(args.output, args.size, args.seed)}")
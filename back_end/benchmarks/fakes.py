@@ -0,0 +1,159 @@
+"""
+In-process stand-ins for the services the server needs outside of SQLite: the Lucene search gateway
+(Search.java over py4j) and the trained topic model. Both are deterministic, so benchmark results only
+depend on the code under test.
+"""
+import zlib
+import sqlite3
+import numpy as np
+
+from TopicModelingKit.src.database.connection_pool import ReadOnlyConnectionPool
+from TopicModelingKit.src.database.response_cache import ResponseCache
+from TopicModelingKit.src.models.BERTopic import BertopicModel
+from TopicModelingKit.src.models.artifacts import LoadedTopicModel
+from TopicModelingKit.src.models.document_map import DocumentIdMap
+from TopicModelingKit.src.models.vector_index import DocumentVectorIndex
+
+DEFAULT_MODEL_TOPICS = 50
+DEFAULT_EMBEDDING_DIM = 384  # Same as all-MiniLM-L6-v2
+
+
+class FakeSearcher:
+    """
+    Searcher over an in-memory inverted index of the abstracts. Like Search.java, results are lists of
+    document IDs as strings (or (id, score) pairs from search()), ranked by the number of query terms
+    matched (ties by ID).
+    """
+
+    def __init__(self, database):
+        self.postings = {}
+        conn = sqlite3.connect(database)
+        for doc_id, abstract in conn.execute("SELECT id, abstract FROM Dataset ORDER BY id"):
+            for term in set((abstract or "").lower().split()):
+                self.postings.setdefault(term, []).append(doc_id)
+        conn.close()
+
+    def __call__(self):
+        # server.Searcher() is instantiated per request
+        return self
+
+    def setUpIndex(self):
+        return
+
+    def _rank(self, size, query, after=None):
+        scores = {}
+        for term in set(query.lower().split()):
+            for doc_id in self.postings.get(term, []):
+                scores[doc_id] = scores.get(doc_id, 0) + 1
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if after is not None:
+            ranked = [(doc_id, score) for doc_id, score in ranked if (-score, doc_id) > (-after["score"], after["doc"])]
+        return ranked[:size], len(scores)
+
+    def _search(self, size, query):
+        return [str(doc_id) for doc_id, _ in self._rank(size, query)[0]]
+
+    def search(self, query: str, size: int, similarity: str = "BM25", filter_field: str = None,
+               filter_input: str = None, sort: str = None, order: str = None) -> list:
+        # No metadata in the index (see can_filter()), the server filters and sorts the hits in SQL
+        return [(doc_id, float(score)) for doc_id, score in self._rank(size, query)[0]]
+
+    def search_after(self, query: str, size: int, similarity: str = "BM25", filter_field: str = None,
+                     filter_input: str = None, after: dict = None) -> tuple:
+        # The continuation token is the (score, id) of the last hit, ids stand for the engine documents
+        ranked, total = self._rank(size + 1, query, after)
+        next_after = {"score": ranked[size - 1][1], "doc": ranked[size - 1][0]} if len(ranked) > size else None
+        return [(doc_id, float(score)) for doc_id, score in ranked[:size]], next_after, total
+
+    def can_filter(self, field: str) -> bool:
+        return False
+
+    def can_sort(self, field: str) -> bool:
+        return False
+
+    def search_TFIDF(self, size: int, query: str) -> list:
+        return self._search(size, query)
+
+    def search_BM25(self, size: int, query: str) -> list:
+        return self._search(size, query)
+
+
+def attach_stand_ins(server, database, model):
+    """
+    Point the server module at a corpus database, with the fake searcher and topic model. Responses are not
+    cached (see test_search_response_cache_hit).
+    """
+    settings = server.get_settings()
+    server.db_pool = ReadOnlyConnectionPool(
+        database,
+        size=settings.db_pool_size,
+        timeout=settings.db_pool_timeout,
+        mmap_size=settings.db_mmap_size,
+        cache_size_kb=settings.db_cache_size_kb,
+        statement_cache_size=settings.db_statement_cache_size
+    )
+    server.Searcher = FakeSearcher(database)
+    server.response_cache = ResponseCache()
+    server.bm = model
+    server.set_model_status(state="ready")
+
+
+class HashingEncoder:
+    """
+    Embedding model stand-in: the embedding of a string is the normalized sum of a pseudo-random vector
+    per token, seeded by the token's CRC32.
+    """
+
+    def __init__(self, dim=DEFAULT_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _token(self, token):
+        return np.random.default_rng(zlib.crc32(token.encode())).standard_normal(self.dim, dtype=np.float32)
+
+    def embed_words(self, words, verbose=False):
+        embeddings = np.zeros((len(words), self.dim), dtype=np.float32)
+        for i, text in enumerate(words):
+            for token in text.lower().split():
+                embeddings[i] += self._token(token)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def make_fake_model(doc_ids, topics=DEFAULT_MODEL_TOPICS, dim=DEFAULT_EMBEDDING_DIM, seed=0,
+                    query_cache_size=1024, query_cache_ttl=None):
+    """
+    A BertopicModel serving a deterministic random topic model over the given documents. Only the trained
+    model is faked, the topic index, neighbour table, document vectors and query caches are the real ones.
+
+    :param doc_ids: Database IDs of the documents, in document index order
+    :param topics: Number of topics (plus the outlier topic -1)
+    :param dim: Embedding dimension
+    :param seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    count = len(doc_ids)
+    document_topics = rng.integers(-1, topics, count).astype(np.int32)
+    topic_embeddings = rng.standard_normal((topics + 1, dim)).astype(np.float32)
+    representations = {
+        str(topic_id): [[f"topic{topic_id}_word{rank}", 1.0 / (rank + 1)] for rank in range(10)]
+        for topic_id in range(-1, topics)
+    }
+
+    trained_model = LoadedTopicModel({"metadata": {}}, {
+        "document_topics": document_topics,
+        "probabilities": rng.random(count).astype(np.float32),
+        "topic_embeddings": topic_embeddings,
+        "topics": {"representations": representations, "representative_docs": {}},
+    })
+    trained_model.embedding_model = HashingEncoder(dim)
+
+    model = BertopicModel([], query_cache_size=query_cache_size, query_cache_ttl=query_cache_ttl)
+    model.trained_model = trained_model
+    model.document_topics = document_topics
+    model.DOCUMENT_IDX_ID_MAP = DocumentIdMap.from_ids(doc_ids)
+    model.build_topic_index()
+    model.build_topic_neighbours()
+
+    # Documents are close to the embedding of their topic
+    vectors = topic_embeddings[document_topics + 1] + rng.standard_normal((count, dim), dtype=np.float32)
+    model.document_vectors = DocumentVectorIndex.build(vectors)
+    return model
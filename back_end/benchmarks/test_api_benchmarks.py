@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import pytest
+
+from benchmarks.api import get, post, ids, walk_pages, sort_key
+
+DOC_ID = 42
+TOPIC_ID = 3
+
+
+@pytest.fixture(scope="module")
+def search_query(corpus_generator):
+    # Two frequent words of a corpus topic
+    return " ".join(corpus_generator.vocabulary[corpus_generator.topic_words[0][:2]])
+
+
+ROUTES = {
+    "docs": "/api/docs?limit=100",
+    "docs_sorted": "/api/docs?limit=100&sort=year&order=desc",
+    "document": f"/api/document/{DOC_ID}",
+    "get_allow_sort": "/api/get_allow_sort",
+    "get_allow_filter": "/api/get_allow_filter",
+    "get_top_region": "/api/get_top_region",
+    "get_bottom_region": "/api/get_bottom_region",
+    "db_pool": "/api/db_pool",
+    "get_all_labels": "/api/get_all_labels",
+    "get_similar_topics": f"/api/get_similar_topics?doc_id={DOC_ID}",
+    "get_similar_documents": f"/api/get_similar_documents?doc_id={DOC_ID}",
+    "get_topic_docs": f"/api/get_topic_docs?topic_id={TOPIC_ID}&limit=100",
+    "get_topic_docs_sorted": f"/api/get_topic_docs?topic_id={TOPIC_ID}&limit=100&sort=year&order=asc",
+    "get_topic_docs_filtered": f"/api/get_topic_docs?topic_id={TOPIC_ID}&limit=100&filter_field=language&filter_input=fren",
+    "get_topic_docs_all": f"/api/get_topic_docs?topic_id={TOPIC_ID}&limit=1000",
+    "get_topic_docs_stream": f"/api/get_topic_docs?topic_id={TOPIC_ID}&limit=1000&stream=1",
+}
+
+
+@pytest.fixture(scope="module")
+def corpus(corpus_db):
+    conn = sqlite3.connect(corpus_db)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def topic_doc_ids(fake_model):
+    # Every document of TOPIC_ID, ranked by topic probability
+    return fake_model.DOCUMENT_IDX_ID_MAP.get_id_array(fake_model.topic_index.documents(TOPIC_ID)).tolist()
+
+
+def check_labels(topics):
+    # The fake model labels topic N with topicN_word0, topicN_word1...
+    assert topics and len({topic["id"] for topic in topics}) == len(topics)
+    for topic in topics:
+        assert topic["topic_list"] == [f"topic{topic['id']}_word{rank}" for rank in range(len(topic["topic_list"]))]
+
+
+def check_route(name, response, corpus, topic_doc_ids, settings):
+    """Content of a ROUTES response against the corpus and the fake model."""
+    text = response.get_data(as_text=True)
+    # The regions are served as they are written in config.ini, and the stream is one document per line
+    body = json.loads(text) if name != "get_topic_docs_stream" else [json.loads(line) for line in text.splitlines() if line]
+    if name == "docs":
+        assert ids(body) == [row[0] for row in corpus.execute("SELECT id FROM Dataset ORDER BY id LIMIT 100")]
+        assert int(response.headers["X-Total-Count"]) == corpus.execute("SELECT count(*) FROM Dataset").fetchone()[0]
+    elif name == "docs_sorted":
+        assert ids(body) == [row[0] for row in corpus.execute(
+            "SELECT id FROM Dataset ORDER BY year DESC, id DESC LIMIT 100")]
+    elif name == "document":
+        title = corpus.execute("SELECT title FROM Dataset WHERE id = ?", (DOC_ID,)).fetchone()[0]
+        assert body["id"] == DOC_ID and body["metadata"]["title"] == title
+    elif name == "get_allow_sort":
+        assert body == settings.sort_fields
+    elif name == "get_allow_filter":
+        assert body == settings.filter_fields
+    elif name == "get_top_region":
+        assert body == json.loads(settings.top_region)
+    elif name == "get_bottom_region":
+        assert body == json.loads(settings.bottom_region)
+    elif name == "db_pool":
+        assert body["size"] == settings.db_pool_size and body["in_use"] <= body["open"] <= body["size"]
+    elif name in ("get_all_labels", "get_similar_topics"):
+        check_labels(body)
+    elif name == "get_similar_documents":
+        assert body and len(set(ids(body))) == len(body) == int(response.headers["X-Total-Count"])
+    elif name == "get_topic_docs":
+        assert ids(body) == topic_doc_ids[:100]
+        assert int(response.headers["X-Total-Count"]) == len(topic_doc_ids)
+    elif name == "get_topic_docs_sorted":
+        assert set(ids(body)) <= set(topic_doc_ids) and len(body) == min(100, len(topic_doc_ids))
+        assert body == sorted(body, key=lambda document: sort_key(document, "asc"))
+    elif name == "get_topic_docs_filtered":
+        language = dict(corpus.execute("SELECT id, language FROM Dataset"))
+        assert ids(body) == [doc_id for doc_id in topic_doc_ids if "fren" in (language[doc_id] or "").lower()][:100]
+    elif name in ("get_topic_docs_all", "get_topic_docs_stream"):
+        assert ids(body) == topic_doc_ids[:1000]
+
+
+@pytest.mark.parametrize("name", ROUTES.keys())
+def test_route(benchmark, client, server, corpus, topic_doc_ids, name):
+    response = client.get(ROUTES[name])
+    assert response.status_code == 200, f"{ROUTES[name]}: {response.status_code}"
+    check_route(name, response, corpus, topic_doc_ids, server.get_settings())
+    response.close()
+    benchmark(get, client, ROUTES[name])
+
+
+def test_docs_next_page(benchmark, client, corpus):
+    cursor = get(client, "/api/docs?limit=100&sort=year&order=desc").headers["X-Next-Cursor"]
+    response = benchmark(get, client, f"/api/docs?limit=100&sort=year&order=desc&after={cursor}")
+    # The second page continues the first one
+    assert ids(response.get_json()) == [row[0] for row in corpus.execute(
+        "SELECT id FROM Dataset ORDER BY year DESC, id DESC LIMIT 100 OFFSET 100")]
+
+
+def test_search(benchmark, client, server, search_query):
+    response = benchmark(get, client, f"/api/search?q={search_query}&limit=100")
+    assert ids(response.get_json()) == [doc_id for doc_id, _ in server.Searcher().search(search_query, 100)]
+
+
+def test_search_next_page(benchmark, client, server, search_query):
+    cursor = get(client, f"/api/search?q={search_query}&limit=20").headers["X-Next-Cursor"]
+    benchmark(get, client, f"/api/search?q={search_query}&limit=20&after={cursor}")
+    # Every match exactly once, in relevance order
+    documents = walk_pages(client, f"/api/search?q={search_query}&limit=20")
+    ranked, total = server.Searcher()._rank(10 ** 9, search_query)
+    assert ids(documents) == [doc_id for doc_id, _ in ranked] and len(documents) == total
+
+
+def test_search_sorted_filtered(benchmark, client, server, search_query):
+    response = benchmark(get, client, f"/api/search?q={search_query}&limit=100&sort=year&order=desc"
+                                      f"&filter_field=language&filter_input=engl")
+    documents = response.get_json()
+    hits = {doc_id for doc_id, _ in server.Searcher().search(search_query, 100)}
+    assert documents and set(ids(documents)) <= hits
+    assert all("engl" in document["metadata"]["language"].lower() for document in documents)
+    assert documents == sorted(documents, key=lambda document: sort_key(document, "desc"))
+
+
+def test_labels_cached(benchmark, client):
+    response = benchmark(get, client, "/api/labels?topic_query=topic3_word0 topic3_word1")
+    check_labels(response.get_json())
+
+
+def test_labels_uncached(benchmark, client, clear_query_caches):
+    benchmark.pedantic(get, args=(client, "/api/labels?topic_query=topic3_word0 topic3_word1"),
+                       setup=clear_query_caches, rounds=200)
+
+
+def test_documents_batch(benchmark, client):
+    response = benchmark(post, client, "/api/documents/batch", {"ids": list(range(DOC_ID, DOC_ID + 50))})
+    assert ids(response.get_json()) == list(range(DOC_ID, DOC_ID + 50))
+
+
+def test_labels_batch_uncached(benchmark, client, clear_query_caches):
+    queries = [f"topic{topic_id}_word0 topic{topic_id}_word1" for topic_id in range(20)]
+    response = benchmark.pedantic(post, args=(client, "/api/labels/batch", {"queries": queries}),
+                                  setup=clear_query_caches, rounds=200)
+    results = response.get_json()
+    assert len(results) == len(queries)
+    for topics in results:
+        check_labels(topics)
+
+
+def test_search_response_cache_hit(benchmark, client, server, search_query, tmp_path):
+    from TopicModelingKit.src.database.response_cache import SQLiteResponseCache
+
+    uncached, server.response_cache = server.response_cache, SQLiteResponseCache(str(tmp_path / "responses.sqlite3"))
+    server.response_cache_sync['checked_at'] = None  # Sync the new cache on the first request
+    try:
+        url = f"/api/search?q={search_query}&limit=100"
+        computed = get(client, url)
+        assert computed.headers["X-Cache"] == "MISS"
+        response = benchmark(get, client, url)
+        assert response.headers["X-Cache"] == "HIT" and response.get_data() == computed.get_data()
+    finally:
+        server.response_cache.close()
+        server.response_cache = uncached
+
+
+def test_response_cache_sync_lagging_worker(benchmark, tmp_path):
+    from TopicModelingKit.src.database.response_cache import SQLiteResponseCache
+
+    path = str(tmp_path / "responses.sqlite3")
+    updated, lagging = SQLiteResponseCache(path), SQLiteResponseCache(path)
+    try:
+        updated.sync("index", 2)
+        updated.put("key", b"body", {})
+        # A worker still applying the changes to its index neither wipes nor uses the newer generation
+        lagging.sync("index", 1)
+        assert lagging.generation is None and updated.get("key") == (b"body", {})
+        benchmark(lagging.sync, "index", 2)
+        assert lagging.generation == updated.generation and lagging.get("key") == (b"body", {})
+    finally:
+        updated.close()
+        lagging.close()
@@ -0,0 +1,84 @@
+import copy
+import sqlite3
+import pytest
+
+from TopicModelingKit.src.database import dataset_dbtool as dt
+from TopicModelingKit.src.models.data_handler import TopicModelingToolkitDataHandler
+from TopicModelingKit.src.searcher.bm25 import BM25Index
+
+# Fixed sizes/threads, so results are comparable across machines with enough cores and across commits
+CLEAN_DOCS_COUNT = 5000
+CLEAN_DOCS_THREADS = 4
+LOAD_DOCS_COUNT = 2000
+
+
+@pytest.fixture(scope="module")
+def id_abstract_list(corpus_generator):
+    return corpus_generator.id_abstract_list(CLEAN_DOCS_COUNT)
+
+
+@pytest.fixture(scope="module")
+def dataset(corpus_generator):
+    return corpus_generator.dataset(LOAD_DOCS_COUNT)
+
+
+def test_multithreaded_clean_docs(benchmark, id_abstract_list):
+    handler = TopicModelingToolkitDataHandler(threads=CLEAN_DOCS_THREADS)
+    lines = benchmark.pedantic(handler.multithreaded_clean_docs, args=(id_abstract_list,), rounds=5)
+    assert len(lines) == CLEAN_DOCS_COUNT
+
+
+def test_load_to_db(benchmark, dataset):
+    def fresh_database():
+        # load_to_db() modifies the records in place
+        conn = sqlite3.connect(":memory:")
+        dt.create_sqlite_db(conn)
+        return (conn, copy.deepcopy(dataset)), {}
+
+    benchmark.pedantic(dt.load_to_db, setup=fresh_database, rounds=5)
+
+
+@pytest.fixture(scope="module")
+def bm25_index(corpus_db):
+    return BM25Index.build_from_database(corpus_db, filter_fields=["language"], sort_fields=["year"])
+
+
+def test_bm25_build(benchmark, corpus_db):
+    benchmark.pedantic(BM25Index.build_from_database, args=(corpus_db,), rounds=3)
+
+
+@pytest.mark.parametrize("similarity", ["BM25", "TF-IDF"])
+def test_bm25_search(benchmark, bm25_index, corpus_generator, similarity):
+    query = " ".join(corpus_generator.vocabulary[corpus_generator.topic_words[0][:2]])
+    doc_ids, _ = benchmark(bm25_index.search, query, 100, similarity)
+    assert 0 < len(doc_ids) <= 100
+
+
+def test_bm25_search_filtered_sorted(benchmark, bm25_index, corpus_generator):
+    query = " ".join(corpus_generator.vocabulary[corpus_generator.topic_words[0][:2]])
+    doc_ids, _ = benchmark(bm25_index.search, query, 100, "BM25", "language", "engl", "year", "desc")
+    assert 0 < len(doc_ids) <= 100
+
+
+def test_bm25_apply_changes(benchmark, bm25_index, corpus_generator):
+    text = " ".join(corpus_generator.vocabulary[corpus_generator.topic_words[1][:20]])
+    documents = [{"id": int(doc_id), "text": text, "metadata": {"language": "English", "year": 2000}}
+                 for doc_id in bm25_index.doc_ids[:100]]
+
+    def unchanged_index():
+        bm25_index.changes, bm25_index.watermark = None, 0
+        return (documents, [], 0, 1), {}
+
+    try:
+        assert benchmark.pedantic(bm25_index.apply_changes, setup=unchanged_index, rounds=20) == 1
+    finally:
+        bm25_index.changes, bm25_index.watermark = None, 0
+
+
+def test_bm25_search_after(benchmark, bm25_index, corpus_generator):
+    # The page following the middle of the results costs the same as the first page
+    query = " ".join(corpus_generator.vocabulary[corpus_generator.topic_words[0][:2]])
+    _, _, _, total = bm25_index.search_after(query, 1)
+    _, scores, docs, _ = bm25_index.search_after(query, max(total // 2, 1))
+    doc_ids, _, _, _ = benchmark(bm25_index.search_after, query, 100, "BM25", None, None, (scores[-1], docs[-1]))
+    assert len(doc_ids) <= 100
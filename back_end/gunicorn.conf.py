@@ -0,0 +1,40 @@
+"""
+Multi-worker serving: gunicorn -c gunicorn.conf.py server:app (from the back_end folder)
+
+The app is imported once in the master process (preload_app), which loads the model synchronously before the
+workers are forked, so every worker shares the model pages copy-on-write instead of loading its own copy. The
+large model structures are numpy arrays (mostly memory-mapped from the model folder), whose buffers are never
+written by reference counting, and gc.freeze() keeps the garbage collector of the workers from touching the
+objects inherited from the master. The number of workers is then bounded by the CPUs rather than the memory.
+
+Settings come from the [server] section of config.ini (bind, workers, workerThreads), workers = 0 starts one
+worker per CPU.
+"""
+import os
+import gc
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from TopicModelingKit.src.settings import get_settings
+
+settings = get_settings()
+
+# Tells server.py to load the model in the master process instead of a background thread
+os.environ["PRELOAD_MODEL"] = "1"
+preload_app = True
+
+bind = settings.bind
+workers = settings.workers
+worker_class = "gthread"
+threads = settings.worker_threads
+timeout = 120
+
+
+def pre_fork(server, worker):
+    # Move every object allocated so far (the loaded model) to the permanent generation, so the garbage
+    # collections of the workers never write to their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked with {gc.get_freeze_count()} shared objects")
@@ -1,121 +1,447 @@
 import os
+import json
+import base64
+import binascii
 import sqlite3
-import configparser
 import time
-
-from TopicModelingKit.src.searcher.searcher import Searcher
+import random
+import functools
+import ipaddress
+import threading
+import traceback
+
+from TopicModelingKit.src.settings import get_settings, ProcessResource
+from TopicModelingKit.src.metrics import MetricsRegistry
+from TopicModelingKit.src.profiling import make_profiler, save_profile
+from TopicModelingKit.src.searcher.searcher import Searcher, SearchUnavailable, SearchQueryError, get_gateway_pool
+from TopicModelingKit.src.searcher.bm25 import BM25Index, BM25Searcher
+from TopicModelingKit.src.searcher.index_updater import IndexUpdater
 from TopicModelingKit.src.models.BERTopic import BertopicModel
+from TopicModelingKit.src.models.artifacts import SentenceTransformerEncoder
 from TopicModelingKit.src.models.data_handler import TopicModelingToolkitDataHandler, load_documents_from_sqlite
+from TopicModelingKit.src.database.dataset_dbtool import find_unindexed_fields, get_fts_columns, get_fts_tokenizer, FTS_TABLE
+from TopicModelingKit.src.database.connection_pool import ReadOnlyConnectionPool
+from TopicModelingKit.src.database.response_cache import create_response_cache
 
 from flask_cors import CORS
-from flask import Flask, abort, jsonify, g, request
+from flask import Flask, abort, jsonify, g, request, make_response, Response, stream_with_context
+try:
+    import orjson  # Optional, faster serialization of streamed responses
+except ImportError:
+    orjson = None
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count', 'X-Cache'])
 
 
 # ====================================
 # =====| Config File Loading |========
 # ====================================
 
-CONFIGPATH = os.path.join(os.path.dirname(
-    __file__), "TopicModelingKit", "config.ini")
-config = configparser.ConfigParser()
-config.read(CONFIGPATH)
+# Parsed once here, get_settings() only re-parses config.ini when the file changes
+settings = get_settings()
 
 # =======================================
 # =====| Model Loading/Training |========
 # =======================================
 
-load_model = config.getboolean('model-training', 'loadModel')
-save_model = config.getboolean('model-training', 'saveModel')
-
-
-# Train model
-if not load_model:
-
-    # Loading documents from SQLite DB
-    id_abs_list, idx_id_map = load_documents_from_sqlite()
-
-    # Cleaning documents
-    bert_handler = TopicModelingToolkitDataHandler(threads=10, sample_doc_count=None)
-    lines = bert_handler.multithreaded_clean_docs(id_abs_list)
-
-# Model loaded, not trained
+# The model is loaded/trained in a background thread so the database endpoints are served right away,
+# the model endpoints answer 503 (see requires_model) until it is ready.
+
+# Seconds clients are asked to wait (Retry-After) while the model is loading
+MODEL_RETRY_AFTER = 30
+
+bm = None  # BertopicModel, set once loaded
+model_status = {
+    'state': 'pending',         # pending -> loading -> ready | failed
+    'stage': None,              # Stage currently running
+    'stages': {},               # Duration of the finished stages, in seconds
+    'documents': None,          # Number of documents the model is trained with
+    'started_at': None,
+    'finished_at': None,
+    'error': None,
+}
+model_status_lock = threading.Lock()
+
+
+def set_model_status(**fields):
+    with model_status_lock:
+        model_status.update(fields)
+
+
+def get_model_status():
+    """Snapshot of the model loading progress and timings."""
+    with model_status_lock:
+        status = dict(model_status, stages=dict(model_status['stages']))
+    if status['started_at'] is not None:
+        status['elapsed'] = round((status['finished_at'] or time.time()) - status['started_at'], 3)
+    return status
+
+
+def run_stage(stage: str, func, *args, **kwargs):
+    """Runs a model loading stage and records its duration."""
+    set_model_status(stage=stage)
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    with model_status_lock:
+        model_status['stages'][stage] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def load_model():
+    """Loads the trained model (or trains it) and publishes it as `bm` once it is ready."""
+    global bm
+    set_model_status(state='loading', started_at=time.time())
+    try:
+        # Train model
+        if not settings.load_model:
+
+            # Loading documents from SQLite DB
+            id_abs_list, idx_id_map = run_stage('load_documents', load_documents_from_sqlite)
+
+            # Cleaning documents
+            bert_handler = TopicModelingToolkitDataHandler(threads=settings.threads, sample_doc_count=None)
+            lines = run_stage('clean_documents', bert_handler.multithreaded_clean_docs, id_abs_list)
+
+        # Model loaded, not trained
+        else:
+            idx_id_map = None  # Will be loaded along with the model
+            lines = []
+
+        print(f"Training model with {len(lines)} documents...")
+        set_model_status(documents=len(lines))
+        model = BertopicModel(lines, query_cache_size=settings.query_cache_size,
+                              query_cache_ttl=settings.query_cache_ttl)
+        model.DOCUMENT_IDX_ID_MAP = idx_id_map
+        run_stage(
+            'load_model' if settings.load_model else 'train_model',
+            model.train_model,
+            num_topics=(1, 1),
+            load_trained_model=settings.load_model,
+            offload_trained_model=settings.save_model
+        )
+        # The embedding model of a loaded model is loaded here rather than by the first query, so under gunicorn
+        # it is loaded once before the fork and shared by the workers
+        encoder = getattr(model.trained_model, 'embedding_model', None)
+        if isinstance(encoder, SentenceTransformerEncoder):
+            run_stage('load_embedding_model', encoder.load)
+        bm = model
+        set_model_status(state='ready', stage=None, finished_at=time.time())
+        print(f"Model ready after {get_model_status()['elapsed']}s")
+    except (Exception, SystemExit) as ex:  # train_model() exits when a saved model cannot be loaded
+        set_model_status(state='failed', finished_at=time.time(), error=f"{type(ex).__name__}: {ex}")
+        print(f"[ERROR] Model loading failed: {ex}")
+        traceback.print_exc()
+
+
+def requires_model(route):
+    """Answers 503 with a Retry-After header while the model is not loaded."""
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        if bm is None:
+            return model_unavailable_response()
+        return route(*args, **kwargs)
+    return wrapper
+
+
+def model_unavailable_response():
+    status = get_model_status()
+    response = jsonify(status)
+    response.status_code = 503
+    if status['state'] != 'failed':
+        response.headers['Retry-After'] = str(MODEL_RETRY_AFTER)
+    return response
+
+
+# Under gunicorn (gunicorn.conf.py sets PRELOAD_MODEL), the app is imported once in the master process and the
+# model is loaded synchronously there: a loader thread would not survive the fork, and the workers forked
+# afterwards share the loaded model copy-on-write instead of loading one copy each.
+if os.environ.get('PRELOAD_MODEL') == '1':
+    model_loader = None
+    load_model()
+elif os.environ.get('SKIP_MODEL_LOADING') == '1':
+    model_loader = None  # The importer attaches its own model to `bm` (e.g. the benchmarks)
 else:
-    idx_id_map = None  # Will be loaded along with the model
-    lines = []
+    model_loader = threading.Thread(target=load_model, name='model-loader', daemon=True)
+    model_loader.start()
+
+# ====================================
+# =====| Database Connection |========
+# ====================================
 
 
-print(f"Training model with {len(lines)} documents...")
-bm = BertopicModel(lines)
-bm.DOCUMENT_IDX_ID_MAP = idx_id_map
-bm.train_model(
-    num_topics=(1, 1),
-    load_trained_model=load_model,
-    offload_trained_model=save_model
+db_pool = ReadOnlyConnectionPool(
+    os.path.join(os.path.dirname(__file__), settings.database_path),
+    size=settings.db_pool_size,
+    timeout=settings.db_pool_timeout,
+    mmap_size=settings.db_mmap_size,
+    cache_size_kb=settings.db_cache_size_kb,
+    statement_cache_size=settings.db_statement_cache_size
 )
 
 # ====================================
-# =====| Database Connection |========
+# ========| Search Backend |==========
 # ====================================
 
+# With `backend = python` in [search], searches are served in-process from a BM25 index of the database instead
+# of the Lucene service (Search.java). The index saved by a previous start is loaded, so startup does not wait
+# for a full build: it is only built when it is missing or rebuildIndex is set (after the database is replaced,
+# changes of the Dataset table are picked up with incremental). It is memory-mapped, so gunicorn workers forked
+# after it is loaded share its pages.
+search_index = None
+if settings.search_backend == 'python':
+    search_index = BM25Index.open(
+        os.path.join(os.path.dirname(__file__), settings.search_index_path),
+        os.path.join(os.path.dirname(__file__), settings.database_path),
+        filter_fields=settings.filter_fields,
+        sort_fields=settings.sort_fields,
+        rebuild=settings.search_rebuild_index
+    )
+    Searcher = functools.partial(BM25Searcher, search_index)
+
+
+# With `incremental = true` in [search], every process runs an updater thread applying the changes of the
+# Dataset table (its change log) to the search index every updateInterval seconds. The thread is started on
+# the first request, so each gunicorn worker starts its own after the fork. The Lucene index is shared by the
+# workers, a batch is applied by the first worker reading it.
+class ProcessState:
+    """
+    State of this process derived from the settings and the database: the search index updater thread and the
+    facts about the database that are computed once. Held by `process_state`, so it is dropped (and its updater
+    stopped) when config.ini changes, and each forked worker gets its own.
+    """
+
+    def __init__(self, settings):
+        self.lock = threading.Lock()
+        self.database_facts = {}
+        self.index_updater = None
+        if settings.search_incremental:
+            self.index_updater = IndexUpdater(
+                os.path.join(os.path.dirname(__file__), settings.database_path),
+                search_index if search_index is not None else Searcher(),
+                metadata_fields=list(dict.fromkeys(settings.filter_fields + settings.sort_fields)),
+                interval=settings.search_update_interval,
+                batch_size=settings.search_update_batch_size
+            )
+            self.index_updater.start()
+
+    def database_fact(self, name: str, compute):
+        """Gets a fact about the database, computed by compute() on first use."""
+        with self.lock:
+            if name not in self.database_facts:
+                self.database_facts[name] = compute()
+            return self.database_facts[name]
+
+    def close(self):
+        if self.index_updater is not None:
+            self.index_updater.stop()
+
+
+process_state = ProcessResource(ProcessState, close=ProcessState.close)
+
+
+def start_index_updater():
+    """Starts the search index updater of this process, once."""
+    return process_state.get().index_updater
+
 
 def get_db():
-    """Opens a new database connection."""
+    """Checks out a pooled read-only database connection for the current request."""
     db = getattr(g, '_database', None)
     if db is None:
-        config = configparser.ConfigParser()
-        config.read(CONFIGPATH)
-        database_path = config['dataset']['pathOfDatabase']
-        database = os.path.join(os.path.dirname(__file__), database_path)
-        db = g._database = sqlite3.connect(database)
-        db.row_factory = sqlite3.Row
+        db = g._database = db_pool.checkout()
     return db
 
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Closes the database again at the end of the request."""
-    db = getattr(g, '_database', None)
+    """Returns the database connection to the pool at the end of the request."""
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        db_pool.checkin(db)
+
+
+def check_database_indexes():
+    """Warns about sortable/filterable metadata fields without a supporting index (see dataset_dbtool.py --index)."""
+    database = os.path.join(os.path.dirname(__file__), settings.database_path)
+    try:
+        db = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+        try:
+            unindexed_fields = find_unindexed_fields(db)
+        finally:
+            db.close()
+    except sqlite3.Error as ex:
+        print(f"[WARNING] Could not check the database indexes of {database}: {ex}")
+        return
+    for field in unindexed_fields:
+        print(f"[WARNING] Metadata field '{field}' allows sorting/filtering but has no index, "
+              f"run 'python dataset_dbtool.py --index' to create it")
+
+
+check_database_indexes()
+
+# ====================================
+# ============| Metrics |=============
+# ====================================
+
+metrics = MetricsRegistry()
+REQUEST_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency by route, until the last byte is sent.',
+    ['route', 'method', 'status'])
+STAGE_LATENCY = metrics.histogram(
+    'request_stage_duration_seconds', 'Time spent in each stage of a request (searcher, find_topics, '
+    'similar_documents, sqlite, json).', ['route', 'stage'])
+RESULT_SIZE = metrics.histogram(
+    'response_documents', 'Number of documents returned per response.', ['route'],
+    buckets=(0, 1, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+
+
+def route_label():
+    """The route pattern of the current request, so label values stay bounded."""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def stage_timer(stage: str):
+    """Times a stage of the current request: `with stage_timer('sqlite'): ...`"""
+    return STAGE_LATENCY.time(route=route_label(), stage=stage)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    start_index_updater()
+
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        labels = {'route': route_label(), 'method': request.method, 'status': response.status_code}
+        # Streamed responses are only finished once the body is sent
+        response.call_on_close(lambda: REQUEST_LATENCY.observe(time.perf_counter() - started, **labels))
+    return response
+
+
+@metrics.collector
+def collect_cache_and_pool_metrics():
+    pool = db_pool.stats()
+    collected = [
+        ('model_ready', 'gauge', 'Whether the topic model is loaded.', [({}, int(bm is not None))]),
+        ('db_pool_connections', 'gauge', 'Open database connections by state.',
+         [({'state': 'open'}, pool['open']), ({'state': 'in_use'}, pool['in_use'])]),
+        ('db_pool_checkouts_total', 'counter', 'Database connection checkouts.', [({}, pool['checkouts'])]),
+        ('db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection.', [({}, pool['waits'])]),
+        ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a free connection.',
+         [({}, pool['wait_time_total'])]),
+    ]
+    if settings.search_backend == 'lucene':  # The python backend never opens a gateway
+        gateways = get_gateway_pool().stats()
+        collected += [
+            ('search_gateways', 'gauge', 'Open search service gateways by state.',
+             [({'state': 'open'}, gateways['open']), ({'state': 'in_use'}, gateways['in_use'])]),
+            ('search_gateway_calls_total', 'counter', 'Calls to the search service.', [({}, gateways['calls'])]),
+            ('search_gateway_waits_total', 'counter', 'Calls that waited for a free gateway.',
+             [({}, gateways['waits'])]),
+            ('search_gateway_failures_total', 'counter', 'Search service calls failed on the connection.',
+             [({}, gateways['failures'])]),
+            ('search_gateway_reconnects_total', 'counter', 'Search service reconnections.',
+             [({}, gateways['reconnects'])]),
+        ]
+    state = process_state.current()
+    if state is not None and state.index_updater is not None:
+        updates = state.index_updater.stats()
+        collected += [
+            ('search_index_watermark', 'gauge', 'Last database change applied to the search index.',
+             [({}, updates['watermark'] if updates['watermark'] is not None else float('nan'))]),
+            ('search_index_changes_total', 'counter', 'Database changes applied to the search index.',
+             [({}, updates['changes'])]),
+            ('search_index_update_failures_total', 'counter', 'Failed search index updates.',
+             [({}, updates['failures'])]),
+            ('search_index_update_seconds', 'gauge', 'Duration of the last search index update.',
+             [({}, updates['last_duration'])]),
+        ]
+    cache = response_cache.stats()
+    if cache['backend'] != 'none':
+        collected += [
+            ('response_cache_hits_total', 'counter', 'Response cache hits.', [({}, cache['hits'])]),
+            ('response_cache_misses_total', 'counter', 'Response cache misses.', [({}, cache['misses'])]),
+            ('response_cache_evictions_total', 'counter', 'Response cache entries evicted to stay under the size bound.',
+             [({}, cache['evictions'])]),
+            ('response_cache_entries', 'gauge', 'Entries in the response cache (all processes).',
+             [({}, cache['entries'])]),
+            ('response_cache_bytes', 'gauge', 'Size of the cached responses (all processes).', [({}, cache['size'])]),
+            ('response_cache_generation', 'gauge', 'Current response cache generation.', [({}, cache['generation'])]),
+        ]
+    if bm is not None:
+        caches = bm.get_query_cache_stats()
+        collected += [
+            ('query_cache_hits_total', 'counter', 'Query cache hits.',
+             [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+            ('query_cache_misses_total', 'counter', 'Query cache misses (the embedding model is called).',
+             [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+            ('query_cache_entries', 'gauge', 'Entries in the query caches.',
+             [({'cache': name}, stats['size']) for name, stats in caches.items()]),
+        ]
+    return collected
+
+
+# ====================================
+# ===========| Profiling |============
+# ====================================
+
+# Requests are profiled when [profiling] is enabled in config.ini, either on demand (`?profile=1` or an
+# `X-Profile: 1` header, allowlisted clients only, the profile is returned instead of the response) or for
+# a random sampleRate fraction of the requests (the profile is written to outputDir).
+
+
+def profile_requested():
+    if request.args.get('profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    try:
+        address = ipaddress.ip_address(request.remote_addr)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in get_settings().profiling_allowlist)
+
+
+@app.before_request
+def start_profiler():
+    profiling = get_settings()
+    if not profiling.profiling_enabled:
+        return
+    if profile_requested():
+        g.profile_on_demand = True
+    elif not (profiling.profiling_sample_rate and random.random() < profiling.profiling_sample_rate):
+        return
+    profiler = make_profiler(profiling.profiling_mode, profiling.profiling_interval)
+    try:
+        profiler.start()
+    except ValueError:
+        return  # Another cProfile is running (one profiler per process since Python 3.12)
+    g.profiler = profiler
+
+
+@app.after_request
+def stop_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    if g.get('profile_on_demand'):
+        return Response(profiler.output(), mimetype=profiler.mimetype)
+    path = save_profile(profiler, os.path.join(os.path.dirname(__file__), get_settings().profiling_dir),
+                        f"{request.method} {route_label()}")
+    print(f"Request profile written to {path}")
+    return response
+
 
 # ====================================
 # =======| Helper Functions |=========
 # ====================================
 
 
-# def get_metadata_fields():
-#     config = configparser.ConfigParser()
-#     config.read(CONFIGPATH)
-#     metadata_list = config["document"]["metadata"]
-#     names = []
-#     for item in metadata_list.strip("[]").split("}, "):
-#         # Add back the curly brace for eval parsing
-#         if not item.endswith("}"):
-#             item += "}"
-#         # Store the name in separate lists
-#         for key, value in eval(item).items():
-#             if key == "name":
-#                 names.append(value)
-#     return names
 def get_metadata_fields():
-    if not hasattr(get_metadata_fields, 'metadata_fields'):
-        config = configparser.ConfigParser()
-        config.read(CONFIGPATH)
-        metadata_list = config["document"]["metadata"]
-        names = []
-        for item in metadata_list.strip("[]").split("}, "):
-            # Add back the curly brace for eval parsing
-            if not item.endswith("}"):
-                item += "}"
-            # Store the name in separate lists
-            for key, value in eval(item).items():
-                if key == "name":
-                    names.append(value)
-        get_metadata_fields.metadata_fields = names
-
-    return get_metadata_fields.metadata_fields
+    return get_settings().metadata_fields
 
 
 # def get_document_metadata(data):
@@ -126,31 +452,462 @@ def get_metadata_fields():
 #     }
 
 
-def docs_query(ids: list, sort: str = None, order: str = None, filter_field: str = None, filter_input: str = None):
-    """A helper function that returns a list of documents in the database that match the given list of ids."""
+def rows_to_documents(rows):
+    """Converts Dataset rows to the document format returned by the APIs."""
+    metadata_fields = get_metadata_fields()
+    return [{
+        'id': row['id'],
+        'metadata': {field: row[field] for field in metadata_fields},
+    } for row in rows]
+
+
+# ====================================
+# ==========| Pagination |============
+# ====================================
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(position: dict):
+    """Encodes the position of the last returned row into an opaque `after` cursor."""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode()
+
+
+# Fields of the cursors of each kind of pagination, with their allowed types
+RANK_CURSOR_FIELDS = {'rank': (int,)}
+SEARCH_CURSOR_FIELDS = {'score': (int, float), 'doc': (int,)}
+
+
+def keyset_cursor_fields(sort: str = None):
+    """Fields of the cursors of keyset_query(), the sort key of the last row can be NULL."""
+    if sort:
+        return {'key': (int, float, str, type(None)), 'id': (int,)}
+    return {'id': (int,)}
+
+
+def docs_query_cursor_fields(sort: str = None, order: str = None):
+    """Fields of the cursors of docs_query(): keyset pagination with a sort, ranks otherwise."""
+    return keyset_cursor_fields(sort) if sort and order else RANK_CURSOR_FIELDS
+
+
+def decode_cursor(cursor: str, fields: dict = None):
+    """
+    Decodes an `after` cursor, aborts with 400 when it was not produced by encode_cursor() or, given the
+    fields the current pagination needs ({name: allowed types}), when one is missing or of the wrong type.
+    """
+    if not cursor:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        abort(400, "Invalid cursor")
+    if not isinstance(position, dict):
+        abort(400, "Invalid cursor")
+    for name, types in (fields or {}).items():
+        # bool is an int for isinstance()
+        if name not in position or isinstance(position[name], bool) or not isinstance(position[name], types):
+            abort(400, "Invalid cursor")
+    return position
+
+
+def get_page_args(cursor_fields: dict = None):
+    """Reads the `limit` and `after` pagination arguments of the current request (see decode_cursor())."""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE)), decode_cursor(request.args.get('after'), cursor_fields)
+
+
+def page_response(documents: list, next_cursor: str = None, total: int = None):
+    """Returns a page of documents, the cursor of the next page and the total count go in the headers."""
+    response = jsonify(documents)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
+
+
+# ====================================
+# ===========| Streaming |============
+# ====================================
+
+# Rows fetched from the cursor and serialized per chunk of a streamed response
+STREAM_BATCH_SIZE = 500
+
+
+def wants_stream():
+    """Streaming is opt-in, with `Accept: application/x-ndjson` or `?stream=1`. Profiled requests are not streamed."""
+    if g.get('profiler') is not None:
+        return False
+    return (request.args.get('stream', type=int) == 1
+            or request.accept_mimetypes.best == 'application/x-ndjson')
+
+
+def dumps_line(obj):
+    """Serializes an object to a single NDJSON line (bytes)."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return json.dumps(obj, separators=(',', ':')).encode() + b"\n"
+
+
+def fetch_rows(cur, limit: int = None, page: dict = None, sort: str = None):
+    """
+    Yields the rows of an executed cursor, fetched STREAM_BATCH_SIZE rows at a time. When the limit is
+    reached, page['next_cursor'] is set to the keyset cursor of the last row.
+    """
+    count, row = 0, None
+    while True:
+        batch = cur.fetchmany(STREAM_BATCH_SIZE)
+        if not batch:
+            break
+        for row in batch:
+            yield row
+        count += len(batch)
+    if page is not None and limit and count == limit:
+        page['next_cursor'] = keyset_cursor(row, sort)
+
+
+def stream_response(rows, page: dict, total: int = None):
+    """
+    Streams documents as NDJSON, one document per line, serialized a batch at a time so the memory stays
+    flat. The request context (and its pooled connection) is kept until the last row is sent. The cursor of
+    the next page is only known at the end, so it is sent as a last {"next_cursor": ...} line.
+    """
+    metadata_fields = get_metadata_fields()
+    route = route_label()
+
+    def generate():
+        lines, count = [], 0
+        for row in rows:
+            count += 1
+            lines.append(dumps_line({
+                'id': row['id'],
+                'metadata': {field: row[field] for field in metadata_fields},
+            }))
+            if len(lines) >= STREAM_BATCH_SIZE:
+                yield b"".join(lines)
+                lines = []
+        if page.get('next_cursor'):
+            lines.append(dumps_line({'next_cursor': page['next_cursor']}))
+        if lines:
+            yield b"".join(lines)
+        RESULT_SIZE.observe(count, route=route)
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
+
+
+def documents_response(rows, page: dict, total: int = None):
+    """
+    Returns the documents of the given rows (an iterator filling page['next_cursor'] once exhausted),
+    streamed when the client asked for it, otherwise as a JSON list.
+    """
+    if wants_stream():
+        return stream_response(rows, page, total)
+    with stage_timer('sqlite'):
+        rows = list(rows)
+    RESULT_SIZE.observe(len(rows), route=route_label())
+    with stage_timer('json'):
+        return page_response(rows_to_documents(rows), page.get('next_cursor'), total)
+
+
+def validate_sort_filter(sort: str = None, order: str = None, filter_field: str = None):
+    """Only metadata fields can be interpolated in the SQL queries."""
+    metadata_fields = get_metadata_fields()
+    if sort and sort not in metadata_fields:
+        abort(400, f"Unknown sort field: {sort}")
+    if order and order.lower() not in ('asc', 'desc'):
+        abort(400, f"Unknown order: {order}")
+    if filter_field and filter_field not in metadata_fields:
+        abort(400, f"Unknown filter field: {filter_field}")
+
+
+def keyset_query(sort: str = None, order: str = None, after: dict = None):
+    """
+    Builds the keyset pagination part of a query: the condition continuing after the cursor and the ORDER BY.
+    Rows are ordered by (sort, id) so the position of the last row is unique.
+
+    SQLite puts NULLs first in ascending order and last in descending order, and a comparison with NULL is
+    never true, so the rows with a NULL sort key are sought explicitly.
+    """
+    direction = 'DESC' if order and order.lower() == 'desc' else 'ASC'
+    comparison = '<' if direction == 'DESC' else '>'
+    condition, params = None, []
+    if sort:
+        order_by = f" ORDER BY {sort} {direction}, id {direction}"
+        if after:
+            key, last_id = after.get('key'), after.get('id')
+            if key is None and direction == 'ASC':
+                # The rest of the NULLs, then every non-NULL key
+                condition, params = f"({sort} IS NULL AND id > ? OR {sort} IS NOT NULL)", [last_id]
+            elif key is None:
+                # The NULLs come last, only the rest of them is left
+                condition, params = f"{sort} IS NULL AND id < ?", [last_id]
+            elif direction == 'ASC':
+                condition, params = f"({sort}, id) > (?, ?)", [key, last_id]
+            else:
+                # The rest of the non-NULL keys, then the NULLs
+                condition, params = f"(({sort}, id) < (?, ?) OR {sort} IS NULL)", [key, last_id]
+    else:
+        order_by = f" ORDER BY id {direction}"
+        if after:
+            condition, params = f"id {comparison} ?", [after.get('id')]
+    return condition, params, order_by
+
+
+def keyset_cursor(row, sort: str = None):
+    """Cursor pointing after the given row of a keyset-paginated query."""
+    return encode_cursor({'key': row[sort], 'id': row['id']} if sort else {'id': row['id']})
+
+
+def estimate_dataset_count():
+    """
+    Cheap estimate of the Dataset row count: the ANALYZE statistics when available, otherwise a
+    count(*) that is computed once per process state.
+    """
     cur = get_db().cursor()
-    sql_query = "SELECT * FROM Dataset WHERE id IN ({})".format(
-        ','.join('?'*len(ids)))
-    params = ids
+    try:
+        cur.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = 'Dataset' LIMIT 1")
+        stat = cur.fetchone()
+        if stat:
+            return int(stat[0].split()[0])
+    except sqlite3.OperationalError:
+        pass  # Database was never analyzed
+    return process_state.get().database_fact(
+        'row_count', lambda: cur.execute("SELECT count(*) FROM Dataset").fetchone()[0])
+
+
+def get_filter_tokenizer():
+    """Tokenizer of the full-text index of the filterable metadata, None when the database has no full-text index."""
+    return process_state.get().database_fact('filter_tokenizer', lambda: get_fts_tokenizer(get_db()))
+
+
+def filter_condition(filter_field: str, filter_input: str):
+    """
+    Builds the SQL condition of a metadata filter. Filterable text fields are matched through the FTS5 index
+    (substring match with the trigram tokenizer, token prefix match with unicode61), other fields and inputs
+    too short for trigrams fall back to LIKE '%input%'.
+    """
+    tokenizer = get_filter_tokenizer()
+    if tokenizer and filter_field in get_fts_columns() and (tokenizer != 'trigram' or len(filter_input) >= 3):
+        phrase = '"{}"'.format(filter_input.replace('"', '""'))
+        if tokenizer != 'trigram':
+            phrase += '*'
+        return f"id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)", f"{filter_field} : {phrase}"
+    return f"{filter_field} LIKE ?", f"%{filter_input}%"
+
+
+# Id lists longer than this are bound as a single JSON array and joined through json_each(),
+# instead of one host parameter per id in an IN (...) list
+BULK_IDS_THRESHOLD = 500
+
+
+def select_documents(ids: list, filter_field: str = None, filter_input: str = None,
+                     condition: str = None, condition_params: list = (), order_by: str = "", limit: int = None):
+    """
+    Yields the Dataset rows of the given ids, with an optional filter, extra condition, order and limit.
+    Without order_by, rows are returned in the order of the given ids.
+    """
+    caller_order = not order_by
+    bulk = len(ids) > BULK_IDS_THRESHOLD
+    if bulk:
+        # The array index of each id (rank) keeps the caller's order, CROSS JOIN keeps json_each as the outer
+        # loop so Dataset is only probed through its primary key
+        sql_query = ("SELECT * FROM (SELECT Dataset.*, ranked.key AS rank FROM json_each(?) AS ranked"
+                     " CROSS JOIN Dataset ON Dataset.id = ranked.value) WHERE 1")
+        params = [json.dumps(ids)]
+        order_by = order_by or " ORDER BY rank"
+    else:
+        # The IN list is padded with NULLs to the next power of two, so a handful of statements cover every
+        # list size and stay in the connection's prepared statement cache
+        placeholders = 8
+        while placeholders < len(ids):
+            placeholders *= 2
+        sql_query = "SELECT * FROM Dataset WHERE id IN ({})".format(
+            ','.join('?'*placeholders))
+        params = list(ids) + [None] * (placeholders - len(ids))
 
     if filter_field and filter_input:
-        sql_query += f" AND {filter_field} LIKE ?"
-        params += (f"%{filter_input}%",)
+        filter_sql, filter_param = filter_condition(filter_field, filter_input)
+        sql_query += f" AND {filter_sql}"
+        params.append(filter_param)
 
-    if sort and order:
-        sql_query += f" ORDER BY {sort} {order}"
+    if condition:
+        sql_query += f" AND {condition}"
+        params += condition_params
 
+    sql_query += order_by
+    if limit is not None and (bulk or not caller_order):
+        sql_query += " LIMIT ?"
+        params.append(limit)
+
+    cur = get_db().cursor()
     cur.execute(sql_query, tuple(params))
-    data = cur.fetchall()
-    metadata_fields = get_metadata_fields()
-    response = []
-    for row in data:
-        metadata = {field: row[field] for field in metadata_fields}
-        response.append({
-            'id': row['id'],
-            'metadata': metadata,
-        })
-    return jsonify(response)
+
+    if caller_order and not bulk:
+        data = cur.fetchall()
+        rank = {doc_id: pos for pos, doc_id in enumerate(ids)}
+        data.sort(key=lambda row: rank[row['id']])
+        yield from (data if limit is None else data[:limit])
+    else:
+        yield from fetch_rows(cur)
+
+
+def docs_query(ids, sort: str = None, order: str = None, filter_field: str = None, filter_input: str = None,
+               limit: int = None, after: dict = None):
+    """
+    A helper function that returns a list of documents in the database that match the given list of ids.
+
+    Without a sort, documents keep the ranking of the given ids (e.g. search relevance, topic probability)
+    and pages continue after the rank of the last returned document. With a sort, pages are keyset-paginated
+    on (sort, id). When limit is None, every matching document is returned.
+    """
+    validate_sort_filter(sort, order, filter_field)
+    page = {}
+    rows = query_rows(ids, sort, order, filter_field, filter_input, limit, after, page)
+    return documents_response(rows, page, len(ids))
+
+
+def query_rows(ids, sort: str = None, order: str = None, filter_field: str = None, filter_input: str = None,
+               limit: int = None, after: dict = None, page: dict = None):
+    """Yields the Dataset rows of a docs_query() page, page['next_cursor'] is set once the rows are exhausted."""
+    filtering = bool(filter_field and filter_input)
+
+    if sort and order:
+        all_ids = ids.tolist() if hasattr(ids, 'tolist') else [int(doc_id) for doc_id in ids]
+        condition, params, order_by = keyset_query(sort, order, after)
+        count, row = 0, None
+        for row in select_documents(all_ids, filter_field, filter_input, condition, params, order_by, limit):
+            count += 1
+            yield row
+        if limit and count == limit:
+            page['next_cursor'] = keyset_cursor(row, sort)
+        return
+
+    # Walk the ranked ids from the cursor, a chunk at a time, until the page is full.
+    # Filtered chunks double in size so selective filters need a logarithmic number of queries.
+    pos = int(after.get('rank', -1)) + 1 if after else 0
+    chunk_size = len(ids) if limit is None else (limit * 4 if filtering else limit)
+    count, last_rank = 0, None
+    while pos < len(ids) and (limit is None or count < limit):
+        chunk = ids[pos:pos + chunk_size]
+        chunk = chunk.tolist() if hasattr(chunk, 'tolist') else [int(doc_id) for doc_id in chunk]
+        rank = {doc_id: pos + i for i, doc_id in enumerate(chunk)}
+        page_left = None if limit is None else limit - count
+        for row in select_documents(chunk, filter_field, filter_input, limit=page_left):
+            count += 1
+            last_rank = rank[row['id']]
+            yield row
+        pos += len(chunk)
+        chunk_size *= 2
+
+    if limit is not None and count == limit and last_rank < len(ids) - 1:
+        page['next_cursor'] = encode_cursor({'rank': last_rank})
+
+
+# ====================================
+# ========| Response Cache |==========
+# ====================================
+
+# Responses of /api/search and /api/get_topic_docs are cached in a file shared by the worker processes
+# ([response-cache] in config.ini). The cache starts a new generation, dropping every entry at once, when the
+# fingerprint of the loaded model or of the search index changes (checked every checkInterval seconds).
+
+response_cache = create_response_cache(
+    settings.response_cache_backend,
+    path=os.path.join(os.path.dirname(__file__), settings.response_cache_path),
+    max_size=settings.response_cache_max_size_mb << 20,
+    max_entry_size=settings.response_cache_max_entry_kb << 10,
+    mmap_size=settings.db_mmap_size
+)
+response_cache_sync = {'checked_at': None, 'model': None}
+
+
+def index_fingerprint():
+    """
+    The (fingerprint, version) of the search index: the digest and watermark of the in-process index, or the
+    directory (and its inode, a recreated index starts over at segments_1) and latest commit generation
+    (segments_N file) of the Lucene index, every applied batch of changes is a new commit. The version only
+    grows, so the workers agree on the newest one while each applies the changes to its own in-process index.
+    """
+    if search_index is not None:
+        return search_index.index_id, search_index.watermark
+    index_dir = os.path.join(os.path.dirname(__file__), get_settings().index_path)
+    try:
+        generations = [int(name[len('segments_'):], 36) for name in os.listdir(index_dir)
+                       if name.startswith('segments_')]
+        return f"{index_dir}#{os.stat(index_dir).st_ino}", max(generations)
+    except (OSError, ValueError):
+        return None, 0
+
+
+def sync_response_cache():
+    """Syncs the response cache generation with the current model and index, at most every checkInterval."""
+    now = time.monotonic()
+    checked_at = response_cache_sync['checked_at']
+    if (response_cache_sync['model'] is bm and checked_at is not None
+            and now - checked_at < get_settings().response_cache_check_interval):
+        return
+    response_cache_sync.update(checked_at=now, model=bm)
+    index, version = index_fingerprint()
+    response_cache.sync(json.dumps({
+        'model': getattr(bm, 'model_id', None),
+        'index': index,
+    }), version)
+
+
+def response_cache_key(query_arg: str):
+    """
+    (route, normalized query, sort, order, filter, page) of the current request. Only the whitespace of the query
+    is collapsed: Lucene's query parser reads AND/OR/NOT as operators in upper case only, the python backend's
+    tokenizer ignores case (and operators), so its queries are lowercased too.
+    """
+    limit, _ = get_page_args()
+    query = ' '.join((request.args.get(query_arg) or '').split())
+    if get_settings().search_backend == 'python':
+        query = query.lower()
+    return json.dumps([
+        route_label(),
+        query,
+        request.args.get('sort'),
+        (request.args.get('order') or '').lower() or None,
+        request.args.get('filter_field'),
+        request.args.get('filter_input'),
+        limit,
+        request.args.get('after'),
+    ])
+
+
+def cached_response(query_arg: str):
+    """
+    Serves the route from the response cache, keyed on its query argument and the sort/filter/page arguments.
+    Streamed and profiled requests bypass the cache.
+    """
+    def decorator(route):
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            if wants_stream() or g.get('profiler') is not None:
+                return route(*args, **kwargs)
+            sync_response_cache()
+            key = response_cache_key(query_arg)
+            cached = response_cache.get(key)
+            if cached is not None:
+                body, headers = cached
+                response = Response(body, mimetype='application/json', headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(route(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                headers = {name: response.headers[name] for name in ('X-Next-Cursor', 'X-Total-Count')
+                           if name in response.headers}
+                response_cache.put(key, response.get_data(), headers)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
 
 
 # ====================================
@@ -159,22 +916,31 @@ def docs_query(ids: list, sort: str = None, order: str = None, filter_field: str
 
 @app.route('/api/docs')
 def api_get_docs():
-    """Gets all the documents in the database."""
+    """Gets a page of the documents in the database."""
+    sort = request.args.get('sort')
+    order = request.args.get('order')
+    limit, after = get_page_args(keyset_cursor_fields(sort))
+    validate_sort_filter(sort, order)
+
+    condition, params, order_by = keyset_query(sort, order, after)
+    sql_query = "SELECT * FROM Dataset"
+    if condition:
+        sql_query += f" WHERE {condition}"
+    sql_query += order_by + " LIMIT ?"
+
     cur = get_db().cursor()
-    cur.execute('SELECT * FROM Dataset')
-    data = cur.fetchmany(3000)
-    metadata_fields = get_metadata_fields()
-    response = []
-    for row in data:
-        metadata = {field: row[field] for field in metadata_fields}
-        response.append({
-            'id': row['id'],
-            'metadata': metadata,
-        })
-    return jsonify(response)
+    cur.execute(sql_query, tuple(params + [limit]))
+    total = estimate_dataset_count()
+    page = {}
+    return documents_response(fetch_rows(cur, limit, page, sort), page, total)
+
+
+# Number of ranked documents of a search
+SEARCH_RESULT_SIZE = 100
 
 
 @app.route('/api/search')
+@cached_response('q')
 def api_search():
     """Returns a list of documents that match the given query."""
     query = request.args.get('q')
@@ -182,70 +948,85 @@ def api_search():
     order = request.args.get('order')
     filter_field = request.args.get('filter_field')
     filter_input = request.args.get('filter_input')
+    validate_sort_filter(sort, order, filter_field)
 
     searcher = Searcher()
     # searcher.setUpIndex()
-    result = searcher.search_BM25(100, query)
-
-    return docs_query(result, sort, order, filter_field, filter_input)
+    # The filter and the sort are applied by the search engine when it indexes the fields, so a filtered
+    # search ranks SEARCH_RESULT_SIZE matching documents instead of filtering the top ones
+    filtering = bool(filter_field and filter_input)
+    sorting = bool(sort and order)
+    in_engine = (not filtering or searcher.can_filter(filter_field)) and (not sorting or searcher.can_sort(sort))
+    # Pages in relevance order are continued by the engine (searchAfter): the cursor holds the score and the
+    # engine document of the last hit, so page N costs the same as page 1 and every match can be reached
+    paged = in_engine and not sorting
+    if paged:
+        limit, after = get_page_args(SEARCH_CURSOR_FIELDS)
+    elif in_engine:
+        limit, after = get_page_args(RANK_CURSOR_FIELDS)
+    else:
+        limit, after = get_page_args(docs_query_cursor_fields(sort, order))
+    try:
+        with stage_timer('searcher'):
+            if paged:
+                hits, next_after, total = searcher.search_after(
+                    query, limit, filter_field=filter_field if filtering else None,
+                    filter_input=filter_input if filtering else None, after=after)
+            elif in_engine:
+                hits = searcher.search(query, SEARCH_RESULT_SIZE, filter_field=filter_field if filtering else None,
+                                       filter_input=filter_input if filtering else None,
+                                       sort=sort if sorting else None, order=order if sorting else None)
+            else:
+                hits = searcher.search(query, SEARCH_RESULT_SIZE)
+    except SearchQueryError as ex:
+        abort(400, f"Invalid search query: {ex}")
+    except SearchUnavailable as ex:
+        print(f"[ERROR] {ex}")
+        abort(503, "The search service is unavailable")
+
+    result = [doc_id for doc_id, _ in hits]
+    if paged:
+        page = {'next_cursor': encode_cursor(next_after)} if next_after else {}
+        return documents_response(query_rows(result, page=page), page, total)
+    if in_engine:
+        return docs_query(result, limit=limit, after=after)
+    return docs_query(result, sort, order, filter_field, filter_input, limit, after)
+
+
+def config_response(body):
+    """
+    Returns a response for data derived from config.ini. The ETag is the hash of the config file, so clients
+    revalidate with If-None-Match and get a 304 until the file changes.
+    """
+    response = make_response(body)
+    response.set_etag(get_settings().etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
 
 
 @app.route('/api/get_allow_sort')
 def api_get_allow_sort():
     """ Returns a list of fields that can be used to sort the documents """
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
-
-    document_section = config['document']
-    metadata = eval(document_section['metadata'])
-
-    allow_sort_fields = []
-    for field in metadata:
-        if field.get('allow_sort'):
-            allow_sort_fields.append(field['name'])
-
-    return jsonify(allow_sort_fields)
+    return config_response(jsonify(get_settings().sort_fields))
 
 
 @app.route('/api/get_allow_filter')
 def api_get_allow_filter():
     """ Returns a list of fields that can be used to filter the documents """
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
-
-    document_section = config['document']
-    metadata = eval(document_section['metadata'])
-
-    allow_filter_fields = []
-    for field in metadata:
-        if field.get('allow_filter'):
-            allow_filter_fields.append(field['name'])
-
-    return jsonify(allow_filter_fields)
+    return config_response(jsonify(get_settings().filter_fields))
 
 
 @app.route('/api/get_top_region')
 def api_get_top_region():
     """Returns the list of fields that are displayed at the top of the document details page."""
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
-
-    display_section = config['display']
-    top_region = display_section['topRegion']
-
-    return top_region
+    return config_response(get_settings().top_region)
 
 
 @app.route('/api/get_bottom_region')
 def api_get_bottom_region():
     """Returns the list of fields that are displayed at the bottom of the document details page."""
-    config = configparser.ConfigParser()
-    config.read(CONFIGPATH)
-
-    display_section = config['display']
-    top_region = display_section['bottomRegion']
-
-    return top_region
+    return config_response(get_settings().bottom_region)
 
 
 @app.route('/api/document/<string:document_id>')
@@ -254,17 +1035,70 @@ def api_get_doc_by_id(document_id):
     cur = get_db().cursor()
     cur.execute("SELECT * FROM Dataset WHERE id = ?", [document_id])
     data = cur.fetchone()
-    metadata_fields = get_metadata_fields()
     if not data:
         abort(404)
-    response = {
-        'id': data['id'],
-        'metadata': {field: data[field] for field in metadata_fields}
-    }
-    return jsonify(response)
+    return jsonify(rows_to_documents([data])[0])
+
+
+# Maximum number of ids/queries in a single batch request
+MAX_BATCH_SIZE = 1000
+
+
+def get_batch_arg(key: str, item_type=str):
+    """Reads the list `key` of the JSON body of a batch request, as a list of item_type."""
+    body = request.get_json(silent=True)
+    items = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        abort(400, f"Expected a JSON body with a '{key}' list")
+    if len(items) > MAX_BATCH_SIZE:
+        abort(400, f"At most {MAX_BATCH_SIZE} {key} per request")
+    try:
+        return [item_type(item) for item in items]
+    except (TypeError, ValueError):
+        abort(400, f"Invalid {key}")
+
+
+@app.route('/api/documents/batch', methods=['POST'])
+def api_get_docs_batch():
+    """
+    Returns the documents of a list of IDs (JSON body {"ids": [...]}) fetched in one query, in the order of
+    the given IDs. Unknown IDs are returned as null.
+    """
+    ids = get_batch_arg('ids', int)
+    with stage_timer('sqlite'):
+        rows = list(select_documents(list(dict.fromkeys(ids))))
+    documents = {document['id']: document for document in rows_to_documents(rows)}
+    return jsonify([documents.get(doc_id) for doc_id in ids])
+
+
+@app.route('/api/db_pool')
+def api_db_pool_stats():
+    """Returns the database connection pool metrics (checkouts, waits, wait time)."""
+    return jsonify(db_pool.stats())
+
+
+@app.route('/metrics')
+def api_metrics():
+    """Request latencies, stage timings, result sizes and cache/pool counters in the Prometheus text format."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/healthz')
+def api_healthz():
+    """Liveness probe, the process is up and serving (the model may still be loading)."""
+    return jsonify({'status': 'ok', 'model': get_model_status()['state']})
+
+
+@app.route('/readyz')
+def api_readyz():
+    """Readiness probe, 200 once the model is loaded, otherwise 503 with the loading progress and timings."""
+    if bm is None:
+        return model_unavailable_response()
+    return jsonify(get_model_status())
 
 
 @app.route('/api/get_all_labels')
+@requires_model
 def api_all_labels():
     res = []
     all_labels = bm.get_all_topics_labels()
@@ -274,105 +1108,88 @@ def api_all_labels():
 
 
 @app.route('/api/labels')
+@requires_model
 def api_get_labels():
     query_string = request.args.get('topic_query')
     print("query_string: ", query_string)
-    doc_labels = bm.query_documents_labels(
-        query_string,
-        topic_count=5
-    )
+    with stage_timer('find_topics'):
+        doc_labels = bm.query_documents_labels(
+            query_string,
+            topic_count=5
+        )
 
     return jsonify(doc_labels)
 
 
+@app.route('/api/labels/batch', methods=['POST'])
+@requires_model
+def api_get_labels_batch():
+    """
+    Returns the labels of several topic queries (JSON body {"queries": [...]}), in the order of the queries.
+    The queries are embedded in one batch and scored against the topics with a single matrix multiply.
+    """
+    queries = get_batch_arg('queries')
+    with stage_timer('find_topics'):
+        labels = bm.query_documents_labels_batch(queries, topic_count=5)
+    return jsonify(labels)
+
+
 @app.route('/api/get_similar_topics')
+@requires_model
 def api_get_simliar_topics():
     doc_id = request.args.get('doc_id')
 
-    doc_idx = None
-    for k, v in bm.DOCUMENT_IDX_ID_MAP.items():
-        if int(v) == int(doc_id):
-            doc_idx = int(k)
+    doc_idx = bm.DOCUMENT_IDX_ID_MAP.get_index(int(doc_id))
+    if doc_idx is None:
+        abort(404)
 
     # print(f"doc_id: {doc_id}, doc_idx: {doc_idx}")
-    topic_id = bm.get_document_topic_map()[doc_idx]
+    topic_id = int(bm.get_document_topic_map()[doc_idx])
     # print("topic_id: ", topic_id)
-    labels = bm.get_topic_words(topic_id)
-    # print("labels: ", labels)
 
     similar_labels = []
-    similar_topics, _ = bm.trained_model.find_topics(labels[0], top_n=5)
-    for ct, st_id in enumerate(similar_topics):
-        if ct > 0:
-            tws = bm.get_topic_words(st_id)
-            similar_labels.append({'id': st_id, 'topic_list': tws})
+    similar_topics, _ = bm.get_similar_topics(topic_id, k=4)
+    for st_id in similar_topics:
+        tws = bm.get_topic_words(st_id)
+        similar_labels.append({'id': st_id, 'topic_list': tws})
 
     # print("similar_labels: ", similar_labels)
     return jsonify(similar_labels)
 
 
 @app.route('/api/get_similar_documents')
+@requires_model
 def api_get_simliar_documents():
     arg_doc_id = request.args.get('doc_id')
 
     SIMILAR_DOC_COUNT = 20
 
-    doc_idx = None
-    for k, v in bm.DOCUMENT_IDX_ID_MAP.items():
-        if int(v) == int(arg_doc_id):
-            doc_idx = int(k)
+    doc_idx = bm.DOCUMENT_IDX_ID_MAP.get_index(int(arg_doc_id))
+    if doc_idx is None:
+        abort(404)
 
-    # print(f"doc_id: {arg_doc_id}, doc_idx: {doc_idx}")
-    topic_id = bm.get_document_topic_map()[doc_idx]
-    # print("topic_id: ", topic_id)
-    labels = bm.get_topic_words(topic_id)
-
-    similar_topics_list = []
-    for label in labels:
-        similar_topics, _ = bm.trained_model.find_topics(label, top_n=2)
-        similar_topics_list.append(similar_topics[0])
-    similar_topics_list = list(set(similar_topics_list))
-
-    similar_doc_indices = []
-    for topic_id in similar_topics_list:
-        fetched_similar_doc_indices = bm.get_documents_with_topic_id(topic_id)
-        for doc_id in fetched_similar_doc_indices:
-            similar_doc_indices.append(doc_id)
-    doc_indices = list(set(similar_doc_indices[:SIMILAR_DOC_COUNT+1] if SIMILAR_DOC_COUNT+1 < len(
-        similar_doc_indices) else similar_doc_indices))
-
-    doc_ids = [bm.DOCUMENT_IDX_ID_MAP[idx] for idx in doc_indices if str(
-        bm.DOCUMENT_IDX_ID_MAP[idx]) != str(arg_doc_id)]
-    cur = get_db().cursor()
-    sql_query = "SELECT * FROM Dataset WHERE id IN ({})".format(
-        ','.join('?' * len(doc_ids)))
-    params = doc_ids
+    with stage_timer('similar_documents'):
+        doc_indices, _ = bm.similar_documents(doc_idx, k=SIMILAR_DOC_COUNT)
+    doc_ids = bm.DOCUMENT_IDX_ID_MAP.get_ids(doc_indices)
 
-    cur.execute(sql_query, tuple(params))
-    data = cur.fetchall()
-    metadata_fields = get_metadata_fields()
-    response = []
-    for row in data:
-        metadata = {field: row[field] for field in metadata_fields}
-        response.append({
-            'id': row['id'],
-            'metadata': metadata,
-        })
-
-    return jsonify(response)
+    # Ranked by similarity, most similar first
+    return docs_query(doc_ids)
 
 
 @app.route('/api/get_topic_docs')
+@requires_model
+@cached_response('topic_id')
 def api_query_document():
     topic_id = request.args.get('topic_id')
     sort = request.args.get('sort')
     order = request.args.get('order')
     filter_field = request.args.get('filter_field')
     filter_input = request.args.get('filter_input')
+    limit, after = get_page_args(docs_query_cursor_fields(sort, order))
 
-    doc_indices = bm.get_documents_with_topic_id(int(topic_id))
-
-    doc_ids = [bm.DOCUMENT_IDX_ID_MAP[idx] for idx in doc_indices]
+    # Ranked ids of the whole topic as a numpy array, docs_query only converts the ids of the requested page
+    doc_indices = bm.topic_index.documents(int(topic_id))
+    doc_ids = bm.DOCUMENT_IDX_ID_MAP.get_id_array(doc_indices)
 
     # cur = get_db().cursor()
     # sql_query = "SELECT * FROM Dataset WHERE id IN ({})".format(
@@ -394,7 +1211,7 @@ def api_query_document():
     # return jsonify(response)
     print("sort: ", sort, "order: ", order,
           "filter_field: ", filter_field, "filter_input: ", filter_input)
-    return docs_query(doc_ids, sort, order, filter_field, filter_input)
+    return docs_query(doc_ids, sort, order, filter_field, filter_input, limit, after)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+import os
+import sys
+import sqlite3
+import pytest
+
+BACK_END_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACK_END_DIR)
+os.environ["SKIP_MODEL_LOADING"] = "1"
+
+from benchmarks.corpus import write_corpus, DEFAULT_SEED
+from benchmarks.fakes import attach_stand_ins, make_fake_model
+
+CORPUS_SIZE = 2000
+
+
+@pytest.fixture(scope="session")
+def nullable_corpus_db(tmp_path_factory):
+    """
+    Synthetic corpus where one document in 7 has no year, to paginate over NULL sort keys.
+    """
+    path = write_corpus(str(tmp_path_factory.mktemp("nullable") / "dataset.sqlite3"), CORPUS_SIZE, DEFAULT_SEED)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE Dataset SET year = NULL WHERE id % 7 = 0")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture(scope="session")
+def fake_model(nullable_corpus_db):
+    conn = sqlite3.connect(nullable_corpus_db)
+    doc_ids = [row[0] for row in conn.execute("SELECT id FROM Dataset ORDER BY id")]
+    conn.close()
+    return make_fake_model(doc_ids)
+
+
+@pytest.fixture(scope="session")
+def server(nullable_corpus_db, fake_model):
+    """
+    The Flask app module serving the nullable corpus, with the fake searcher and topic model.
+    """
+    import server
+
+    attach_stand_ins(server, nullable_corpus_db, fake_model)
+    yield server
+    server.db_pool.close()
+
+
+@pytest.fixture(scope="session")
+def client(server):
+    return server.app.test_client()
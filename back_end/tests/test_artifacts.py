@@ -0,0 +1,30 @@
+import sys
+import time
+import types
+import threading
+import numpy as np
+
+from TopicModelingKit.src.models.artifacts import SentenceTransformerEncoder
+
+
+def test_encoder_loaded_once(monkeypatch):
+    loaded = []
+
+    class SentenceTransformer:
+        def __init__(self, name):
+            time.sleep(0.05)  # Long enough for the other queries to reach the load
+            loaded.append(name)
+
+        def encode(self, words, show_progress_bar=False):
+            return np.zeros((len(words), 4))
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=SentenceTransformer))
+    encoder = SentenceTransformerEncoder("all-MiniLM-L6-v2")
+    threads = [threading.Thread(target=encoder.embed_words, args=(["query"],)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loaded == ["all-MiniLM-L6-v2"]
+    assert encoder.embed_words(["a", "b"]).shape == (2, 4)
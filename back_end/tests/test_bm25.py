@@ -0,0 +1,22 @@
+import math
+import numpy as np
+
+from TopicModelingKit.src.searcher.bm25 import BM25Index
+
+DOCUMENTS = [(1, "apple apple banana"), (2, "apple cherry"), (3, "cherry date date")]
+
+
+def classic_similarity(frequency, doc_freq, doc_count, length):
+    # Lucene's ClassicSimilarity (TFIDFSimilarity.TFIDFScorer): sqrt(tf) * idf * lengthNorm, idf applied once
+    idf = 1 + math.log((doc_count + 1) / (doc_freq + 1))
+    return math.sqrt(frequency) * idf / math.sqrt(length)
+
+
+def test_tfidf_matches_classic_similarity():
+    doc_ids, scores = BM25Index.build(DOCUMENTS).search("apple banana", 10, "TF-IDF")
+    expected = {
+        1: classic_similarity(2, 2, 3, 3) + classic_similarity(1, 1, 3, 3),
+        2: classic_similarity(1, 2, 3, 2),
+    }
+    assert doc_ids.tolist() == [1, 2]
+    assert np.allclose(scores, [expected[1], expected[2]], rtol=1e-6)
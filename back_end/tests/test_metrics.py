@@ -0,0 +1,10 @@
+import dataclasses
+import pytest
+
+
+@pytest.mark.parametrize("search_backend", ["lucene", "python"])
+def test_gateway_metrics_of_lucene_backend_only(client, server, monkeypatch, search_backend):
+    monkeypatch.setattr(server, "settings", dataclasses.replace(server.settings, search_backend=search_backend))
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert ("search_gateway_calls_total" in response.get_data(as_text=True)) == (search_backend == "lucene")
@@ -0,0 +1,37 @@
+import json
+import base64
+import sqlite3
+import pytest
+
+from benchmarks.api import walk_pages, sort_key
+
+TOPIC_ID = 3
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_docs_walk_nullable_sort(client, nullable_corpus_db, order):
+    conn = sqlite3.connect(nullable_corpus_db)
+    count = conn.execute("SELECT count(*) FROM Dataset").fetchone()[0]
+    conn.close()
+    documents = walk_pages(client, f"/api/docs?limit=100&sort=year&order={order}")
+    assert len(documents) == count
+    assert [doc["id"] for doc in documents] == [doc["id"] for doc in sorted(documents, key=lambda d: sort_key(d, order))]
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_topic_docs_walk_nullable_sort(client, fake_model, order):
+    topic_size = len(fake_model.topic_index.documents(TOPIC_ID))
+    documents = walk_pages(client, f"/api/get_topic_docs?topic_id={TOPIC_ID}&limit=20&sort=year&order={order}")
+    assert len({doc["id"] for doc in documents}) == len(documents) == topic_size
+    assert documents == sorted(documents, key=lambda d: sort_key(d, order))
+
+
+@pytest.mark.parametrize("cursor", [{"rank": "a"}, {"id": 1}, {"key": None}, [1]], ids=str)
+def test_invalid_cursor(client, cursor):
+    after = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+    # {"id": 1} is a valid cursor of unsorted keyset pages only
+    for url in ["/api/docs?sort=year&order=asc", f"/api/get_topic_docs?topic_id={TOPIC_ID}",
+                f"/api/get_topic_docs?topic_id={TOPIC_ID}&sort=year&order=desc"]:
+        response = client.get(f"{url}&after={after}")
+        response.close()
+        assert response.status_code == 400, (url, cursor)
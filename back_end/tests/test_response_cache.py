@@ -0,0 +1,24 @@
+import dataclasses
+import pytest
+
+
+@pytest.fixture(params=["lucene", "python"])
+def search_backend(request, server, monkeypatch):
+    settings = dataclasses.replace(server.get_settings(), search_backend=request.param)
+    monkeypatch.setattr(server, "get_settings", lambda: settings)
+    return request.param
+
+
+def cache_key(server, query):
+    with server.app.test_request_context("/api/search", query_string={"q": query}):
+        return server.response_cache_key("q")
+
+
+def test_cache_key_collapses_whitespace(server, search_backend):
+    assert cache_key(server, "  neural   networks ") == cache_key(server, "neural networks")
+
+
+def test_cache_key_keeps_operator_case(server, search_backend):
+    # Lucene reads "AND" as an operator and "and" as a term, the python backend ignores both
+    same = cache_key(server, "neural AND networks") == cache_key(server, "neural and networks")
+    assert same == (search_backend == "python")